@@ -1,11 +1,19 @@
+import json
 from abc import ABC, abstractmethod
 
+from utils.events import Event
+from utils.kafka_producer import kafka_inflight, kafka_errors
+from utils.latency import stamp, tracker, STAGE_RECEIVED, STAGE_ENRICHED, STAGE_PRODUCED
+from utils.metrics import registry, LATENCY_BOUNDS
+
 class BaseStreamSource(ABC):
     """
     Abstract Base Class for all data stream sources.
     Defines the contract that all adapters must follow.
     """
-    
+    metric_labels = None
+    released_metrics = ()
+
     @abstractmethod
     async def connect(self):
         """Connect to the data source."""
@@ -20,8 +28,101 @@ class BaseStreamSource(ABC):
     def normalize(self, raw_event: dict) -> dict:
         """Normalize the raw event into a unified schema."""
         raise NotImplementedError
-    
+
     @abstractmethod
     async def run(self):
         """The main loop to run the stream."""
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        Releases the source connection after run() was cancelled. Detector,
+        indicator and sketch state stays on the adapter so it can run again.
+        """
+        websocket, self.websocket = self.websocket, None
+        if websocket is not None:
+            await websocket.close()
+
+    def init_metrics(self, adapter: str, stream: str):
+        """Creates the adapter's metric slots once so the per-event path only increments them."""
+        self.metric_labels = {"adapter": adapter, "stream": stream}
+        self.events_total = registry.counter(
+            "ingestion_events_total", "Events published to Kafka.", adapter=adapter, stream=stream)
+        self.reconnects_total = registry.counter(
+            "ingestion_reconnects_total", "Source connection re-establishments.", adapter=adapter, stream=stream)
+        self.enrichment_seconds = registry.histogram(
+            "ingestion_enrichment_seconds", "Time from receipt to finished enrichment.", LATENCY_BOUNDS,
+            adapter=adapter, stream=stream)
+        self.websocket = None
+        registry.gauge(
+            "ingestion_source_queue_depth", "Messages received on the source socket but not yet processed.",
+            fn=lambda: len(getattr(self.websocket, "messages", ())), adapter=adapter, stream=stream)
+
+    def release_metrics(self):
+        """
+        Stops exporting the adapter's series when its stream is removed; the
+        gauge callbacks close over the adapter, so they must not outlive it.
+        """
+        if self.metric_labels is not None:
+            self.released_metrics = registry.unregister(**self.metric_labels)
+
+    def restore_metrics(self):
+        """Re-exports the series of a removed stream that is added again, counters intact."""
+        registry.restore(self.released_metrics)
+        self.released_metrics = ()
+
+    @staticmethod
+    def _encode(event):
+        """Stamps the produce stage and returns (stages, Kafka value)."""
+        stamp(event, STAGE_PRODUCED)
+        if isinstance(event, Event):
+            return event.stages, event.encode()
+        return event["stages"], json.dumps(event).encode('utf-8')
+
+    def _record(self, stages):
+        self.events_total.inc()
+        self.enrichment_seconds.observe(stages[STAGE_ENRICHED] - stages[STAGE_RECEIVED])
+        tracker.record(stages)
+
+    async def publish(self, event):
+        """
+        Stamps the produce stage, sends the event to the adapter's Kafka topic
+        and records the per-stage latencies of the event. Typed events are
+        serialized once through their cached encode(); plain dict events
+        (order book snapshots) are dumped as before.
+        """
+        stages, value = self._encode(event)
+        kafka_inflight.inc()
+        try:
+            await self.producer.send_and_wait(self.topic, value)
+        except Exception:
+            kafka_errors.inc()
+            raise
+        finally:
+            kafka_inflight.dec()
+        self._record(stages)
+
+    async def send(self, event):
+        """
+        Pipelined publish: hands the event to the producer's batch and returns
+        the broker acknowledgement future without waiting for it. Metrics are
+        recorded when the ack arrives; callers gather the futures (e.g. once
+        per load-generator block) so errors still surface.
+        """
+        stages, value = self._encode(event)
+        kafka_inflight.inc()
+        try:
+            future = await self.producer.send(self.topic, value)
+        except Exception:
+            kafka_inflight.dec()
+            kafka_errors.inc()
+            raise
+        future.add_done_callback(lambda done: self._acked(done, stages))
+        return future
+
+    def _acked(self, future, stages):
+        kafka_inflight.dec()
+        if future.cancelled() or future.exception() is not None:
+            kafka_errors.inc()
+            return
+        self._record(stages)
@@ -0,0 +1,200 @@
+import asyncio
+import math
+import os
+import time
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.metrics import registry
+
+logger = get_logger(__name__)
+
+CHAT_VOCABULARY = [
+    "PogChamp", "LUL", "Kappa", "KEKW", "monkaS", "OMEGALUL", "GG", "wp", "nice", "play",
+    "stream", "awesome", "hello", "world", "this", "is", "the", "best", "worst", "clip",
+    "chat", "lol", "why", "what", "no", "yes", "again", "bot", "spam", "trash",
+]
+
+
+class LoadProfile:
+    """
+    Load-generator settings shared by the market and chat simulators.
+    The defaults reproduce the original one-event-per-second simulators.
+    """
+    def __init__(self, rate=1.0, burst_profile="steady", burst_factor=5.0, burst_period=60.0,
+                 symbols=1, channels=1, authors=4, words_mean=3.0, words_sigma=0.6,
+                 block_size=1024, report_interval=10.0, seed=None):
+        self.rate = rate
+        self.burst_profile = burst_profile
+        self.burst_factor = burst_factor
+        self.burst_period = burst_period
+        self.symbols = symbols
+        self.channels = channels
+        self.authors = authors
+        self.words_mean = words_mean
+        self.words_sigma = words_sigma
+        self.block_size = block_size
+        self.report_interval = report_interval
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        seed = os.getenv("LOADGEN_SEED")
+        return cls(
+            rate=float(os.getenv("LOADGEN_RATE", "1")),
+            burst_profile=os.getenv("LOADGEN_BURST_PROFILE", "steady").lower(),
+            burst_factor=float(os.getenv("LOADGEN_BURST_FACTOR", "5")),
+            burst_period=float(os.getenv("LOADGEN_BURST_PERIOD_SECONDS", "60")),
+            symbols=int(os.getenv("LOADGEN_SYMBOLS", "1")),
+            channels=int(os.getenv("LOADGEN_CHANNELS", "1")),
+            authors=int(os.getenv("LOADGEN_AUTHORS", "4")),
+            words_mean=float(os.getenv("LOADGEN_WORDS_MEAN", "3")),
+            words_sigma=float(os.getenv("LOADGEN_WORDS_SIGMA", "0.6")),
+            block_size=int(os.getenv("LOADGEN_BLOCK_SIZE", "1024")),
+            report_interval=float(os.getenv("LOADGEN_REPORT_INTERVAL_SECONDS", "10")),
+            seed=int(seed) if seed else None,
+        )
+
+    def rate_at(self, elapsed: float) -> float:
+        """Instantaneous target rate (events/sec) for the configured burst profile."""
+        if self.burst_profile == "sine":
+            # Oscillates between rate and rate * burst_factor
+            phase = 0.5 * (1 - math.cos(2 * math.pi * elapsed / self.burst_period))
+            return self.rate * (1 + (self.burst_factor - 1) * phase)
+        if self.burst_profile == "spike":
+            # Runs at burst_factor for the first 10% of every period
+            return self.rate * self.burst_factor if (elapsed % self.burst_period) < 0.1 * self.burst_period else self.rate
+        return self.rate
+
+
+def loadgen_enabled() -> bool:
+    return os.getenv("LOADGEN_ENABLED", "false").lower() == "true"
+
+
+class RateController:
+    """
+    Paces a producer loop to the profile's target rate. Sleeps only when the
+    loop is ahead of schedule, so high rates are not capped by per-event sleeps,
+    and reports achieved versus target rate every report interval.
+    """
+    def __init__(self, profile: LoadProfile, name: str):
+        self.profile = profile
+        self.name = name
+        self.start = time.monotonic()
+        self.next_due = self.start
+        self.report_start = self.start
+        self.report_count = 0
+        self.target_gauge = registry.gauge("ingestion_loadgen_target_rate", "Load generator target events/sec.", generator=name)
+        self.achieved_gauge = registry.gauge("ingestion_loadgen_achieved_rate", "Load generator achieved events/sec.", generator=name)
+
+    async def wait(self):
+        now = time.monotonic()
+        rate = self.profile.rate_at(now - self.start)
+        self.next_due += 1.0 / rate if rate > 0 else 1.0
+        self.report_count += 1
+        delay = self.next_due - now
+        if delay > 0.001:
+            await asyncio.sleep(delay)
+        elif delay < -1.0:
+            # Too far behind: do not try to replay the backlog as a burst
+            self.next_due = now
+            await asyncio.sleep(0)
+        elif self.report_count % 256 == 0:
+            await asyncio.sleep(0)
+
+        if now - self.report_start >= self.profile.report_interval:
+            self._report(now)
+
+    def _target_mean(self, t0: float, t1: float, samples: int = 100) -> float:
+        """Average of the target rate over [t0, t1] (seconds since start)."""
+        step = (t1 - t0) / samples
+        return sum(self.profile.rate_at(t0 + (i + 0.5) * step) for i in range(samples)) / samples
+
+    def _report(self, now: float):
+        window = now - self.report_start
+        achieved = self.report_count / window
+        target_mean = self._target_mean(self.report_start - self.start, now - self.start)
+        self.target_gauge.set(round(target_mean, 2))
+        self.achieved_gauge.set(round(achieved, 2))
+        ratio = achieved / target_mean if target_mean else 0.0
+        logger.info("[%s] load generator: achieved %.1f ev/s vs target %.1f ev/s (%.0f%%)",
+                    self.name, achieved, target_mean, 100 * ratio)
+        self.report_start = now
+        self.report_count = 0
+
+
+def price_changes(rng, n: int) -> np.ndarray:
+    """Simulated tick-to-tick price moves: uniform +/-100 with a 5% chance of a 10x jump."""
+    changes = rng.uniform(-100, 100, n)
+    jumps = rng.random(n) < 0.05
+    changes[jumps] *= 10
+    return changes
+
+
+class MarketBlockGenerator:
+    """Yields simulated trades for several symbols in pre-computed numpy blocks."""
+    def __init__(self, profile: LoadProfile, base_symbol: str, start_price: float = 65000.0):
+        self.profile = profile
+        self.rng = np.random.default_rng(profile.seed)
+        if profile.symbols <= 1:
+            self.symbols = [base_symbol.upper()]
+        else:
+            self.symbols = [f"{base_symbol.upper()}{i}" for i in range(profile.symbols)]
+        self.last_prices = np.full(len(self.symbols), start_price)
+
+    def next_block(self):
+        """
+        Returns (symbol_idx, prices, quantities) arrays for the next block of trades.
+        All symbols' random walks are advanced with one cumulative sum over the
+        block sorted by symbol, so the cost does not grow with the symbol count.
+        """
+        n = self.profile.block_size
+        symbol_count = len(self.symbols)
+        symbol_idx = self.rng.integers(0, symbol_count, n)
+        changes = price_changes(self.rng, n)
+
+        order = np.argsort(symbol_idx, kind="stable")
+        sorted_symbols = symbol_idx[order]
+        running = np.cumsum(changes[order])
+        group_start = np.searchsorted(sorted_symbols, np.arange(symbol_count), side="left")
+        group_end = np.searchsorted(sorted_symbols, np.arange(symbol_count), side="right")
+        offset = np.concatenate(([0.0], running))[group_start]
+        sorted_prices = self.last_prices[sorted_symbols] + running - offset[sorted_symbols]
+
+        present = group_end > group_start
+        self.last_prices[present] = sorted_prices[group_end[present] - 1]
+
+        prices = np.empty(n)
+        prices[order] = sorted_prices
+        quantities = self.rng.uniform(0.01, 1.0, n)
+        return symbol_idx, prices, quantities
+
+
+class ChatBlockGenerator:
+    """Yields simulated chat messages with Zipf-distributed authors and log-normal message lengths."""
+    def __init__(self, profile: LoadProfile, base_channel: str):
+        self.profile = profile
+        self.rng = np.random.default_rng(profile.seed)
+        base = base_channel.lstrip('#')
+        if profile.channels <= 1:
+            self.channels = [base]
+        else:
+            self.channels = [f"{base}{i}" for i in range(profile.channels)]
+        self.authors = [f"user{i}" for i in range(profile.authors)]
+        self.vocabulary = np.array(CHAT_VOCABULARY)
+
+    def next_block(self):
+        """Returns a list of (channel, author, text) tuples for the next block."""
+        n = self.profile.block_size
+        channel_idx = self.rng.integers(0, len(self.channels), n)
+        author_idx = np.minimum(self.rng.zipf(1.5, n) - 1, len(self.authors) - 1)
+        mu = math.log(max(self.profile.words_mean, 1.0))
+        lengths = np.maximum(1, self.rng.lognormal(mu, self.profile.words_sigma, n).astype(int))
+        words = self.rng.integers(0, len(self.vocabulary), int(lengths.sum()))
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        return [
+            (self.channels[channel_idx[i]], self.authors[author_idx[i]],
+             " ".join(self.vocabulary[words[offsets[i]:offsets[i + 1]]]))
+            for i in range(n)
+        ]
@@ -1,16 +1,25 @@
 import asyncio
 import json
+import os
 import time
-import random
 import websockets
 from aiokafka import AIOKafkaProducer
 
 from adapters.base_stream_source import BaseStreamSource
-from logic.anomaly_detection.market_anomaly import MarketAnomalyDetector
-from utils.logger import get_logger
+from config.settings import detection_mode, market_detector
+from adapters.load_generator import LoadProfile, MarketBlockGenerator, RateController, loadgen_enabled
+from logic.anomaly_detection.detectors import create_market_detector
+from logic.anomaly_detection.indicators import IndicatorEngine
+from logic.sketches.distinct import DistinctWindows
+from utils.events import TradeEvent
+from utils.latency import new_stages, stamp, STAGE_ENRICHED
+from utils.logger import get_logger, SampledLogger
 
 logger = get_logger(__name__)
+event_log = SampledLogger(logger, max_per_interval=1, interval_seconds=10.0)
 BINANCE_WS_URL = "wss://stream.binance.com:9443/ws/btcusdt@trade"
+# Longest the simulator lets Kafka acks and fallback MongoDB writes pile up within a block
+SIMULATOR_FLUSH_SECONDS = 1.0
 
 class MarketAdapter(BaseStreamSource):
     """
@@ -21,8 +30,16 @@ class MarketAdapter(BaseStreamSource):
         self.symbol = symbol.lower()
         self.producer = producer
         self.topic = topic
-        self.anomaly_detector = MarketAnomalyDetector()
+        self.anomaly_detectors = {}
+        self.detect_anomalies = detection_mode() == "ingestion"
+        self.indicator_engine = IndicatorEngine()
+        # Unique symbols traded per window (HyperLogLog)
+        self.distinct = DistinctWindows(
+            precision=int(os.getenv("HLL_PRECISION", "12")),
+            minute_ttl_seconds=float(os.getenv("SKETCH_MINUTE_TTL_SECONDS", "86400")),
+        )
         self.ws_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@trade"
+        self.init_metrics("market", self.symbol)
         logger.info(f"MarketAdapter initialized for symbol: {self.symbol}")
 
     async def connect(self):
@@ -38,66 +55,99 @@ class MarketAdapter(BaseStreamSource):
         # This is handled within the run loop.
         pass
 
-    def normalize(self, raw_event: dict) -> dict:
+    def normalize(self, raw_event: dict) -> TradeEvent:
         """
         Normalizes a raw market trade event and runs anomaly detection.
         """
         timestamp = time.time()
-        
-        # 1. Basic Normalization
-        normalized_event = {
-            "source": "market_data",
-            "type": "trade",
-            "event_id": raw_event.get('t'),
-            "timestamp": timestamp,
-            "payload": {
-                "symbol": raw_event.get('s'),
-                "price": float(raw_event.get('p')),
-                "quantity": float(raw_event.get('q')),
-            }
-        }
+        # Binance trade time (T) or event time (E) in milliseconds
+        source_ms = raw_event.get('T') or raw_event.get('E')
+        symbol = raw_event.get('s')
+        price = float(raw_event.get('p'))
+        quantity = float(raw_event.get('q'))
+
+        # 1. Basic Normalization + 2. Technical Indicators
+        event = TradeEvent(
+            raw_event.get('t'), timestamp, new_stages(source_ms / 1000.0 if source_ms else None, timestamp),
+            symbol, price, quantity, self.indicator_engine.update(symbol, price, quantity))
+        self.distinct.add("symbols", "market", symbol, timestamp)
 
-        # 2. Anomaly Detection
-        anomaly_result = self.anomaly_detector.detect(normalized_event['payload']['price'])
-        normalized_event["enrichments"] = {"anomaly": anomaly_result}
+        # 3. Anomaly Detection (one detector per symbol, chosen per symbol), unless Spark runs it
+        if self.detect_anomalies:
+            detector = self.anomaly_detectors.get(symbol)
+            if detector is None:
+                detector = self.anomaly_detectors[symbol] = create_market_detector(market_detector(symbol))
+                logger.info(f"Using '{detector.name}' anomaly detector for {symbol}")
+            event.anomaly = detector.detect(price)
+        stamp(event, STAGE_ENRICHED)
         
-        return normalized_event
+        return event
+
+    async def _flush(self, acks: list, writes: list):
+        """Waits for the pending Kafka acks and writes the fallback simulator's events off the event loop."""
+        from utils.mongo_client import save_event
+
+        if acks:
+            await asyncio.gather(*acks)
+            acks.clear()
+        if writes:
+            batch = writes[:]
+            writes.clear()
+            await asyncio.get_running_loop().run_in_executor(None, lambda: [save_event(event) for event in batch])
 
     async def _run_simulator(self):
-        """A fallback simulator if the WebSocket connection fails."""
-        logger.info("Running market data simulator.")
-        current_price = 65000.0
+        """
+        A fallback simulator if the WebSocket connection fails, doubling as a
+        load generator. Prices come from vectorized numpy blocks and the loop is
+        paced by the LOADGEN_* profile (one trade per second by default).
+
+        Trades are produced with pipelined sends; acks are gathered at the end
+        of each block or every SIMULATOR_FLUSH_SECONDS, whichever comes first,
+        so throughput is not bounded by one broker round trip per event. As a
+        fallback the simulator also writes each trade to MongoDB (in a thread,
+        per flush); as a load generator it leaves MongoDB to the Spark job.
+        """
+        profile = LoadProfile.from_env()
+        generator = MarketBlockGenerator(profile, self.symbol)
+        pacer = RateController(profile, f"market:{self.symbol}")
+        direct_writes = not loadgen_enabled()
+        logger.info(f"Running market data simulator: {profile.rate} ev/s ({profile.burst_profile}) over {len(generator.symbols)} symbol(s).")
+        # Microsecond clock start, so ids never repeat those of an earlier run
+        trade_id = time.time_ns() // 1000
+        acks, writes = [], []
+        flushed = time.monotonic()
         while True:
-            price_change = random.uniform(-100, 100)
-            # Occasionally create a large jump for anomaly detection
-            if random.random() < 0.05:
-                price_change *= 10
-            
-            current_price += price_change
-            
-            simulated_event = {
-                's': self.symbol.upper(),
-                'p': f"{current_price:.2f}",
-                'q': f"{random.uniform(0.01, 1.0):.4f}",
-                't': int(time.time() * 1000)
-            }
-            
-            normalized_event = self.normalize(simulated_event)
-            await self.producer.send_and_wait(
-                self.topic,
-                json.dumps(normalized_event).encode('utf-8')
-            )
-            
-            # Also write directly to MongoDB
-            from utils.mongo_client import save_event
-            save_event(normalized_event.copy())
-            
-            logger.debug("Sent simulated market event to Kafka.")
-            await asyncio.sleep(1)
+            symbol_idx, prices, quantities = generator.next_block()
+            for i in range(len(prices)):
+                trade_id += 1
+                now_ms = int(time.time() * 1000)
+                simulated_event = {
+                    's': generator.symbols[symbol_idx[i]],
+                    'p': round(float(prices[i]), 2),
+                    'q': round(float(quantities[i]), 4),
+                    't': trade_id,
+                    'T': now_ms
+                }
+
+                normalized_event = self.normalize(simulated_event)
+                acks.append(await self.send(normalized_event))
+                if direct_writes:
+                    writes.append(normalized_event)
+
+                event_log.debug("Sent simulated market event to Kafka.")
+                await pacer.wait()
+                if time.monotonic() - flushed >= SIMULATOR_FLUSH_SECONDS:
+                    await self._flush(acks, writes)
+                    flushed = time.monotonic()
+            await self._flush(acks, writes)
+            flushed = time.monotonic()
 
     async def run(self):
         logger.info("Starting Market Data Adapter...")
-        websocket = await self.connect()
+        if loadgen_enabled():
+            await self._run_simulator()
+            return
+        websocket = self.websocket = await self.connect()
         if not websocket:
             await self._run_simulator()
             return
@@ -110,15 +160,13 @@ class MarketAdapter(BaseStreamSource):
                 # logger.debug(f"Received market data: {raw_event}")
                 
                 normalized_event = self.normalize(raw_event)
-                await self.producer.send_and_wait(
-                    self.topic,
-                    json.dumps(normalized_event).encode('utf-8')
-                )
+                await self.publish(normalized_event)
                 # logger.debug(f"Successfully sent enriched market event to Kafka topic: {self.topic}")
                 
             except websockets.exceptions.ConnectionClosed:
                 logger.warning("WebSocket connection closed. Reconnecting...")
-                websocket = await self.connect()
+                self.reconnects_total.inc()
+                websocket = self.websocket = await self.connect()
                 if not websocket:
                     await self._run_simulator()
                     return
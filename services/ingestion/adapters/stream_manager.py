@@ -0,0 +1,205 @@
+import asyncio
+import hmac
+import ipaddress
+import time
+from urllib.parse import unquote
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATUS_RUNNING = "running"
+STATUS_STOPPED = "stopped"
+STATUS_FAILED = "failed"
+
+
+class StreamError(Exception):
+    """Rejected stream operation; `status` is the HTTP status the control API answers with."""
+    status = 400
+
+
+class StreamNotFound(StreamError):
+    status = 404
+
+
+class StreamAlreadyRunning(StreamError):
+    status = 409
+
+
+class ManagedStream:
+    __slots__ = ("kind", "key", "adapter", "task", "started_at", "error")
+
+    def __init__(self, kind: str, key: str, adapter):
+        self.kind = kind
+        self.key = key
+        self.adapter = adapter
+        self.task = None
+        self.started_at = None
+        self.error = None
+
+    @property
+    def status(self) -> str:
+        if self.task is None:
+            return STATUS_STOPPED
+        if not self.task.done():
+            return STATUS_RUNNING
+        return STATUS_FAILED if self.error else STATUS_STOPPED
+
+    def describe(self) -> dict:
+        events = getattr(self.adapter, "events_total", None)
+        return {
+            "id": StreamManager.stream_id(self.kind, self.key),
+            "kind": self.kind,
+            "key": self.key,
+            "status": self.status,
+            "started_at": self.started_at,
+            "events": events.value if events is not None else None,
+            "error": self.error,
+        }
+
+
+class StreamManager:
+    """
+    Runs adapters as individually managed tasks so streams can be added and
+    removed without restarting the service.
+
+    `factories` maps a stream kind ("chat", "market", "depth") to a callable
+    building an adapter for a key (channel or symbol). A removed stream's
+    task is cancelled, its connection closed and its metric series
+    unregistered, but the adapter object is kept: adding the same stream
+    again resumes with its detector windows, indicators, sketches and
+    counters intact. The toxicity model is a process-wide singleton and is
+    never reloaded.
+    """
+    def __init__(self, factories: dict):
+        self.factories = factories
+        self.streams = {}    # stream id -> ManagedStream, running or dormant
+
+    @staticmethod
+    def stream_id(kind: str, key: str) -> str:
+        return f"{kind}:{key.strip().lower().lstrip('#')}"
+
+    def add(self, kind: str, key: str) -> dict:
+        if kind not in self.factories:
+            raise StreamError(f"Unknown stream kind '{kind}' (expected one of: {', '.join(self.factories)})")
+        if not key or not key.strip().lstrip("#"):
+            raise StreamError("A stream needs a channel or symbol key")
+        stream_id = self.stream_id(kind, key)
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            key = key.strip().lower().lstrip("#")
+            stream = self.streams[stream_id] = ManagedStream(kind, key, self.factories[kind](key))
+        elif stream.status == STATUS_RUNNING:
+            raise StreamAlreadyRunning(f"Stream {stream_id} is already running")
+        else:
+            stream.adapter.restore_metrics()
+
+        stream.error = None
+        stream.started_at = time.time()
+        stream.task = asyncio.create_task(self._run(stream), name=f"stream:{stream_id}")
+        logger.info(f"Started stream {stream_id}")
+        return stream.describe()
+
+    async def _run(self, stream: ManagedStream):
+        try:
+            await stream.adapter.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # One failing source must not take the other streams down
+            stream.error = str(e) or type(e).__name__
+            logger.error(f"Stream {self.stream_id(stream.kind, stream.key)} failed: {e}", exc_info=True)
+
+    async def remove(self, kind: str, key: str) -> dict:
+        stream_id = self.stream_id(kind, key or "")
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.task is None:
+            raise StreamNotFound(f"No stream {stream_id}")
+        task, stream.task = stream.task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await stream.adapter.close()
+        except Exception as e:
+            logger.warning(f"Error closing stream {stream_id}: {e}")
+        stream.adapter.release_metrics()
+        logger.info(f"Stopped stream {stream_id} (state kept for a restart)")
+        return stream.describe()
+
+    def list(self) -> list:
+        return [stream.describe() for stream in self.streams.values()]
+
+    def adapters(self) -> list:
+        """Every adapter this process has run, including stopped ones whose state is kept."""
+        return [stream.adapter for stream in self.streams.values()]
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def add_stream_routes(server, manager: StreamManager, token: str = None, host: str = "127.0.0.1"):
+    """
+    Control API on the internal HTTP server:
+
+        GET    /streams                              list streams
+        POST   /streams  {"kind": ..., "key": ...}   start a stream
+        DELETE /streams?kind=...&key=...             stop a stream
+
+    When `token` is set, POST/DELETE need "Authorization: Bearer <token>".
+    Without a token they are only served when the server is bound to a
+    loopback `host`; on any other bind they answer 403.
+    """
+    open_access = token is None and is_loopback(host)
+    if token is None and not open_access:
+        logger.warning(f"STREAM_API_TOKEN is not set and the control API is bound to {host}; "
+                       "POST/DELETE /streams are disabled")
+
+    def check(request):
+        if open_access:
+            return None
+        if token is None:
+            return 403, "application/json", {"error": "stream changes need STREAM_API_TOKEN on a non-loopback bind"}
+        provided = request.headers.get("authorization", "").encode("utf-8")
+        if not hmac.compare_digest(provided, f"Bearer {token}".encode("utf-8")):
+            return 401, "application/json", {"error": "unauthorized"}
+        return None
+
+    async def handle_list(request):
+        return 200, "application/json", {"streams": manager.list()}
+
+    async def handle_add(request):
+        denied = check(request)
+        if denied:
+            return denied
+        try:
+            body = request.json()
+            if not isinstance(body, dict):
+                raise ValueError("expected an object")
+            return 201, "application/json", manager.add(str(body.get("kind", "")), str(body.get("key", "")))
+        except ValueError:
+            return 400, "application/json", {"error": "body must be JSON: {\"kind\": ..., \"key\": ...}"}
+        except StreamError as e:
+            return e.status, "application/json", {"error": str(e)}
+
+    async def handle_remove(request):
+        denied = check(request)
+        if denied:
+            return denied
+        try:
+            kind, key = (unquote(request.query.get(name, "")) for name in ("kind", "key"))
+            return 200, "application/json", await manager.remove(kind, key)
+        except StreamError as e:
+            return e.status, "application/json", {"error": str(e)}
+
+    server.route("GET", "/streams", handle_list)
+    server.route("POST", "/streams", handle_add)
+    server.route("DELETE", "/streams", handle_remove)
@@ -1,17 +1,27 @@
-import json
+import os
 import time
-import random
 import asyncio
+import logging
+from collections import deque
 import websockets
 import re
 from aiokafka import AIOKafkaProducer
 
 from adapters.base_stream_source import BaseStreamSource
-from logic.nlp_toxicity.toxicity_classifier import ToxicityClassifier
+from config.settings import detection_mode
+from adapters.load_generator import LoadProfile, ChatBlockGenerator, RateController, loadgen_enabled
+from logic.nlp_toxicity.toxicity_classifier import ToxicityClassifier, STATE_LOADING
 from logic.anomaly_detection.chat_anomaly import ChatAnomalyDetector
-from utils.logger import get_logger
+from logic.sketches.chat_windows import ChatSketchAggregator
+from logic.sketches.distinct import DistinctWindows
+from utils.events import ChatEvent
+from utils.latency import new_stages, stamp, STAGE_ENRICHED
+from utils.logger import get_logger, SampledLogger
+from utils.metrics import registry
 
 logger = get_logger(__name__)
+# Per-message log lines are sampled so a busy channel cannot flood the log queue
+message_log = SampledLogger(logger, max_per_interval=5)
 
 class TwitchChatAdapter(BaseStreamSource):
     """
@@ -26,8 +36,33 @@ class TwitchChatAdapter(BaseStreamSource):
         self.topic = topic
         
         self.uri = "wss://irc-ws.chat.twitch.tv:443"
+        # Returns immediately; the model loads in the background
         self.nlp_classifier = ToxicityClassifier.get_instance()
         self.anomaly_detector = ChatAnomalyDetector()
+        self.detect_anomalies = detection_mode() == "ingestion"
+        self.sketches = ChatSketchAggregator(
+            capacity=int(os.getenv("SKETCH_TOP_K_CAPACITY", "200")),
+            width=int(os.getenv("SKETCH_CMS_WIDTH", "2048")),
+            depth=int(os.getenv("SKETCH_CMS_DEPTH", "4")),
+            minute_ttl_seconds=float(os.getenv("SKETCH_MINUTE_TTL_SECONDS", "86400")),
+        )
+        # Unique chatters per channel and window (HyperLogLog)
+        self.distinct = DistinctWindows(
+            precision=int(os.getenv("HLL_PRECISION", "12")),
+            minute_ttl_seconds=float(os.getenv("SKETCH_MINUTE_TTL_SECONDS", "86400")),
+        )
+        # Until the model is ready, messages are either published tagged "unscored"
+        # (tag) or held back and scored once it is (queue, bounded by CHAT_PENDING_MAX).
+        self.unscored_policy = os.getenv("CHAT_UNSCORED_POLICY", "tag").lower()
+        self.pending_max = int(os.getenv("CHAT_PENDING_MAX", "10000"))
+        self.pending = deque()
+        self.init_metrics("twitch_chat", self.channel)
+        self.unscored_total = registry.counter(
+            "ingestion_chat_unscored_total", "Chat events published before the toxicity model was ready.",
+            adapter="twitch_chat", stream=self.channel)
+        registry.gauge(
+            "ingestion_chat_pending", "Chat messages held until the toxicity model is ready.",
+            fn=lambda: len(self.pending), adapter="twitch_chat", stream=self.channel)
         logger.info(f"TwitchChatAdapter (Raw WS) initialized for channel: {self.channel}")
 
     async def connect(self):
@@ -50,49 +85,93 @@ class TwitchChatAdapter(BaseStreamSource):
     async def fetch_event(self):
         pass
 
-    def normalize(self, raw_message, author) -> dict:
-        timestamp = time.time()
-        normalized_event = {
-            "source": "twitch_chat",
-            "type": "chat",
-            "event_id": str(timestamp),
-            "timestamp": timestamp,
-            "payload": {
-                "author": author,
-                "text": raw_message,
-                "channel": self.channel,
-            }
-        }
-        
+    def normalize(self, raw_message, author, source_ts=None, channel=None, received_ts=None) -> ChatEvent:
+        timestamp = received_ts if received_ts is not None else time.time()
+        channel = channel or self.channel
+
         # NLP Enrichment
-        toxicity_scores = self.nlp_classifier.predict(raw_message)
-        normalized_event["enrichments"] = {"toxicity": toxicity_scores}
+        scored = self.nlp_classifier.ready
+        if scored:
+            toxicity = self.nlp_classifier.predict(raw_message)
+        else:
+            toxicity = {}
+            self.unscored_total.inc()
+        event = ChatEvent(str(timestamp), timestamp, new_stages(source_ts, timestamp),
+                          author, raw_message, channel, toxicity, scored)
+
+        # Heavy-hitter sketches (top chatters / toxic users per channel and window)
+        toxic = toxicity.get("toxic", 0.0)
+        self.sketches.update(channel, author, toxic, timestamp)
+        self.distinct.add("chatters", channel, author, timestamp)
 
-        # Anomaly Detection
-        anomaly_result = self.anomaly_detector.detect(normalized_event)
-        normalized_event["enrichments"]["anomaly"] = anomaly_result
+        # Anomaly Detection, unless Spark runs it
+        if self.detect_anomalies:
+            event.anomaly = self.anomaly_detector.check(author, timestamp, toxic)
+        stamp(event, STAGE_ENRICHED)
         
-        return normalized_event
+        return event
+
+    async def emit(self, raw_message, author, source_ts=None, channel=None):
+        """Normalizes and publishes one chat message, honouring the unscored policy."""
+        if self.unscored_policy == "queue" and self.nlp_classifier.state == STATE_LOADING:
+            if len(self.pending) < self.pending_max:
+                # Arrival time is kept so latency stages and spam windows reflect when it was received
+                self.pending.append((raw_message, author, source_ts, channel, time.time()))
+            else:
+                # Queue full: only the overflowing message goes out unscored, the backlog keeps waiting
+                await self.publish(self.normalize(raw_message, author, source_ts=source_ts, channel=channel))
+            return
+        if self.pending:
+            await self.flush_pending()
+        await self.publish(self.normalize(raw_message, author, source_ts=source_ts, channel=channel))
+
+    async def flush_pending(self):
+        """Publishes messages held back while the model was loading, in arrival order."""
+        while self.pending:
+            raw_message, author, source_ts, channel, received_ts = self.pending.popleft()
+            await self.publish(self.normalize(raw_message, author, source_ts=source_ts, channel=channel,
+                                              received_ts=received_ts))
+
+    async def _drain_when_ready(self):
+        """Flushes the pending queue as soon as loading finishes, even if chat is quiet."""
+        await self.nlp_classifier.wait_until_loaded()
+        if self.pending:
+            logger.info(f"Toxicity model loaded; scoring {len(self.pending)} held chat messages.")
+            await self.flush_pending()
 
     async def _run_simulator(self):
-        logger.info("Running Twitch chat simulator.")
-        sample_messages = ["PogChamp", "LUL", "Kappa", "This stream is awesome!", "Hello world"]
-        sample_authors = ["user1", "user2", "troll123", "fan456"]
-        
+        """
+        Chat simulator / load generator. Channels, Zipf-distributed authors and
+        log-normal message lengths come from the LOADGEN_* profile.
+        """
+        profile = LoadProfile.from_env()
+        generator = ChatBlockGenerator(profile, self.channel)
+        pacer = RateController(profile, f"chat:{self.channel}")
+        logger.info(f"Running Twitch chat simulator: {profile.rate} ev/s ({profile.burst_profile}) over {len(generator.channels)} channel(s).")
+
         while True:
-            text = random.choice(sample_messages)
-            author = random.choice(sample_authors)
-            
-            normalized_event = self.normalize(text, author)
-            await self.producer.send_and_wait(self.topic, json.dumps(normalized_event).encode('utf-8'))
-            await asyncio.sleep(1)
+            for channel, author, text in generator.next_block():
+                await self.emit(text, author, source_ts=time.time(), channel=f"#{channel}")
+                await pacer.wait()
+
+    async def close(self):
+        drain_task = getattr(self, "drain_task", None)
+        if drain_task is not None:
+            drain_task.cancel()
+        await super().close()
 
     async def run(self):
+        if self.unscored_policy == "queue":
+            self.drain_task = asyncio.ensure_future(self._drain_when_ready())
+        if loadgen_enabled():
+            await self._run_simulator()
+            return
         logger.info(f"Starting Twitch Chat Adapter (Raw WebSocket Mode) for {self.channel}...")
         while True:
             try:
                 # Use context manager for auto-cleanup and better stability
                 async with websockets.connect(self.uri) as websocket:
+                    self.websocket = websocket
                     # Authenticate
                     await websocket.send(f"PASS {self.token}")
                     await websocket.send(f"NICK {self.nickname}")
@@ -114,7 +193,8 @@ class TwitchChatAdapter(BaseStreamSource):
                                 if not message:
                                     continue
                                     
-                                logger.debug(f"RAW IRC: {message}")
+                                if logger.isEnabledFor(logging.DEBUG):
+                                    message_log.debug("RAW IRC: %s", message)
                                 
                                 # Keep Alive
                                 if message.startswith("PING"):
@@ -130,6 +210,9 @@ class TwitchChatAdapter(BaseStreamSource):
                                 tags = {}
                                 if irc_msg.startswith("@"):
                                     tags_str, irc_msg = irc_msg.split(" ", 1)
+                                    for tag in tags_str[1:].split(";"):
+                                        key, _, value = tag.partition("=")
+                                        tags[key] = value
                                 
                                 # 2. Extract Prefix
                                 if irc_msg.startswith(":"):
@@ -145,17 +228,19 @@ class TwitchChatAdapter(BaseStreamSource):
                                         params, content = irc_msg.split("PRIVMSG ", 1)[1].split(" :", 1)
                                         channel = params.strip()
                                         
-                                        logger.info(f"Received from {username}: {content}")
+                                        message_log.info("Received from %s: %s", username, content)
                                         
                                         # Normalize and Send
-                                        event = self.normalize(content, username)
-                                        await self.producer.send_and_wait(self.topic, json.dumps(event).encode('utf-8'))
-                                        logger.debug(f"Successfully sent enriched chat message to Kafka.")
+                                        # tmi-sent-ts is Twitch's send time in milliseconds
+                                        sent_ts = tags.get("tmi-sent-ts")
+                                        source_ts = int(sent_ts) / 1000.0 if sent_ts else None
+                                        await self.emit(content, username, source_ts=source_ts)
+                                        message_log.debug("Successfully sent enriched chat message to Kafka.")
                                     except Exception as parse_e:
-                                        logger.debug(f"Parsing PRIVMSG failed: {parse_e}")
+                                        message_log.debug("Parsing PRIVMSG failed: %s", parse_e)
 
                                 elif "JOIN" in irc_msg:
-                                    logger.debug(f"System: {username} joined channel.")
+                                    message_log.debug("System: %s joined channel.", username)
                         except asyncio.TimeoutError:
                             logger.info("Socket Timeout (30s) - actively probing with PING")
                             await websocket.send("PING :tmi.twitch.tv")
@@ -165,4 +250,5 @@ class TwitchChatAdapter(BaseStreamSource):
 
             except Exception as e:
                 logger.warning(f"Connection lost or failed: {e}. Retrying in 5s...")
+                self.reconnects_total.inc()
                 await asyncio.sleep(5)
\ No newline at end of file
@@ -0,0 +1,24 @@
+import os
+
+
+def detection_mode() -> str:
+    """
+    Where anomaly detection runs: "ingestion" (the adapters score every event)
+    or "spark" (events are published unscored and the Spark job runs the
+    keyed, checkpointed detectors).
+    """
+    return os.getenv("DETECTION_MODE", "ingestion").lower()
+
+
+def market_detector(symbol: str) -> str:
+    """
+    Market detector name for a symbol: MARKET_DETECTOR_OVERRIDES
+    ("BTCUSDT=quantile,ETHUSDT=zscore") takes precedence over the
+    MARKET_DETECTOR default ("zscore").
+    """
+    overrides = {}
+    for item in os.getenv("MARKET_DETECTOR_OVERRIDES", "").split(","):
+        key, sep, name = item.partition("=")
+        if sep:
+            overrides[key.strip().upper()] = name.strip().lower()
+    return overrides.get(symbol.upper(), os.getenv("MARKET_DETECTOR", "zscore").lower())
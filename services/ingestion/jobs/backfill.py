@@ -0,0 +1,435 @@
+"""
+Bulk historical backfill of market trades and chat logs.
+
+Reads archived files in large chunks instead of going through the adapters'
+live run() loops:
+
+  - market: Binance trade CSVs (data.binance.vision layout, with or without a
+    header), JSONL of raw trade messages ({"s", "p", "q", "T", "t"}) or of
+    normalized market events.
+  - chat: CSV/JSONL with timestamp, author (or user), text (or message) and
+    optionally channel columns.
+
+JSONL files are memory-mapped and CSVs are parsed by pandas with
+memory_map=True. Each chunk is enriched in batches: indicators through
+IndicatorEngine.update_batch, market detectors through detect_batch (chosen
+per symbol as in the adapter), toxicity through ToxicityClassifier.predict_batch.
+Chat and symbol sketches are updated from event time and snapshotted per chunk.
+
+Events go to MongoDB as unordered bulk inserts with deterministic _ids, so a
+resumed chunk is not written twice, or to Kafka as pipelined produces that are
+all acknowledged before the chunk counts as done (at-least-once). Progress is
+checkpointed per file in `backfill_state` after every chunk: rerunning the same
+command resumes where it stopped.
+
+A resumed run starts with cold enrichment state: indicators and market/chat
+detectors warm up again from the resume offset, so the first rows after it
+may carry null indicators and no anomalies the original run would have
+flagged. Sketches are snapshotted under a new process instance, which the
+dashboards merge with the earlier run's. The snapshot is written before the
+checkpoint and the two are not atomic: if the process dies between them,
+the resumed run re-adds that one chunk to the Count-Min/top-k counts
+(HyperLogLog unions are unaffected), so those windows over-count by at
+most one chunk.
+
+History older than the compaction watermark is picked up by the next
+`jobs.compaction` pass, which folds it into market_ohlcv/chat_minute_stats
+so it shows up in the long-range charts.
+
+    python -m jobs.backfill market BTCUSDT-trades-2026-01.csv --symbol BTCUSDT
+    python -m jobs.backfill market trades.jsonl --sink kafka
+    python -m jobs.backfill chat chat_log.jsonl --channel somechannel
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import time
+from hashlib import blake2b
+
+import numpy as np
+import pandas as pd
+
+from config.settings import detection_mode, market_detector
+from logic.anomaly_detection.chat_anomaly import ChatAnomalyDetector
+from logic.anomaly_detection.detectors import create_market_detector
+from logic.anomaly_detection.indicators import IndicatorEngine, INDICATOR_FIELDS
+from logic.nlp_toxicity.toxicity_classifier import ToxicityClassifier
+from logic.sketches.chat_windows import ChatSketchAggregator
+from logic.sketches.distinct import DistinctWindows
+from utils.logger import get_logger, configure_logging
+from utils.mongo_client import get_mongo_client, save_events_bulk, save_chat_sketches, save_distinct_counts
+
+logger = get_logger(__name__)
+
+STATE_COLLECTION = "backfill_state"
+
+# data.binance.vision trade files; older ones have no header row
+BINANCE_TRADE_COLUMNS = ["id", "price", "qty", "quote_qty", "time", "is_buyer_maker", "is_best_match"]
+
+# Canonical column -> accepted input names, in order of preference
+COLUMN_ALIASES = {
+    "market": {
+        "price": ("price", "p", "payload.price"),
+        "quantity": ("quantity", "qty", "q", "payload.quantity"),
+        "time": ("time", "T", "E", "timestamp"),
+        "symbol": ("symbol", "s", "payload.symbol"),
+        "trade_id": ("trade_id", "id", "t", "event_id"),
+    },
+    "chat": {
+        "time": ("timestamp", "time", "ts"),
+        "author": ("author", "user", "username", "payload.author"),
+        "text": ("text", "message", "payload.text"),
+        "channel": ("channel", "payload.channel"),
+    },
+}
+OPTIONAL_COLUMNS = {"trade_id"}
+
+
+# --- Reading ---
+
+def _jsonl_chunks(path: str, chunk_rows: int, offset: int):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.seek(offset)
+            while mm.tell() < mm.size():
+                lines = []
+                while len(lines) < chunk_rows:
+                    line = mm.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        lines.append(line)
+                if lines:
+                    yield pd.json_normalize([json.loads(line) for line in lines]), mm.tell()
+
+
+def _has_header(path: str) -> bool:
+    with open(path) as f:
+        first = f.readline().split(",")[0].strip()
+    try:
+        float(first)
+        return False
+    except ValueError:
+        return True
+
+
+def _csv_chunks(path: str, chunk_rows: int, offset: int):
+    header = _has_header(path)
+    reader = pd.read_csv(
+        path,
+        chunksize=chunk_rows,
+        memory_map=True,
+        header=0 if header else None,
+        names=None if header else BINANCE_TRADE_COLUMNS,
+        skiprows=range(1, offset + 1) if header else offset,
+    )
+    for frame in reader:
+        offset += len(frame)
+        yield frame, offset
+
+
+def read_chunks(path: str, chunk_rows: int, offset: int = 0):
+    """
+    Yields (frame, next_offset) chunks of at most `chunk_rows` rows. Offsets
+    are byte positions for JSONL and data-row counts for CSV, so a checkpointed
+    offset resumes exactly after the last finished chunk.
+    """
+    if path.endswith(".csv"):
+        return _csv_chunks(path, chunk_rows, offset)
+    return _jsonl_chunks(path, chunk_rows, offset)
+
+
+def canonical(frame: pd.DataFrame, kind: str, defaults: dict) -> pd.DataFrame:
+    """Maps whichever input column names are present onto the canonical ones."""
+    columns = {}
+    for name, aliases in COLUMN_ALIASES[kind].items():
+        found = next((alias for alias in aliases if alias in frame.columns), None)
+        if found is not None:
+            columns[name] = frame[found].to_numpy()
+        elif defaults.get(name) is not None:
+            columns[name] = np.full(len(frame), defaults[name], dtype=object)
+        elif name not in OPTIONAL_COLUMNS:
+            raise ValueError(f"{kind} input has no '{name}' column (expected one of: {', '.join(aliases)})")
+    return pd.DataFrame(columns)
+
+
+def to_seconds(values) -> np.ndarray:
+    """Epoch seconds from seconds, milliseconds or microseconds (by magnitude) or ISO strings."""
+    values = pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(values):
+        return ((pd.to_datetime(values, utc=True) - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)).to_numpy()
+    t = values.to_numpy(dtype=float)
+    return np.where(t > 1e14, t / 1e6, np.where(t > 1e11, t / 1e3, t))
+
+
+def _nullable(values: np.ndarray) -> list:
+    return [None if v != v else v for v in values.tolist()]
+
+
+# --- Enrichment ---
+
+class MarketBackfill:
+    source = "market_data"
+    kind = "market"
+
+    def __init__(self, symbol: str = None, detect: bool = True, precision: int = 12):
+        self.symbol = symbol.upper() if symbol else None
+        self.detect = detect
+        self.indicator_engine = IndicatorEngine()
+        self.anomaly_detectors = {}
+        self.distinct = DistinctWindows(precision=precision)
+
+    def _detector(self, symbol: str):
+        detector = self.anomaly_detectors.get(symbol)
+        if detector is None:
+            detector = self.anomaly_detectors[symbol] = create_market_detector(market_detector(symbol))
+            logger.info(f"Using '{detector.name}' anomaly detector for {symbol}")
+        return detector
+
+    def events(self, frame: pd.DataFrame) -> list:
+        df = canonical(frame, self.kind, {"symbol": self.symbol})
+        seconds = to_seconds(df["time"])
+        times = seconds.tolist()
+        prices = df["price"].to_numpy(dtype=float)
+        quantities = df["quantity"].to_numpy(dtype=float)
+        symbols = pd.Series(df["symbol"]).astype(str).str.upper()
+        trade_ids = df["trade_id"].tolist() if "trade_id" in df else [None] * len(df)
+
+        events = [None] * len(df)
+        traded_minutes = []
+        for symbol, rows in symbols.groupby(symbols).indices.items():
+            indicators = self.indicator_engine.update_batch(symbol, prices[rows], quantities[rows])
+            fields = {name: _nullable(indicators[name]) for name in INDICATOR_FIELDS}
+            anomalies = self._detector(symbol).detect_batch(prices[rows]) if self.detect else None
+            for k, row in enumerate(rows.tolist()):
+                enrichments = {"indicators": {name: fields[name][k] for name in INDICATOR_FIELDS}}
+                if anomalies is not None:
+                    enrichments["anomaly"] = anomalies[k]
+                events[row] = {
+                    "source": self.source,
+                    "type": "trade",
+                    "event_id": trade_ids[row],
+                    "timestamp": times[row],
+                    "payload": {"symbol": symbol, "price": float(prices[row]), "quantity": float(quantities[row])},
+                    "enrichments": enrichments,
+                }
+            traded_minutes.extend((minute, symbol) for minute in np.unique(seconds[rows] // 60 * 60).tolist())
+        # One HyperLogLog update per minute a symbol traded in covers every window (in time order)
+        for minute, symbol in sorted(traded_minutes):
+            self.distinct.add("symbols", "market", symbol, minute)
+        return events
+
+    def save_sketches(self):
+        save_distinct_counts(self.distinct.snapshot_docs())
+
+
+class ChatBackfill:
+    source = "twitch_chat"
+    kind = "chat"
+
+    def __init__(self, channel: str = None, detect: bool = True, classifier: ToxicityClassifier = None,
+                 batch_size: int = 32, precision: int = 12):
+        self.channel = channel
+        self.detect = detect
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.anomaly_detectors = {}
+        self.sketches = ChatSketchAggregator(
+            capacity=int(os.getenv("SKETCH_TOP_K_CAPACITY", "200")),
+            width=int(os.getenv("SKETCH_CMS_WIDTH", "2048")),
+            depth=int(os.getenv("SKETCH_CMS_DEPTH", "4")),
+        )
+        self.distinct = DistinctWindows(precision=precision)
+
+    def _detector(self, channel: str):
+        # One detector per channel, as with one live adapter per channel
+        detector = self.anomaly_detectors.get(channel)
+        if detector is None:
+            detector = self.anomaly_detectors[channel] = ChatAnomalyDetector()
+        return detector
+
+    def events(self, frame: pd.DataFrame) -> list:
+        df = canonical(frame, self.kind, {"channel": self.channel})
+        times = to_seconds(df["time"]).tolist()
+        authors = df["author"].astype(str).tolist()
+        texts = df["text"].fillna("").astype(str).tolist()
+        channels = [f"#{str(channel).lower().lstrip('#')}" for channel in df["channel"].tolist()]
+
+        scored = self.classifier is not None and self.classifier.ready
+        scores = self.classifier.predict_batch(texts, self.batch_size) if scored else None
+
+        events = []
+        for i, text in enumerate(texts):
+            enrichments = {"toxicity": scores[i]} if scored else {"toxicity": {}, "toxicity_status": "unscored"}
+            event = {
+                "source": self.source,
+                "type": "chat",
+                "event_id": str(times[i]),
+                "timestamp": times[i],
+                "payload": {"author": authors[i], "text": text, "channel": channels[i]},
+                "enrichments": enrichments,
+            }
+            toxic = enrichments["toxicity"].get("toxic", 0.0)
+            self.sketches.update(channels[i], authors[i], toxic, times[i])
+            self.distinct.add("chatters", channels[i], authors[i], times[i])
+            if self.detect:
+                enrichments["anomaly"] = self._detector(channels[i]).detect(event)
+            events.append(event)
+        return events
+
+    def save_sketches(self):
+        save_chat_sketches(self.sketches.snapshot_docs())
+        save_distinct_counts(self.distinct.snapshot_docs())
+
+
+# --- Output ---
+
+class MongoSink:
+    name = "mongo"
+
+    async def write(self, events: list, first_id: str, first_row: int) -> int:
+        for i, event in enumerate(events):
+            event["_id"] = f"{first_id}:{first_row + i}"
+        return await asyncio.get_running_loop().run_in_executor(None, save_events_bulk, events)
+
+    async def close(self):
+        pass
+
+
+class KafkaSink:
+    name = "kafka"
+
+    def __init__(self, producer, topic: str):
+        self.producer = producer
+        self.topic = topic
+
+    async def write(self, events: list, first_id: str, first_row: int) -> int:
+        # send() only enqueues into the producer's batches; wait for every ack before checkpointing
+        acks = [await self.producer.send(self.topic, json.dumps(event).encode("utf-8")) for event in events]
+        await asyncio.gather(*acks)
+        return len(events)
+
+    async def close(self):
+        await self.producer.stop()
+
+
+# --- Checkpoints ---
+
+class Checkpoint:
+    """Per-file resume point in backfill_state: offset after the last written chunk and rows so far."""
+    def __init__(self, db, kind: str, path: str):
+        self.collection = db[STATE_COLLECTION]
+        self.path = os.path.realpath(path)
+        self.id = f"{kind}|{self.path}"
+        # Prefix of the deterministic event _ids for this file
+        self.event_prefix = f"bf:{kind}:{blake2b(self.path.encode('utf-8'), digest_size=6).hexdigest()}"
+
+    def load(self):
+        state = self.collection.find_one({"_id": self.id}) or {}
+        return state.get("offset", 0), state.get("rows", 0), state.get("done", False)
+
+    def save(self, offset: int, rows: int, done: bool = False):
+        self.collection.update_one(
+            {"_id": self.id},
+            {"$set": {"path": self.path, "offset": offset, "rows": rows, "done": done, "updated_at": time.time()}},
+            upsert=True,
+        )
+
+    def reset(self):
+        self.collection.delete_one({"_id": self.id})
+
+
+async def backfill(path: str, enricher, sink, checkpoint: Checkpoint, chunk_rows: int) -> int:
+    """Streams one file through enrichment into the sink. Returns rows written in this run."""
+    offset, rows, done = checkpoint.load()
+    if done:
+        logger.info(f"{path} was already backfilled ({rows} rows); use --restart to run it again")
+        return 0
+    if offset:
+        logger.info(f"Resuming {path} at offset {offset} ({rows} rows already written)")
+
+    started = time.monotonic()
+    written = 0
+    for frame, next_offset in read_chunks(path, chunk_rows, offset):
+        chunk_started = time.monotonic()
+        events = enricher.events(frame)
+        await sink.write(events, checkpoint.event_prefix, rows)
+        # Not atomic with the checkpoint below; see the module docstring
+        enricher.save_sketches()
+        rows += len(events)
+        written += len(events)
+        offset = next_offset
+        checkpoint.save(offset, rows)
+
+        elapsed = time.monotonic() - started
+        chunk_elapsed = time.monotonic() - chunk_started
+        logger.info(f"[{enricher.kind}] {written} rows ({len(events) / chunk_elapsed:.0f} rows/s chunk, "
+                    f"{written / elapsed:.0f} rows/s overall), offset {offset}")
+
+    checkpoint.save(offset, rows, done=True)
+    elapsed = time.monotonic() - started
+    logger.info(f"Backfill of {path} finished: {written} rows to {sink.name} in {elapsed:.1f}s "
+                f"({written / elapsed if elapsed else 0:.0f} rows/s)")
+    return written
+
+
+async def run(args):
+    db = get_mongo_client()
+    detect = not args.no_detect and (args.sink == "mongo" or detection_mode() == "ingestion")
+    precision = int(os.getenv("HLL_PRECISION", "12"))
+    if args.kind == "market":
+        enricher = MarketBackfill(symbol=args.symbol, detect=detect, precision=precision)
+        topic = args.topic or os.getenv("MARKET_KAFKA_TOPIC")
+    else:
+        classifier = ToxicityClassifier.get_instance()
+        logger.info("Waiting for the toxicity model...")
+        await classifier.wait_until_loaded()
+        if not classifier.ready:
+            logger.warning("Toxicity model unavailable: chat will be backfilled as unscored.")
+        enricher = ChatBackfill(channel=args.channel, detect=detect, classifier=classifier,
+                                batch_size=args.batch_size, precision=precision)
+        topic = args.topic or os.getenv("CHAT_KAFKA_TOPIC")
+
+    if args.sink == "kafka":
+        from utils.kafka_producer import get_kafka_producer
+        producer = await get_kafka_producer(linger_ms=20, max_batch_size=1048576)
+        sink = KafkaSink(producer, topic)
+    else:
+        sink = MongoSink()
+
+    checkpoint = Checkpoint(db, args.kind, args.path)
+    if args.restart:
+        checkpoint.reset()
+    try:
+        await backfill(args.path, enricher, sink, checkpoint, args.chunk_rows)
+    finally:
+        await sink.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill archived market trades or chat logs.")
+    parser.add_argument("kind", choices=("market", "chat"))
+    parser.add_argument("path", help="CSV or JSONL file")
+    parser.add_argument("--sink", choices=("mongo", "kafka"), default="mongo",
+                        help="mongo: bulk insert into enriched_events; kafka: produce to the live topic")
+    parser.add_argument("--symbol", help="Symbol for files without a symbol column (Binance CSVs)")
+    parser.add_argument("--channel", help="Channel for chat files without a channel column")
+    parser.add_argument("--topic", help="Kafka topic (default: MARKET_KAFKA_TOPIC / CHAT_KAFKA_TOPIC)")
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="Rows per chunk")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per toxicity inference batch")
+    parser.add_argument("--no-detect", action="store_true", help="Skip anomaly detection")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    configure_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Replays a trade price series through every market detector and compares
+anomaly rates and CPU cost per tick.
+
+Prices come from recorded data: raw ticks in MongoDB (`--mongo SYMBOL`), a
+file of Binance trade messages or normalized events (`--file trades.jsonl`),
+or a CSV/Parquet file with a `price` column. `--synthetic N` generates a
+heavy-tailed series (Student-t returns, tick-size rounding) for a
+reproducible run without recorded data.
+
+    python -m jobs.benchmark_detectors --mongo BTCUSDT --limit 200000
+    python -m jobs.benchmark_detectors --file trades.jsonl
+    python -m jobs.benchmark_detectors --synthetic 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from logic.anomaly_detection.detectors import MARKET_DETECTORS
+from utils.logger import get_logger, configure_logging
+
+logger = get_logger(__name__)
+
+
+def prices_from_mongo(symbol: str, limit: int) -> np.ndarray:
+    from utils.mongo_client import get_mongo_client
+    cursor = (
+        get_mongo_client().enriched_events
+        .find({"source": "market_data", "payload.symbol": symbol.upper()}, {"payload.price": 1})
+        .sort("timestamp", 1)
+        .limit(limit)
+    )
+    return np.array([doc["payload"]["price"] for doc in cursor], dtype=float)
+
+
+def prices_from_file(path: str) -> np.ndarray:
+    if path.endswith((".csv", ".parquet")):
+        import pandas as pd
+        frame = pd.read_parquet(path, columns=["price"]) if path.endswith(".parquet") else pd.read_csv(path, usecols=["price"])
+        return frame["price"].to_numpy(dtype=float)
+    prices = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                # Binance trade message ("p") or a normalized market event
+                prices.append(float(record["p"] if "p" in record else record["payload"]["price"]))
+    return np.array(prices, dtype=float)
+
+
+def synthetic_prices(n: int, seed: int = 7, tick_size: float = 0.01) -> np.ndarray:
+    """Student-t (3 degrees of freedom) log returns around 100k, rounded to the tick size."""
+    rng = np.random.default_rng(seed)
+    returns = rng.standard_t(3, n) * 2e-5
+    return np.round(1e5 * np.exp(np.cumsum(returns)) / tick_size) * tick_size
+
+
+def run(prices: np.ndarray, names=None) -> list:
+    """Runs each detector over the series. Returns one result row per detector."""
+    rows = []
+    for name in names or MARKET_DETECTORS:
+        detector = MARKET_DETECTORS[name].from_env()
+        anomalies = 0
+        started = time.process_time()
+        for price in prices.tolist():
+            if detector.detect(price)["is_anomaly"]:
+                anomalies += 1
+        cpu = time.process_time() - started
+        rows.append({
+            "detector": name,
+            "ticks": len(prices),
+            "anomalies": anomalies,
+            "anomaly_rate": anomalies / len(prices) if len(prices) else 0.0,
+            "cpu_us_per_tick": cpu / len(prices) * 1e6 if len(prices) else 0.0,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare market anomaly detectors on a recorded price series.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--mongo", metavar="SYMBOL", help="Raw ticks for SYMBOL from enriched_events")
+    source.add_argument("--file", help="JSONL trades/events, or CSV/Parquet with a price column")
+    source.add_argument("--synthetic", type=int, metavar="N", help="N synthetic heavy-tailed ticks")
+    parser.add_argument("--limit", type=int, default=500000, help="Maximum ticks read from MongoDB")
+    parser.add_argument("--detectors", help="Comma-separated detector names (default: all)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    configure_logging()
+
+    if args.mongo:
+        prices = prices_from_mongo(args.mongo, args.limit)
+    elif args.file:
+        prices = prices_from_file(args.file)
+    else:
+        prices = synthetic_prices(args.synthetic)
+    logger.info(f"Replaying {len(prices)} ticks")
+
+    names = args.detectors.split(",") if args.detectors else None
+    print(f"{'detector':<10} {'ticks':>9} {'anomalies':>10} {'rate':>8} {'cpu µs/tick':>12}")
+    for row in run(prices, names):
+        print(f"{row['detector']:<10} {row['ticks']:>9} {row['anomalies']:>10} "
+              f"{row['anomaly_rate']:>8.3%} {row['cpu_us_per_tick']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
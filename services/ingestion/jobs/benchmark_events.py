@@ -0,0 +1,161 @@
+"""
+Measures what the event representation costs on the tick path: memory
+blocks and bytes held per in-flight event, transient peak bytes per event
+(tracemalloc) and CPU time, for the nested-dict form adapters used to build
+versus the slotted events in utils.events.
+
+Each path normalizes, stamps and serializes for Kafka; with `mongo` it also
+produces the MongoDB document the simulator writes. Enrichment results are
+fixed so only the representation differs.
+
+    python -m jobs.benchmark_events --events 20000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import bson
+
+from utils.events import TradeEvent, ChatEvent
+from utils.latency import new_stages, stamp, STAGE_ENRICHED, STAGE_PRODUCED, STAGE_WRITTEN
+
+INDICATORS = {
+    "ema_fast": 100012.5, "ema_slow": 100010.25, "macd": 2.25, "macd_signal": 1.75, "macd_hist": 0.5,
+    "rsi": 55.2, "bb_upper": 100050.0, "bb_lower": 99970.0, "vwap": 100011.0, "volatility": None,
+}
+ANOMALY = {"is_anomaly": False, "type": None, "severity": 0.0, "z_score": 0.42, "schema_version": 2, "details": {}}
+TOXICITY = {"toxic": 0.01, "severe_toxic": 0.0, "obscene": 0.0, "threat": 0.0, "insult": 0.0, "identity_hate": 0.0}
+
+
+def dict_trade(i: int, mongo: bool):
+    timestamp = time.time()
+    event = {
+        "source": "market_data",
+        "type": "trade",
+        "event_id": i,
+        "timestamp": timestamp,
+        "stages": new_stages(timestamp - 0.05, timestamp),
+        "payload": {"symbol": "BTCUSDT", "price": 100000.0 + i % 500 * 0.01, "quantity": 0.5},
+    }
+    event["enrichments"] = {"indicators": INDICATORS}
+    event["enrichments"]["anomaly"] = ANOMALY
+    stamp(event, STAGE_ENRICHED)
+    stamp(event, STAGE_PRODUCED)
+    value = json.dumps(event).encode('utf-8')
+    if not mongo:
+        return event, value
+    doc = event.copy()
+    stamp(doc, STAGE_WRITTEN)
+    return event, value, bson.encode(doc)
+
+
+def typed_trade(i: int, mongo: bool):
+    timestamp = time.time()
+    event = TradeEvent(i, timestamp, new_stages(timestamp - 0.05, timestamp),
+                       "BTCUSDT", 100000.0 + i % 500 * 0.01, 0.5, INDICATORS, ANOMALY)
+    stamp(event, STAGE_ENRICHED)
+    stamp(event, STAGE_PRODUCED)
+    value = event.encode()
+    if not mongo:
+        return event, value
+    doc = event.to_dict()
+    stamp(doc, STAGE_WRITTEN)
+    return event, value, bson.encode(doc)
+
+
+def dict_chat(i: int, mongo: bool):
+    timestamp = time.time()
+    event = {
+        "source": "twitch_chat",
+        "type": "chat",
+        "event_id": str(timestamp),
+        "timestamp": timestamp,
+        "stages": new_stages(timestamp - 0.05, timestamp),
+        "payload": {"author": f"user{i % 300}", "text": "that play was actually insane", "channel": "#channel"},
+    }
+    event["enrichments"] = {"toxicity": TOXICITY}
+    event["enrichments"]["anomaly"] = ANOMALY
+    stamp(event, STAGE_ENRICHED)
+    stamp(event, STAGE_PRODUCED)
+    return event, json.dumps(event).encode('utf-8')
+
+
+def typed_chat(i: int, mongo: bool):
+    timestamp = time.time()
+    event = ChatEvent(str(timestamp), timestamp, new_stages(timestamp - 0.05, timestamp),
+                      f"user{i % 300}", "that play was actually insane", "#channel", TOXICITY, anomaly=ANOMALY)
+    stamp(event, STAGE_ENRICHED)
+    stamp(event, STAGE_PRODUCED)
+    return event, event.encode()
+
+
+PATHS = {
+    "trade": {"dict": dict_trade, "event": typed_trade},
+    "chat": {"dict": dict_chat, "event": typed_chat},
+}
+
+
+def measure(path, n: int, mongo: bool = False) -> dict:
+    """
+    Runs `path` n times. Blocks and bytes are what stays allocated per event
+    while the results are held (an event awaiting its Kafka ack); peak is the
+    transient high-water mark of producing one event.
+    """
+    for i in range(min(n, 1000)):
+        path(i, mongo)
+
+    held = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(n):
+            held.append(path(i, mongo))
+        stats = tracemalloc.take_snapshot().compare_to(before, "filename")
+        held.clear()
+        peak = 0
+        for i in range(n):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            path(i, mongo)
+            peak += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+
+    started = time.process_time()
+    for i in range(n):
+        path(i, mongo)
+    cpu = time.process_time() - started
+    return {
+        "blocks_per_event": sum(stat.count_diff for stat in stats) / n,
+        "bytes_per_event": sum(stat.size_diff for stat in stats) / n,
+        "peak_bytes_per_event": peak / n,
+        "cpu_us_per_event": cpu / n * 1e6,
+        # Payload size on the wire (Kafka value)
+        "kafka_bytes": len(path(0, mongo)[1]),
+    }
+
+
+def run(n: int, mongo: bool = False) -> list:
+    rows = []
+    for kind, paths in PATHS.items():
+        for name, path in paths.items():
+            rows.append({"kind": kind, "representation": name, **measure(path, n, mongo)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare allocations per event for dict and slotted events.")
+    parser.add_argument("--events", type=int, default=20000, help="Events per representation")
+    parser.add_argument("--mongo", action="store_true", help="Also build the MongoDB document (simulator path)")
+    args = parser.parse_args()
+
+    print(f"{'kind':<6} {'repr':<6} {'blocks':>7} {'held B':>7} {'peak B':>7} {'cpu µs':>7} {'kafka B':>8}")
+    for row in run(args.events, args.mongo):
+        print(f"{row['kind']:<6} {row['representation']:<6} {row['blocks_per_event']:>7.1f} "
+              f"{row['bytes_per_event']:>7.0f} {row['peak_bytes_per_event']:>7.0f} "
+              f"{row['cpu_us_per_event']:>7.2f} {row['kafka_bytes']:>8}")
+
+
+if __name__ == "__main__":
+    main()
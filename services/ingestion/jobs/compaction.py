@@ -0,0 +1,345 @@
+"""
+Retention compaction for the raw `enriched_events` collection.
+
+Market ticks older than COMPACTION_RETENTION_SECONDS are rolled up into OHLCV
+bars (`market_ohlcv`) and chat messages into per-minute aggregates
+(`chat_minute_stats`). The raw documents of each compacted range are then
+deleted in bulk, or first copied to `enriched_events_archive`
+(COMPACTION_RAW_POLICY=archive).
+
+Work proceeds in fixed chunks from a per-source watermark kept in
+`compaction_state`. The chunk currently being compacted is recorded with its
+phase, so an interrupted run resumes where it stopped: aggregates are written
+with replace-on-_id merges and are never recomputed from a partially deleted
+chunk. Before aggregating, the chunk's raw documents are claimed with a
+`compaction_chunk` marker, and only claimed documents are aggregated and
+deleted: rows a concurrent backfill inserts into the chunk meanwhile are
+left in place for the late sweep below instead of being deleted unrolled.
+
+Raw documents that land below the watermark later (historical backfills, or
+late Spark writes) are swept on every pass: their chunks are aggregated and
+folded into the existing bars/stats instead of replacing them, then removed
+like any other chunk. Folding is exact for counts, volume, high/low and VWAP;
+open/close follow the first/last trade times, and a late chat chunk's
+unique_authors is added to the stored count (an upper bound when the same
+users also chatted in the live data).
+
+    python -m jobs.compaction            # one pass
+    python -m jobs.compaction --loop     # every COMPACTION_INTERVAL_SECONDS
+"""
+import argparse
+import os
+import time
+
+from pymongo import ASCENDING
+
+from utils.logger import get_logger, configure_logging
+from utils.mongo_client import get_mongo_client
+
+logger = get_logger(__name__)
+
+RAW_COLLECTION = "enriched_events"
+ARCHIVE_COLLECTION = "enriched_events_archive"
+STATE_COLLECTION = "compaction_state"
+
+PHASE_AGGREGATED = "aggregated"
+# Set on a chunk's raw documents before aggregation; only those are rolled up and removed
+CLAIM_FIELD = "compaction_chunk"
+# chat_minute_stats is per minute whatever COMPACTION_BAR_SECONDS sets for market bars
+CHAT_BUCKET_SECONDS = 60
+
+
+def _bucket(seconds: int) -> dict:
+    """Start of the `seconds`-wide bucket containing the document's timestamp."""
+    return {"$subtract": ["$timestamp", {"$mod": ["$timestamp", seconds]}]}
+
+
+def _is_anomaly() -> dict:
+    return {"$cond": [{"$in": ["$enrichments.anomaly.is_anomaly", ["true", "True", True]]}, 1, 0]}
+
+
+def _raw_match(source: str, start: float, end: float, claim=None) -> dict:
+    match = {"source": source, "timestamp": {"$gte": start, "$lt": end}}
+    if claim is not None:
+        match[CLAIM_FIELD] = claim
+    return match
+
+
+def _sum(field: str) -> dict:
+    return {"$add": [{"$ifNull": [f"${field}", 0]}, {"$ifNull": [f"$$new.{field}", 0]}]}
+
+
+# $merge whenMatched pipelines folding a late chunk's aggregates ($$new) into stored ones
+MARKET_FOLD = [{"$set": {
+    "open": {"$cond": [{"$lt": ["$$new.first_ts", {"$ifNull": ["$first_ts", "$timestamp"]}]}, "$$new.open", "$open"]},
+    "close": {"$cond": [{"$gt": ["$$new.last_ts", {"$ifNull": ["$last_ts", {"$add": ["$timestamp", "$bar_seconds"]}]}]},
+                        "$$new.close", "$close"]},
+    "first_ts": {"$min": ["$first_ts", "$$new.first_ts"]},
+    "last_ts": {"$max": ["$last_ts", "$$new.last_ts"]},
+    "high": {"$max": ["$high", "$$new.high"]},
+    "low": {"$min": ["$low", "$$new.low"]},
+    "volume": _sum("volume"),
+    "trades": _sum("trades"),
+    "anomalies": _sum("anomalies"),
+    "vwap": {"$cond": [
+        {"$gt": [_sum("volume"), 0]},
+        {"$divide": [{"$add": [
+            {"$multiply": [{"$ifNull": ["$vwap", 0]}, {"$ifNull": ["$volume", 0]}]},
+            {"$multiply": [{"$ifNull": ["$$new.vwap", 0]}, {"$ifNull": ["$$new.volume", 0]}]},
+        ]}, _sum("volume")]},
+        None,
+    ]},
+}}]
+
+CHAT_FOLD = [{"$set": {
+    "messages": _sum("messages"),
+    "avg_toxicity": {"$cond": [
+        {"$eq": [{"$ifNull": ["$avg_toxicity", None]}, None]}, "$$new.avg_toxicity",
+        {"$cond": [
+            {"$eq": [{"$ifNull": ["$$new.avg_toxicity", None]}, None]}, "$avg_toxicity",
+            {"$divide": [{"$add": [{"$multiply": ["$avg_toxicity", "$messages"]},
+                                   {"$multiply": ["$$new.avg_toxicity", "$$new.messages"]}]}, _sum("messages")]},
+        ]},
+    ]},
+    "max_toxicity": {"$max": ["$max_toxicity", "$$new.max_toxicity"]},
+    "unscored": _sum("unscored"),
+    "anomalies": _sum("anomalies"),
+    "unique_authors": _sum("unique_authors"),
+}}]
+
+
+def market_pipeline(start: float, end: float, bar_seconds: int, fold: bool = False, claim=None) -> list:
+    """
+    Aggregates raw trades in [start, end) (only those carrying `claim`, if
+    given) into OHLCV bars merged into market_ohlcv, replacing existing bars
+    or, with `fold`, folding into them.
+    """
+    return [
+        {"$match": _raw_match("market_data", start, end, claim)},
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": {"symbol": "$payload.symbol", "bar": _bucket(bar_seconds)},
+            "open": {"$first": "$payload.price"},
+            "high": {"$max": "$payload.price"},
+            "low": {"$min": "$payload.price"},
+            "close": {"$last": "$payload.price"},
+            "volume": {"$sum": "$payload.quantity"},
+            "notional": {"$sum": {"$multiply": ["$payload.price", "$payload.quantity"]}},
+            "trades": {"$sum": 1},
+            "anomalies": {"$sum": _is_anomaly()},
+            "first_ts": {"$first": "$timestamp"},
+            "last_ts": {"$last": "$timestamp"},
+        }},
+        {"$project": {
+            "_id": {"$concat": [{"$ifNull": ["$_id.symbol", "unknown"]}, "|", {"$toString": "$_id.bar"}]},
+            "symbol": "$_id.symbol",
+            "timestamp": "$_id.bar",
+            "bar_seconds": {"$literal": bar_seconds},
+            "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1, "trades": 1, "anomalies": 1,
+            "first_ts": 1, "last_ts": 1,
+            "vwap": {"$cond": [{"$gt": ["$volume", 0]}, {"$divide": ["$notional", "$volume"]}, None]},
+        }},
+        {"$merge": {"into": "market_ohlcv", "on": "_id", "whenMatched": MARKET_FOLD if fold else "replace",
+                    "whenNotMatched": "insert"}},
+    ]
+
+
+def chat_pipeline(start: float, end: float, bar_seconds: int = CHAT_BUCKET_SECONDS, fold: bool = False,
+                  claim=None) -> list:
+    """
+    Aggregates raw chat messages in [start, end) (only those carrying `claim`,
+    if given) into per-minute stats merged into chat_minute_stats, replacing
+    existing documents or, with `fold`, folding into them.
+    CompactionJob always passes CHAT_BUCKET_SECONDS; other widths would break the collection's meaning.
+    """
+    return [
+        {"$match": _raw_match("twitch_chat", start, end, claim)},
+        {"$group": {
+            "_id": {"channel": {"$ifNull": ["$payload.channel", "unknown"]}, "minute": _bucket(bar_seconds)},
+            "messages": {"$sum": 1},
+            "authors": {"$addToSet": "$payload.author"},
+            "avg_toxicity": {"$avg": "$enrichments.toxicity.toxic"},
+            "max_toxicity": {"$max": "$enrichments.toxicity.toxic"},
+            "unscored": {"$sum": {"$cond": [{"$eq": ["$enrichments.toxicity_status", "unscored"]}, 1, 0]}},
+            "anomalies": {"$sum": _is_anomaly()},
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.channel", "|", {"$toString": "$_id.minute"}]},
+            "channel": "$_id.channel",
+            "timestamp": "$_id.minute",
+            "messages": 1, "avg_toxicity": 1, "max_toxicity": 1, "unscored": 1, "anomalies": 1,
+            "unique_authors": {"$size": "$authors"},
+        }},
+        {"$merge": {"into": "chat_minute_stats", "on": "_id", "whenMatched": CHAT_FOLD if fold else "replace",
+                    "whenNotMatched": "insert"}},
+    ]
+
+
+PIPELINES = {
+    "market_data": market_pipeline,
+    "twitch_chat": chat_pipeline,
+}
+
+
+class CompactionJob:
+    """Rolls raw events older than the retention age into aggregates, one chunk at a time."""
+    def __init__(self, db, retention_seconds: float = 86400, chunk_seconds: int = 3600,
+                 bar_seconds: int = 60, raw_policy: str = "delete"):
+        if chunk_seconds % bar_seconds or chunk_seconds % CHAT_BUCKET_SECONDS:
+            raise ValueError(f"chunk_seconds must be a multiple of bar_seconds and of {CHAT_BUCKET_SECONDS}")
+        self.db = db
+        self.retention_seconds = retention_seconds
+        self.chunk_seconds = chunk_seconds
+        self.bar_seconds = bar_seconds
+        self.raw_policy = raw_policy
+        self.db[RAW_COLLECTION].create_index([("source", ASCENDING), ("timestamp", ASCENDING)])
+
+    @classmethod
+    def from_env(cls, db):
+        return cls(
+            db,
+            retention_seconds=float(os.getenv("COMPACTION_RETENTION_SECONDS", "86400")),
+            chunk_seconds=int(os.getenv("COMPACTION_CHUNK_SECONDS", "3600")),
+            bar_seconds=int(os.getenv("COMPACTION_BAR_SECONDS", "60")),
+            raw_policy=os.getenv("COMPACTION_RAW_POLICY", "delete").lower(),
+        )
+
+    def _pipeline(self, source: str, start: float, end: float, fold: bool = False) -> list:
+        """Aggregation of one claimed chunk: market bars are bar_seconds wide, chat stats always per minute."""
+        bar_seconds = self.bar_seconds if source == "market_data" else CHAT_BUCKET_SECONDS
+        return PIPELINES[source](start, end, bar_seconds, fold=fold, claim=start)
+
+    def _claim(self, source: str, start: float, end: float):
+        """Marks the raw documents present now; later inserts into the chunk stay unclaimed."""
+        self.db[RAW_COLLECTION].update_many(_raw_match(source, start, end), {"$set": {CLAIM_FIELD: start}})
+
+    def _start_of(self, source: str):
+        """Watermark to resume from, or the chunk holding the oldest raw document on a first run."""
+        state = self.db[STATE_COLLECTION].find_one({"_id": source})
+        if state:
+            return state["compacted_until"], state.get("pending")
+        oldest = self.db[RAW_COLLECTION].find_one(
+            {"source": source, "timestamp": {"$type": "number"}}, sort=[("timestamp", ASCENDING)])
+        if oldest is None:
+            return None, None
+        return oldest["timestamp"] - oldest["timestamp"] % self.chunk_seconds, None
+
+    def _set_state(self, source: str, compacted_until: float, pending=None):
+        self.db[STATE_COLLECTION].update_one(
+            {"_id": source},
+            {"$set": {"compacted_until": compacted_until, "pending": pending, "updated_at": time.time()}},
+            upsert=True,
+        )
+
+    def _remove_raw(self, source: str, start: float, end: float) -> int:
+        raw_filter = _raw_match(source, start, end, claim=start)
+        if self.raw_policy == "archive":
+            self.db[RAW_COLLECTION].aggregate([
+                {"$match": raw_filter},
+                {"$unset": CLAIM_FIELD},
+                {"$merge": {"into": ARCHIVE_COLLECTION, "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"}},
+            ])
+        return self.db[RAW_COLLECTION].delete_many(raw_filter).deleted_count
+
+    def _compact_chunk(self, source: str, start: float, end: float, pending) -> int:
+        # Aggregating a chunk whose raw documents are already partly deleted would
+        # overwrite good bars with partial ones, so a resumed chunk skips this step
+        if not (pending and pending.get("start") == start and pending.get("phase") == PHASE_AGGREGATED):
+            self._claim(source, start, end)
+            self.db[RAW_COLLECTION].aggregate(self._pipeline(source, start, end))
+            self._set_state(source, start, {"start": start, "end": end, "phase": PHASE_AGGREGATED})
+
+        removed = self._remove_raw(source, start, end)
+        self._set_state(source, end)
+        return removed
+
+    def compact_late(self, source: str) -> int:
+        """
+        Folds raw documents below the watermark (backfills, late writes) into
+        the aggregates, one chunk at a time, oldest first. The chunk being
+        folded is recorded as `late_pending`: folding is additive, so a chunk
+        interrupted after its merge is only deleted on resume, never re-merged.
+        """
+        state = self.db[STATE_COLLECTION].find_one({"_id": source})
+        if not state:
+            return 0
+        watermark = state["compacted_until"]
+        late_pending = state.get("late_pending")
+
+        total = 0
+        while True:
+            oldest = self.db[RAW_COLLECTION].find_one(
+                {"source": source, "timestamp": {"$type": "number", "$lt": watermark}}, sort=[("timestamp", ASCENDING)])
+            if oldest is None:
+                break
+            start = oldest["timestamp"] - oldest["timestamp"] % self.chunk_seconds
+            end = min(start + self.chunk_seconds, watermark)
+            if not (late_pending and late_pending.get("start") == start):
+                self._claim(source, start, end)
+                self.db[RAW_COLLECTION].aggregate(self._pipeline(source, start, end, fold=True))
+                self.db[STATE_COLLECTION].update_one(
+                    {"_id": source}, {"$set": {"late_pending": {"start": start, "end": end, "phase": PHASE_AGGREGATED}}})
+            total += self._remove_raw(source, start, end)
+            self.db[STATE_COLLECTION].update_one({"_id": source}, {"$set": {"late_pending": None}})
+            late_pending = None
+
+        if total:
+            logger.info(f"[{source}] folded {total} late raw documents below watermark {watermark:.0f}")
+        return total
+
+    def compact_source(self, source: str, now: float = None) -> int:
+        """
+        Compacts every whole chunk of `source` older than the retention age,
+        moving the watermark forward. Returns raw documents removed. Only
+        chunks at or above the watermark are visited here; raw documents that
+        arrive below it are left to compact_late, which run_once calls first.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_seconds
+        cutoff -= cutoff % self.chunk_seconds
+        start, pending = self._start_of(source)
+        if start is None:
+            return 0
+
+        total = 0
+        started = time.monotonic()
+        while start + self.chunk_seconds <= cutoff:
+            end = start + self.chunk_seconds
+            total += self._compact_chunk(source, start, end, pending)
+            pending = None
+            start = end
+
+        elapsed = time.monotonic() - started
+        if total:
+            logger.info(f"[{source}] compacted {total} raw documents in {elapsed:.1f}s "
+                        f"({total / elapsed if elapsed else 0:.0f} rows/s), watermark {start:.0f}")
+        return total
+
+    def run_once(self) -> dict:
+        return {source: self.compact_late(source) + self.compact_source(source) for source in PIPELINES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old raw events into OHLCV bars and per-minute chat stats.")
+    parser.add_argument("--loop", action="store_true", help="Keep running every COMPACTION_INTERVAL_SECONDS")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    configure_logging()
+
+    job = CompactionJob.from_env(get_mongo_client())
+    interval = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "300"))
+    while True:
+        started = time.monotonic()
+        results = job.run_once()
+        total = sum(results.values())
+        elapsed = time.monotonic() - started
+        logger.info(f"Compaction pass done: {results} ({total / elapsed if elapsed else 0:.0f} rows/s overall)")
+        if not args.loop:
+            break
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+One-off upgrade of stored anomaly results to the typed schema (version 2).
+
+Version 1 documents hold every anomaly value as a string. Readers already
+convert them on the fly; this job rewrites them in place with server-side
+$convert updates so numeric range queries (e.g. severity >= 4) and the
+indexes created here cover old documents too. Safe to re-run: documents that
+already carry a schema_version are skipped.
+
+    python -m jobs.migrate_anomaly_schema
+"""
+import time
+
+from pymongo import ASCENDING, DESCENDING
+
+from utils.logger import get_logger, configure_logging
+from utils.mongo_client import get_mongo_client
+
+logger = get_logger(__name__)
+
+COLLECTIONS = ("enriched_events", "market_anomalies", "chat_anomalies")
+NUMERIC_FIELDS = ("severity", "mean", "std", "z_score")
+LEGACY_FILTER = {
+    "enrichments.anomaly": {"$type": "object"},
+    "enrichments.anomaly.schema_version": {"$exists": False},
+}
+
+
+def _to_double(field: str) -> dict:
+    path = f"$enrichments.anomaly.{field}"
+    return {"$convert": {"input": path, "to": "double", "onError": None, "onNull": None}}
+
+
+UPGRADE_PIPELINE = [
+    {"$set": {
+        "enrichments.anomaly.schema_version": 1,
+        "enrichments.anomaly.is_anomaly": {"$in": ["$enrichments.anomaly.is_anomaly", ["true", "True", True]]},
+        **{f"enrichments.anomaly.{field}": _to_double(field) for field in NUMERIC_FIELDS},
+    }},
+]
+
+
+def ensure_indexes(db):
+    db.market_anomalies.create_index([("enrichments.anomaly.severity", DESCENDING)])
+    db.market_anomalies.create_index([("payload.symbol", ASCENDING), ("timestamp", DESCENDING)])
+    db.chat_anomalies.create_index([("enrichments.anomaly.type", ASCENDING), ("timestamp", DESCENDING)])
+
+
+def migrate(db) -> dict:
+    """Upgrades every legacy anomaly in place. Returns modified counts per collection."""
+    results = {}
+    for name in COLLECTIONS:
+        started = time.monotonic()
+        modified = db[name].update_many(LEGACY_FILTER, UPGRADE_PIPELINE).modified_count
+        results[name] = modified
+        logger.info(f"[{name}] upgraded {modified} anomaly documents in {time.monotonic() - started:.1f}s")
+    ensure_indexes(db)
+    return results
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    configure_logging()
+    migrate(get_mongo_client())
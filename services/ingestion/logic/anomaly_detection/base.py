@@ -0,0 +1,29 @@
+from abc import ABC, abstractmethod
+
+
+class MarketDetector(ABC):
+    """
+    Contract for per-symbol market anomaly detectors. The market adapter keeps
+    one instance per symbol and feeds it every trade price in order; detect()
+    returns a typed anomaly result (see schema.py).
+    """
+    name = None
+
+    @classmethod
+    @abstractmethod
+    def from_env(cls) -> "MarketDetector":
+        """Builds a detector from its environment settings."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def detect(self, current_price: float) -> dict:
+        """Scores one trade price and folds it into the detector's state."""
+        raise NotImplementedError
+
+    def detect_batch(self, prices) -> list:
+        """
+        Scores a run of consecutive prices, with the same results as calling
+        detect() on each in order. Detectors may override this with a
+        vectorized version for backfills.
+        """
+        return [self.detect(float(price)) for price in prices]
@@ -1,5 +1,6 @@
 from collections import deque, defaultdict
 import time
+from logic.anomaly_detection.schema import anomaly_result
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -17,20 +18,21 @@ class ChatAnomalyDetector:
         self.user_message_counts = defaultdict(lambda: deque())
 
     def detect(self, event: dict) -> dict:
-        result = {"is_anomaly": "false", "type": None, "details": {}}
-        current_time = event["timestamp"]
-        
-        # 1. Toxicity Spike Detection
         toxic_score = event.get("enrichments", {}).get("toxicity", {}).get("toxic", 0.0)
+        return self.check(event["payload"]["author"], event["timestamp"], toxic_score)
+
+    def check(self, author: str, current_time: float, toxic_score: float) -> dict:
+        """Scores one message from its fields, for callers holding a typed event."""
+        result = anomaly_result(False, details={})
+
+        # 1. Toxicity Spike Detection
         if toxic_score > self.toxicity_threshold:
-            result = {
-                "is_anomaly": "true",
-                "type": "toxicity_spike",
-                "details": {"user": event["payload"]["author"], "score": toxic_score}
-            }
+            result = anomaly_result(
+                True, "toxicity_spike",
+                details={"user": author, "score": float(toxic_score)}
+            )
 
         # 2. Message Frequency Anomaly (Spam) Detection per user
-        author = event["payload"]["author"]
         user_deque = self.user_message_counts[author]
         user_deque.append(current_time)
         
@@ -39,10 +41,9 @@ class ChatAnomalyDetector:
             user_deque.popleft()
             
         if len(user_deque) > self.freq_threshold:
-            result = {
-                "is_anomaly": "true",
-                "type": "frequency_spam",
-                "details": {"user": author, "count_in_window": len(user_deque)}
-            }
+            result = anomaly_result(
+                True, "frequency_spam",
+                details={"user": author, "count_in_window": len(user_deque)}
+            )
             
         return result
@@ -0,0 +1,13 @@
+from logic.anomaly_detection.base import MarketDetector
+from logic.anomaly_detection.market_anomaly import MarketAnomalyDetector
+from logic.anomaly_detection.quantile_anomaly import QuantileAnomalyDetector
+
+# Selectable through MARKET_DETECTOR / MARKET_DETECTOR_OVERRIDES (config/settings.py)
+MARKET_DETECTORS = {cls.name: cls for cls in (MarketAnomalyDetector, QuantileAnomalyDetector)}
+
+
+def create_market_detector(name: str) -> MarketDetector:
+    detector_cls = MARKET_DETECTORS.get(name)
+    if detector_cls is None:
+        raise ValueError(f"Unknown market detector '{name}' (expected one of: {', '.join(MARKET_DETECTORS)})")
+    return detector_cls.from_env()
@@ -0,0 +1,337 @@
+import math
+from array import array
+
+import numpy as np
+
+# Layout of the per-symbol scalar state array
+_COUNT = 0
+_LAST_PRICE = 1
+_EMA_FAST = 2
+_EMA_SLOW = 3
+_MACD_SIGNAL = 4
+_AVG_GAIN = 5
+_AVG_LOSS = 6
+_BB_MEAN = 7
+_BB_M2 = 8
+_VWAP_PV = 9
+_VWAP_V = 10
+_STATE_SIZE = 11
+
+INDICATOR_FIELDS = (
+    "ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist",
+    "rsi", "bb_mid", "bb_upper", "bb_lower", "vwap",
+)
+
+# Chunk length of the closed-form vectorized EMA; keeps b**-k well inside float range
+_EMA_CHUNK = 64
+
+
+class IndicatorConfig:
+    def __init__(self, ema_fast=12, ema_slow=26, macd_signal=9, rsi_period=14,
+                 bb_window=20, bb_k=2.0, vwap_window=100):
+        self.ema_fast = ema_fast
+        self.ema_slow = ema_slow
+        self.macd_signal = macd_signal
+        self.rsi_period = rsi_period
+        self.bb_window = bb_window
+        self.bb_k = bb_k
+        self.vwap_window = vwap_window
+
+    @property
+    def alpha_fast(self):
+        return 2.0 / (self.ema_fast + 1)
+
+    @property
+    def alpha_slow(self):
+        return 2.0 / (self.ema_slow + 1)
+
+    @property
+    def alpha_signal(self):
+        return 2.0 / (self.macd_signal + 1)
+
+    @property
+    def alpha_rsi(self):
+        return 1.0 / self.rsi_period
+
+
+class SymbolState:
+    """
+    Compact array-backed indicator state for one symbol: a fixed scalar array
+    plus ring buffers for the Bollinger and VWAP windows.
+    """
+    __slots__ = ("scalars", "bb_ring", "bb_pos", "pv_ring", "v_ring", "vwap_pos")
+
+    def __init__(self, config: IndicatorConfig):
+        self.scalars = array('d', bytes(8 * _STATE_SIZE))
+        self.bb_ring = array('d', bytes(8 * config.bb_window))
+        self.bb_pos = 0
+        self.pv_ring = array('d', bytes(8 * config.vwap_window))
+        self.v_ring = array('d', bytes(8 * config.vwap_window))
+        self.vwap_pos = 0
+
+
+class IndicatorEngine:
+    """
+    Streaming technical indicators per symbol: EMA, MACD, RSI (Wilder),
+    Bollinger bands and rolling VWAP. `update` is O(1) per tick;
+    `update_batch` is its vectorized counterpart and continues from, and
+    leaves behind, the same state (results match up to float rounding).
+
+    Conventions shared by both paths:
+      - EMAs and the MACD signal are seeded with their first input.
+      - RSI smooths gains/losses with alpha = 1/period, seeded with the first change.
+      - Bollinger bands use the population std over the last `bb_window` prices.
+      - VWAP is over the last `vwap_window` trades.
+      - A field is None until its look-back period has been filled.
+    """
+    def __init__(self, config: IndicatorConfig = None):
+        self.config = config or IndicatorConfig()
+        self.states = {}
+
+    def _state(self, symbol: str) -> SymbolState:
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = SymbolState(self.config)
+        return state
+
+    def update(self, symbol: str, price: float, quantity: float) -> dict:
+        cfg = self.config
+        st = self._state(symbol)
+        s = st.scalars
+        n = int(s[_COUNT])
+
+        # --- EMA / MACD ---
+        if n == 0:
+            s[_EMA_FAST] = price
+            s[_EMA_SLOW] = price
+            s[_MACD_SIGNAL] = 0.0
+        else:
+            s[_EMA_FAST] += cfg.alpha_fast * (price - s[_EMA_FAST])
+            s[_EMA_SLOW] += cfg.alpha_slow * (price - s[_EMA_SLOW])
+            macd = s[_EMA_FAST] - s[_EMA_SLOW]
+            s[_MACD_SIGNAL] += cfg.alpha_signal * (macd - s[_MACD_SIGNAL])
+        macd = s[_EMA_FAST] - s[_EMA_SLOW]
+
+        # --- RSI ---
+        if n >= 1:
+            change = price - s[_LAST_PRICE]
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            if n == 1:
+                s[_AVG_GAIN] = gain
+                s[_AVG_LOSS] = loss
+            else:
+                s[_AVG_GAIN] += cfg.alpha_rsi * (gain - s[_AVG_GAIN])
+                s[_AVG_LOSS] += cfg.alpha_rsi * (loss - s[_AVG_LOSS])
+        s[_LAST_PRICE] = price
+
+        # --- Bollinger (sliding Welford over the ring buffer) ---
+        w = cfg.bb_window
+        if n < w:
+            filled = n + 1
+            delta = price - s[_BB_MEAN]
+            s[_BB_MEAN] += delta / filled
+            s[_BB_M2] += delta * (price - s[_BB_MEAN])
+        else:
+            old = st.bb_ring[st.bb_pos]
+            old_mean = s[_BB_MEAN]
+            s[_BB_MEAN] = old_mean + (price - old) / w
+            s[_BB_M2] += (price - old) * (price - s[_BB_MEAN] + old - old_mean)
+        st.bb_ring[st.bb_pos] = price
+        st.bb_pos = (st.bb_pos + 1) % w
+
+        # --- VWAP (rolling sums over the ring buffers) ---
+        pv = price * quantity
+        pos = st.vwap_pos
+        s[_VWAP_PV] += pv - st.pv_ring[pos]
+        s[_VWAP_V] += quantity - st.v_ring[pos]
+        st.pv_ring[pos] = pv
+        st.v_ring[pos] = quantity
+        st.vwap_pos = (pos + 1) % cfg.vwap_window
+
+        n += 1
+        s[_COUNT] = n
+
+        result = dict.fromkeys(INDICATOR_FIELDS)
+        if n >= cfg.ema_fast:
+            result["ema_fast"] = s[_EMA_FAST]
+        if n >= cfg.ema_slow:
+            result["ema_slow"] = s[_EMA_SLOW]
+            result["macd"] = macd
+            if n >= cfg.ema_slow + cfg.macd_signal - 1:
+                result["macd_signal"] = s[_MACD_SIGNAL]
+                result["macd_hist"] = macd - s[_MACD_SIGNAL]
+        if n > cfg.rsi_period:
+            result["rsi"] = _rsi(s[_AVG_GAIN], s[_AVG_LOSS])
+        if n >= w:
+            std = math.sqrt(max(s[_BB_M2], 0.0) / w)
+            result["bb_mid"] = s[_BB_MEAN]
+            result["bb_upper"] = s[_BB_MEAN] + cfg.bb_k * std
+            result["bb_lower"] = s[_BB_MEAN] - cfg.bb_k * std
+        if s[_VWAP_V] > 0:
+            result["vwap"] = s[_VWAP_PV] / s[_VWAP_V]
+        return result
+
+    def update_batch(self, symbol: str, prices, quantities) -> dict:
+        """
+        Vectorized counterpart of `update` for backfills. Returns a dict of
+        float arrays (NaN where `update` would return None).
+        """
+        cfg = self.config
+        prices = np.asarray(prices, dtype=float)
+        quantities = np.asarray(quantities, dtype=float)
+        m = len(prices)
+        out = {name: np.full(m, np.nan) for name in INDICATOR_FIELDS}
+        if m == 0:
+            return out
+
+        st = self._state(symbol)
+        s = st.scalars
+        n0 = int(s[_COUNT])
+        count = n0 + np.arange(1, m + 1)
+
+        # --- EMA / MACD ---
+        seeded = n0 > 0
+        ema_fast = _ema(prices, cfg.alpha_fast, s[_EMA_FAST] if seeded else None)
+        ema_slow = _ema(prices, cfg.alpha_slow, s[_EMA_SLOW] if seeded else None)
+        macd = ema_fast - ema_slow
+        if seeded:
+            signal = _ema(macd, cfg.alpha_signal, s[_MACD_SIGNAL])
+        else:
+            signal = np.concatenate(([0.0], _ema(macd[1:], cfg.alpha_signal, 0.0))) if m > 1 else np.zeros(1)
+
+        # --- RSI ---
+        prev = np.concatenate(([s[_LAST_PRICE]], prices[:-1]))
+        change = prices - prev
+        gain = np.where(change > 0, change, 0.0)
+        loss = np.where(change < 0, -change, 0.0)
+        avg_gain = np.zeros(m)
+        avg_loss = np.zeros(m)
+        if n0 >= 2:
+            avg_gain = _ema(gain, cfg.alpha_rsi, s[_AVG_GAIN])
+            avg_loss = _ema(loss, cfg.alpha_rsi, s[_AVG_LOSS])
+        else:
+            first = 1 - n0  # index of the first change in this batch
+            if first < m:
+                avg_gain[first:] = _ema(gain[first:], cfg.alpha_rsi, None)
+                avg_loss[first:] = _ema(loss[first:], cfg.alpha_rsi, None)
+            if n0 == 1:
+                avg_gain[0], avg_loss[0] = gain[0], loss[0]
+
+        # --- Bollinger ---
+        w = cfg.bb_window
+        history = _ring_ordered(st.bb_ring, st.bb_pos, min(n0, w))
+        extended = np.concatenate((history, prices))
+        bb_mean = np.full(m, np.nan)
+        bb_std = np.full(m, np.nan)
+        if len(extended) >= w:
+            windows = np.lib.stride_tricks.sliding_window_view(extended, w)
+            offset = len(history) - w + 1  # window index ending at prices[0]
+            first_out = max(0, -offset)
+            bb_mean[first_out:] = windows.mean(axis=1)[offset + first_out:]
+            bb_std[first_out:] = windows.std(axis=1)[offset + first_out:]
+
+        # --- VWAP ---
+        v = cfg.vwap_window
+        k = min(n0, v)
+        pv_hist = _ring_ordered(st.pv_ring, st.vwap_pos, k)
+        v_hist = _ring_ordered(st.v_ring, st.vwap_pos, k)
+        pv_all = np.concatenate((pv_hist, prices * quantities))
+        v_all = np.concatenate((v_hist, quantities))
+        pv_cum = np.concatenate(([0.0], np.cumsum(pv_all)))
+        v_cum = np.concatenate(([0.0], np.cumsum(v_all)))
+        ends = np.arange(k + 1, k + m + 1)
+        starts = np.maximum(0, ends - v)
+        pv_sum = pv_cum[ends] - pv_cum[starts]
+        v_sum = v_cum[ends] - v_cum[starts]
+
+        # --- Outputs with the same warm-up rules as `update` ---
+        fast_ok = count >= cfg.ema_fast
+        slow_ok = count >= cfg.ema_slow
+        signal_ok = count >= cfg.ema_slow + cfg.macd_signal - 1
+        out["ema_fast"][fast_ok] = ema_fast[fast_ok]
+        out["ema_slow"][slow_ok] = ema_slow[slow_ok]
+        out["macd"][slow_ok] = macd[slow_ok]
+        out["macd_signal"][signal_ok] = signal[signal_ok]
+        out["macd_hist"][signal_ok] = (macd - signal)[signal_ok]
+        rsi_ok = count > cfg.rsi_period
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = avg_gain / avg_loss
+            rsi = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + rs))
+        out["rsi"][rsi_ok] = rsi[rsi_ok]
+        bb_ok = count >= w
+        out["bb_mid"][bb_ok] = bb_mean[bb_ok]
+        out["bb_upper"][bb_ok] = (bb_mean + cfg.bb_k * bb_std)[bb_ok]
+        out["bb_lower"][bb_ok] = (bb_mean - cfg.bb_k * bb_std)[bb_ok]
+        vwap_ok = v_sum > 0
+        out["vwap"][vwap_ok] = pv_sum[vwap_ok] / v_sum[vwap_ok]
+
+        # --- Write the final state back so streaming can continue ---
+        s[_COUNT] = n0 + m
+        s[_LAST_PRICE] = prices[-1]
+        s[_EMA_FAST] = ema_fast[-1]
+        s[_EMA_SLOW] = ema_slow[-1]
+        s[_MACD_SIGNAL] = signal[-1]
+        s[_AVG_GAIN] = avg_gain[-1]
+        s[_AVG_LOSS] = avg_loss[-1]
+        tail = extended[-w:]
+        st.bb_ring = array('d', bytes(8 * w))
+        st.bb_ring[:len(tail)] = array('d', tail)
+        st.bb_pos = len(tail) % w
+        s[_BB_MEAN] = float(tail.mean())
+        s[_BB_M2] = float(((tail - tail.mean()) ** 2).sum())
+        pv_tail = pv_all[-v:]
+        v_tail = v_all[-v:]
+        st.pv_ring = array('d', bytes(8 * v))
+        st.v_ring = array('d', bytes(8 * v))
+        st.pv_ring[:len(pv_tail)] = array('d', pv_tail)
+        st.v_ring[:len(v_tail)] = array('d', v_tail)
+        st.vwap_pos = len(pv_tail) % v
+        s[_VWAP_PV] = float(pv_tail.sum())
+        s[_VWAP_V] = float(v_tail.sum())
+        return out
+
+
+def compute_indicators(prices, quantities, config: IndicatorConfig = None) -> dict:
+    """Computes all indicators for one symbol's full price history in a single vectorized pass."""
+    return IndicatorEngine(config).update_batch("_batch", prices, quantities)
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0:
+        return 50.0 if avg_gain == 0 else 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def _ring_ordered(ring, pos: int, filled: int) -> np.ndarray:
+    """Returns the last `filled` values of a ring buffer in insertion order."""
+    values = np.frombuffer(ring, dtype=float)
+    if filled < len(values):
+        return values[:filled].copy()
+    return np.concatenate((values[pos:], values[:pos]))
+
+
+def _ema(x: np.ndarray, alpha: float, seed) -> np.ndarray:
+    """
+    Vectorized EMA  e_t = e_{t-1} + alpha * (x_t - e_{t-1}).
+    With seed None the first value seeds the average. Evaluated chunk by chunk
+    in closed form: e_k = b^(k+1) e + alpha * sum_j b^(k-j) x_j, b = 1 - alpha.
+    """
+    out = np.empty(len(x))
+    if len(x) == 0:
+        return out
+    start = 0
+    if seed is None:
+        seed = x[0]
+        out[0] = seed
+        start = 1
+    b = 1.0 - alpha
+    prev = seed
+    for lo in range(start, len(x), _EMA_CHUNK):
+        chunk = x[lo:lo + _EMA_CHUNK]
+        k = np.arange(len(chunk))
+        powers = b ** (k + 1)
+        scaled = np.cumsum(chunk * b ** (-k.astype(float)))
+        out[lo:lo + len(chunk)] = powers * prev + alpha * b ** k * scaled
+        prev = out[lo + len(chunk) - 1]
+    return out
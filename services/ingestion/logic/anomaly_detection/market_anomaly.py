@@ -1,19 +1,34 @@
+import os
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from collections import deque
 
-class MarketAnomalyDetector:
+from logic.anomaly_detection.base import MarketDetector
+from logic.anomaly_detection.schema import anomaly_result
+
+class MarketAnomalyDetector(MarketDetector):
+    """Rolling z-score of the raw price over the last `window_size` trades."""
+    name = "zscore"
+
     def __init__(self, window_size=50, z_score_threshold=3.0):
         self.window_size = window_size
         self.z_score_threshold = z_score_threshold
         self.prices = deque(maxlen=window_size)
 
+    @classmethod
+    def from_env(cls) -> "MarketAnomalyDetector":
+        return cls(
+            window_size=int(os.getenv("ANOMALY_WINDOW_SIZE", "50")),
+            z_score_threshold=float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0")),
+        )
+
     def detect(self, current_price: float) -> dict:
         """
         Detects anomalies based on Z-score of the current price relative to the rolling window.
         """
         if len(self.prices) < 2:
             self.prices.append(current_price)
-            return {"is_anomaly": "false", "reason": "Insufficient data"}
+            return anomaly_result(False, reason="Insufficient data")
 
         mean = np.mean(self.prices)
         std = np.std(self.prices)
@@ -27,11 +42,49 @@ class MarketAnomalyDetector:
         
         self.prices.append(current_price)
 
-        return {
-            "is_anomaly": "true" if is_anomaly else "false",
-            "type": "z_score_outlier" if is_anomaly else "normal",
-            "severity": str(round(float(abs(z_score)), 4)),
-            "mean": str(round(float(mean), 4)),
-            "std": str(round(float(std), 4)),
-            "z_score": str(round(float(z_score), 4))
-        }
+        return anomaly_result(
+            bool(is_anomaly),
+            "z_score_outlier" if is_anomaly else "normal",
+            severity=round(float(abs(z_score)), 4),
+            mean=round(float(mean), 4),
+            std=round(float(std), 4),
+            z_score=round(float(z_score), 4),
+            threshold=self.z_score_threshold,
+        )
+
+    def detect_batch(self, prices, block: int = 8192) -> list:
+        """
+        Vectorized detect() over consecutive prices: once the window is full,
+        each price is scored against a sliding view of the `window_size`
+        prices before it.
+        """
+        prices = np.asarray(prices, dtype=float)
+        results = []
+        i = 0
+        while i < len(prices) and len(self.prices) < self.window_size:
+            results.append(self.detect(float(prices[i])))
+            i += 1
+
+        w = self.window_size
+        for start in range(i, len(prices), block):
+            chunk = prices[start:start + block]
+            history = np.concatenate([np.fromiter(self.prices, dtype=float, count=w), chunk])
+            windows = sliding_window_view(history[:-1], w)
+            mean = windows.mean(axis=1)
+            std = windows.std(axis=1)
+            z_score = np.divide(chunk - mean, std, out=np.zeros_like(chunk), where=std != 0)
+            flags = np.abs(z_score) > self.z_score_threshold
+            self.prices.extend(history[-w:].tolist())
+            results.extend(
+                anomaly_result(
+                    flag,
+                    "z_score_outlier" if flag else "normal",
+                    severity=round(abs(z), 4),
+                    mean=round(m, 4),
+                    std=round(sd, 4),
+                    z_score=round(z, 4),
+                    threshold=self.z_score_threshold,
+                )
+                for flag, z, m, sd in zip(flags.tolist(), z_score.tolist(), mean.tolist(), std.tolist())
+            )
+        return results
@@ -0,0 +1,101 @@
+import math
+import os
+
+import numpy as np
+
+from logic.anomaly_detection.base import MarketDetector
+from logic.anomaly_detection.schema import anomaly_result
+from logic.sketches.kll import KLLSketch, weighted_quantiles
+
+# MAD of a normal distribution is 0.6745 sigma
+MAD_TO_SIGMA = 1.4826
+
+
+class QuantileAnomalyDetector(MarketDetector):
+    """
+    Robust detector over log returns instead of raw prices.
+
+    Returns are summarized by KLL quantile sketches, so the median and the
+    median absolute deviation (MAD) come from bounded memory over a long
+    horizon and are not dragged around by the heavy tails they are meant to
+    flag. A trade is anomalous when its robust z-score,
+    (return - median) / (1.4826 * MAD), exceeds `threshold`.
+
+    The horizon is approximated with two sketches: the current one and the
+    previous `window_ticks` returns. Median and MAD are recomputed every
+    `refresh_every` returns, so a tick costs a comparison plus an amortized
+    O(log k) sketch update.
+    """
+    name = "quantile"
+
+    def __init__(self, threshold=8.0, k=200, window_ticks=10000, refresh_every=32, min_ticks=100):
+        self.threshold = threshold
+        self.k = k
+        self.window_ticks = window_ticks
+        self.refresh_every = refresh_every
+        self.min_ticks = min_ticks
+        self.current = KLLSketch(k)
+        self.previous = None
+        self.last_price = None
+        self.since_refresh = 0
+        self.median = 0.0
+        self.scale = 0.0
+
+    @classmethod
+    def from_env(cls) -> "QuantileAnomalyDetector":
+        return cls(
+            threshold=float(os.getenv("QUANTILE_MAD_THRESHOLD", "8.0")),
+            k=int(os.getenv("QUANTILE_SKETCH_K", "200")),
+            window_ticks=int(os.getenv("QUANTILE_WINDOW_TICKS", "10000")),
+        )
+
+    @property
+    def seen(self) -> int:
+        return self.current.n + (self.previous.n if self.previous is not None else 0)
+
+    def _add(self, log_return: float):
+        if self.current.n >= self.window_ticks:
+            self.previous, self.current = self.current, KLLSketch(self.k)
+        self.current.update(log_return)
+        self.since_refresh += 1
+
+    def _refresh(self):
+        values, weights = self.current.weighted_items()
+        if self.previous is not None:
+            prev_values, prev_weights = self.previous.weighted_items()
+            values = np.concatenate([values, prev_values])
+            weights = np.concatenate([weights, prev_weights])
+        self.median = float(weighted_quantiles(values, weights, [0.5])[0])
+        deviations = np.abs(values - self.median)
+        self.scale = MAD_TO_SIGMA * float(weighted_quantiles(deviations, weights, [0.5])[0])
+        if self.scale == 0:
+            # Most trades repeat the last price: fall back to the 99th percentile deviation
+            self.scale = float(weighted_quantiles(deviations, weights, [0.99])[0]) / 2.576
+        self.since_refresh = 0
+
+    def detect(self, current_price: float) -> dict:
+        previous_price, self.last_price = self.last_price, current_price
+        if not previous_price or previous_price <= 0 or current_price <= 0:
+            return anomaly_result(False, reason="Insufficient data")
+
+        log_return = math.log(current_price / previous_price)
+        if self.seen < self.min_ticks:
+            self._add(log_return)
+            return anomaly_result(False, reason="Insufficient data")
+
+        if self.since_refresh >= self.refresh_every:
+            self._refresh()
+        z_score = (log_return - self.median) / self.scale if self.scale > 0 else 0.0
+        is_anomaly = abs(z_score) > self.threshold
+        self._add(log_return)
+
+        return anomaly_result(
+            bool(is_anomaly),
+            "quantile_outlier" if is_anomaly else "normal",
+            severity=round(abs(z_score), 4),
+            z_score=round(z_score, 4),
+            threshold=self.threshold,
+            log_return=log_return,
+            median=self.median,
+            mad=self.scale / MAD_TO_SIGMA,
+        )
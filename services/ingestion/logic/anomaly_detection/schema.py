@@ -0,0 +1,33 @@
+"""
+Anomaly result schema, version 2.
+
+Every detector returns a dict with native types so MongoDB can index and
+range-query the values (e.g. severity > 4):
+
+    schema_version  int    ANOMALY_SCHEMA_VERSION
+    is_anomaly      bool
+    type            str    detector-specific label, or None
+    severity, z_score                float (market detectors)
+    threshold                        float (market detectors, |z_score| above which is_anomaly)
+    mean, std                        float (z-score detector, rolling price window)
+    log_return, median, mad          float (quantile detector, over log returns)
+    details         dict   {"user": str, "score": float, "count_in_window": int} (chat detectors)
+    reason          str    why no verdict could be given
+
+Version 1 documents (no schema_version) stored every value as a string,
+including "true"/"false"; readers upgrade them on the fly.
+"""
+
+ANOMALY_SCHEMA_VERSION = 2
+
+
+def anomaly_result(is_anomaly: bool, anomaly_type: str = None, **fields) -> dict:
+    return {"schema_version": ANOMALY_SCHEMA_VERSION, "is_anomaly": is_anomaly, "type": anomaly_type, **fields}
+
+
+def is_anomaly(anomaly) -> bool:
+    """True for typed results as well as legacy "true"/"True" strings."""
+    if not anomaly:
+        return False
+    flag = anomaly.get("is_anomaly", anomaly.get("isAnomaly", False))
+    return flag is True or flag in ("true", "True")
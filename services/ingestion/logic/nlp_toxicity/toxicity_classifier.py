@@ -1,64 +1,179 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from utils.logger import get_logger
+import asyncio
+import logging
+import os
+import threading
+import time
+from utils.logger import get_logger, SampledLogger
+from utils.metrics import registry, BATCH_SIZE_BOUNDS
 
 logger = get_logger(__name__)
+error_log = SampledLogger(logger, max_per_interval=1, interval_seconds=10.0)
+
+batch_sizes = registry.histogram("ingestion_toxicity_batch_size", "Texts per toxicity inference call.", BATCH_SIZE_BOUNDS)
+cold_start_seconds = registry.gauge("ingestion_model_cold_start_seconds", "Time from classifier creation to first warm inference.")
+
+LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
 
 class ToxicityClassifier:
     """
     Singleton class using Hugging Face Transformers.
-    Automatically downloads 'unitary/toxic-bert' on first run.
+    The model is loaded on a background thread so ingestion can start while it
+    warms up; callers check `ready` and tag events as unscored until then.
+    Weights are read from MODEL_CACHE_DIR with local_files_only, so startup makes
+    no network calls. Set MODEL_DOWNLOAD_ON_MISS=true to fetch 'unitary/toxic-bert'
+    (~260MB) in the background when the cache is empty.
     """
     _instance = None
     MODEL_NAME = "unitary/toxic-bert"
 
-    def __init__(self):
-        try:
-            logger.info(f"Loading Hugging Face model: {self.MODEL_NAME}...")
-            # This will download the model (~260MB) if not present
-            self.tokenizer = AutoTokenizer.from_pretrained(self.MODEL_NAME)
-            self.model = AutoModelForSequenceClassification.from_pretrained(self.MODEL_NAME)
-            logger.info("Toxicity model loaded successfully.")
-        except Exception as e:
-            logger.error(f"Failed to load NLP model: {e}", exc_info=True)
-            self.model = None
-            self.tokenizer = None
+    def __init__(self, cache_dir: str = None, download_on_miss: bool = False):
+        self.cache_dir = cache_dir
+        self.download_on_miss = download_on_miss
+        self.model = None
+        self.tokenizer = None
+        self.torch = None
+        self.state = STATE_LOADING
+        self.ready_event = threading.Event()
+        self.created_at = time.monotonic()
+        registry.gauge("ingestion_model_ready", "1 once the toxicity model is loaded and warm.",
+                       fn=lambda: 1 if self.ready else 0)
 
     @classmethod
     def get_instance(cls):
+        """Returns the shared classifier, starting the background load on first use."""
         if cls._instance is None:
-            cls._instance = ToxicityClassifier()
+            cls._instance = ToxicityClassifier(
+                cache_dir=os.getenv("MODEL_CACHE_DIR") or None,
+                download_on_miss=os.getenv("MODEL_DOWNLOAD_ON_MISS", "false").lower() == "true",
+            )
+            cls._instance.start_loading()
         return cls._instance
 
+    @property
+    def ready(self) -> bool:
+        return self.state == STATE_READY
+
+    def start_loading(self):
+        threading.Thread(target=self._load, name="toxicity-model-loader", daemon=True).start()
+
+    def _from_pretrained(self, local_files_only: bool):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(
+            self.MODEL_NAME, cache_dir=self.cache_dir, local_files_only=local_files_only)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            self.MODEL_NAME, cache_dir=self.cache_dir, local_files_only=local_files_only)
+        return tokenizer, model
+
+    def _load(self):
+        try:
+            # Heavy imports happen here too, off the event loop thread
+            import torch
+            logger.info(f"Loading Hugging Face model: {self.MODEL_NAME} (cache: {self.cache_dir or 'default'})...")
+            try:
+                tokenizer, model = self._from_pretrained(local_files_only=True)
+            except OSError:
+                if not self.download_on_miss:
+                    raise
+                logger.warning(f"{self.MODEL_NAME} not found in the local cache. Downloading in the background...")
+                tokenizer, model = self._from_pretrained(local_files_only=False)
+            model.eval()
+            self.torch = torch
+            self.tokenizer = tokenizer
+            self.model = model
+
+            # One throwaway inference so the first real message does not pay for lazy init
+            self._infer("warm up")
+            elapsed = time.monotonic() - self.created_at
+            cold_start_seconds.set(round(elapsed, 3))
+            self.state = STATE_READY
+            logger.info(f"Toxicity model ready (cold start {elapsed:.2f}s).")
+        except Exception as e:
+            self.state = STATE_FAILED
+            logger.error(f"Failed to load NLP model: {e}. Chat events will be published unscored.", exc_info=True)
+        finally:
+            self.ready_event.set()
+
+    async def wait_until_loaded(self):
+        """Resolves once loading has finished, successfully or not."""
+        while not self.ready_event.is_set():
+            await asyncio.sleep(0.5)
+
+    def _infer(self, text: str) -> dict:
+        # Tokenize input
+        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
+
+        # Run inference (no gradient calculation needed for inference)
+        with self.torch.no_grad():
+            outputs = self.model(**inputs)
+
+        # Apply sigmoid to convert logits to probabilities (0 to 1)
+        probs = self.torch.sigmoid(outputs.logits).squeeze().tolist()
+
+        # Handle edge case where single output is float, not list
+        if isinstance(probs, float):
+            probs = [probs]
+
+        # Create the result dictionary
+        return {label: float(score) for label, score in zip(LABELS, probs)}
+
     def predict(self, text: str) -> dict:
         """
         Predicts toxicity scores for a given text.
         Returns a dictionary mapping labels to float scores (0.0 to 1.0).
         """
-        labels = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
-        default_result = {label: 0.0 for label in labels}
+        default_result = {label: 0.0 for label in LABELS}
 
-        if not self.model or not self.tokenizer:
+        if not self.ready:
             return default_result
-            
-        try:
-            # Tokenize input
-            inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-            
-            # Run inference (no gradient calculation needed for inference)
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-            
-            # Apply sigmoid to convert logits to probabilities (0 to 1)
-            probs = torch.sigmoid(outputs.logits).squeeze().tolist()
-            
-            # Handle edge case where single output is float, not list
-            if isinstance(probs, float):
-                probs = [probs]
-                
-            # Create the result dictionary
-            return {label: float(score) for label, score in zip(labels, probs)}
 
+        batch_sizes.observe(1)
+        try:
+            return self._infer(text)
         except Exception as e:
-            logger.error(f"Error during toxicity prediction: {e}")
-            return default_result
\ No newline at end of file
+            error_log.log(logging.ERROR, "Error during toxicity prediction: %s", e)
+            return default_result
+
+    def _infer_batch(self, texts: list) -> list:
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, max_length=512, padding=True)
+        with self.torch.no_grad():
+            outputs = self.model(**inputs)
+        probs = self.torch.sigmoid(outputs.logits).tolist()
+        return [{label: float(score) for label, score in zip(LABELS, row)} for row in probs]
+
+    def predict_batch(self, texts: list, batch_size: int = 32) -> list:
+        """
+        Batch counterpart of `predict` for backfills. Texts are sorted by
+        length before batching so each padded batch wastes little compute;
+        results come back in input order.
+        """
+        default_result = {label: 0.0 for label in LABELS}
+        if not self.ready:
+            return [dict(default_result) for _ in texts]
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            batch_sizes.observe(len(positions))
+            try:
+                scores = self._infer_batch([texts[i] for i in positions])
+            except Exception as e:
+                error_log.log(logging.ERROR, "Error during batch toxicity prediction: %s", e)
+                scores = [dict(default_result) for _ in positions]
+            for i, score in zip(positions, scores):
+                results[i] = score
+        return results
+
+
+if __name__ == "__main__":
+    # Populates MODEL_CACHE_DIR ahead of time: python -m logic.nlp_toxicity.toxicity_classifier
+    from dotenv import load_dotenv
+    load_dotenv()
+    classifier = ToxicityClassifier(cache_dir=os.getenv("MODEL_CACHE_DIR") or None, download_on_miss=True)
+    classifier._load()
+    raise SystemExit(0 if classifier.ready else 1)
@@ -0,0 +1,135 @@
+from array import array
+from bisect import bisect_left
+
+
+class OrderBookGapError(Exception):
+    """Raised when a depth diff does not continue from the book's last update id."""
+
+
+class BookSide:
+    """
+    One side of the book as two parallel sorted arrays (keys, quantities).
+    Keys are prices for asks and negated prices for bids, so the best level
+    is always at index 0 and both sides share the same update code.
+    Updates are applied in place with a binary search plus array insert/delete.
+    """
+    __slots__ = ("sign", "keys", "qtys")
+
+    def __init__(self, is_bid: bool):
+        self.sign = -1.0 if is_bid else 1.0
+        self.keys = array('d')
+        self.qtys = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        self.keys = array('d')
+        self.qtys = array('d')
+
+    def update(self, price: float, qty: float):
+        """Sets the quantity at a price level; a quantity of 0 removes the level."""
+        key = self.sign * price
+        keys = self.keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            if qty == 0.0:
+                del keys[i]
+                del self.qtys[i]
+            else:
+                self.qtys[i] = qty
+        elif qty != 0.0:
+            keys.insert(i, key)
+            self.qtys.insert(i, qty)
+
+    def best(self):
+        if not self.keys:
+            return None, None
+        return self.sign * self.keys[0], self.qtys[0]
+
+    def top(self, n: int) -> list:
+        return [[self.sign * k, q] for k, q in zip(self.keys[:n], self.qtys[:n])]
+
+    def depth(self, n: int) -> float:
+        return sum(self.qtys[:n])
+
+
+class LocalOrderBook:
+    """
+    Local copy of a Binance spot order book maintained from @depth diff events.
+
+    Sync rules (Binance "How to manage a local order book"):
+      - diffs with final update id u <= the snapshot's lastUpdateId are dropped;
+      - the first applied diff must satisfy U <= lastUpdateId + 1 <= u;
+      - every following diff must start at U == previous u + 1.
+    A violation raises OrderBookGapError and the book must be re-bootstrapped.
+    """
+    def __init__(self, symbol: str):
+        self.symbol = symbol.upper()
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.last_update_id = None
+        self.synced = False
+
+    def load_snapshot(self, snapshot: dict):
+        """Bootstraps the book from a REST /api/v3/depth style snapshot."""
+        self.bids.clear()
+        self.asks.clear()
+        for price, qty in snapshot.get("bids", []):
+            self.bids.update(float(price), float(qty))
+        for price, qty in snapshot.get("asks", []):
+            self.asks.update(float(price), float(qty))
+        self.last_update_id = int(snapshot["lastUpdateId"])
+        self.synced = False
+
+    def apply_diff(self, event: dict) -> bool:
+        """
+        Applies one depth diff in place. Returns False for stale diffs that
+        were already contained in the snapshot.
+        """
+        if self.last_update_id is None:
+            raise OrderBookGapError("Order book has no snapshot yet")
+        first_id = int(event["U"])
+        final_id = int(event["u"])
+        if final_id <= self.last_update_id:
+            return False
+        if self.synced:
+            if first_id != self.last_update_id + 1:
+                raise OrderBookGapError(f"Expected update {self.last_update_id + 1}, got {first_id}")
+        elif not (first_id <= self.last_update_id + 1 <= final_id):
+            raise OrderBookGapError(f"First diff [{first_id}, {final_id}] does not cover {self.last_update_id + 1}")
+
+        for price, qty in event.get("b", []):
+            self.bids.update(float(price), float(qty))
+        for price, qty in event.get("a", []):
+            self.asks.update(float(price), float(qty))
+        self.last_update_id = final_id
+        self.synced = True
+        return True
+
+    def features(self, levels: int) -> dict:
+        """Top-N snapshot plus derived spread / mid / imbalance features."""
+        best_bid, best_bid_qty = self.bids.best()
+        best_ask, best_ask_qty = self.asks.best()
+        bid_depth = self.bids.depth(levels)
+        ask_depth = self.asks.depth(levels)
+        total_depth = bid_depth + ask_depth
+        spread = mid = None
+        if best_bid is not None and best_ask is not None:
+            spread = best_ask - best_bid
+            mid = (best_ask + best_bid) / 2.0
+        return {
+            "symbol": self.symbol,
+            "last_update_id": self.last_update_id,
+            "best_bid": best_bid,
+            "best_ask": best_ask,
+            "spread": spread,
+            "mid": mid,
+            "spread_bps": (spread / mid * 10000.0) if mid else None,
+            "bid_depth": bid_depth,
+            "ask_depth": ask_depth,
+            # +1 when all top-N liquidity is on the bid side, -1 when all on the ask side
+            "imbalance": (bid_depth - ask_depth) / total_depth if total_depth else None,
+            "bids": self.bids.top(levels),
+            "asks": self.asks.top(levels),
+        }
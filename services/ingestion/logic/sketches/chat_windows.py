@@ -0,0 +1,169 @@
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from logic.sketches.count_min import CountMinSketch
+from logic.sketches.space_saving import SpaceSaving
+
+MINUTE, HOUR, DAY = "minute", "hour", "day"
+GRANULARITIES = {MINUTE: 60, HOUR: 3600, DAY: 86400}
+
+
+class ChatWindow:
+    """
+    Bounded-memory summary of one channel over one time bucket: Space-Saving
+    top chatters (by messages) and top toxic users (by summed toxicity), and
+    Count-Min sketches of per-user message counts and toxicity sums.
+    """
+    __slots__ = ("granularity", "start", "messages", "toxicity_total",
+                 "top_chatters", "top_toxic", "counts", "toxicity")
+
+    def __init__(self, granularity: str, start: float, capacity: int, width: int, depth: int):
+        self.granularity = granularity
+        self.start = start
+        self.messages = 0
+        self.toxicity_total = 0.0
+        self.top_chatters = SpaceSaving(capacity)
+        self.top_toxic = SpaceSaving(capacity)
+        self.counts = CountMinSketch(width, depth)
+        self.toxicity = CountMinSketch(width, depth)
+
+    def add(self, author: str, toxic: float):
+        self.messages += 1
+        self.top_chatters.add(author)
+        self.counts.add(author)
+        if toxic > 0:
+            self.toxicity_total += toxic
+            self.top_toxic.add(author, toxic)
+            self.toxicity.add(author, toxic)
+
+    def merge(self, other: "ChatWindow"):
+        self.messages += other.messages
+        self.toxicity_total += other.toxicity_total
+        self.top_chatters.merge(other.top_chatters)
+        self.top_toxic.merge(other.top_toxic)
+        self.counts.merge(other.counts)
+        self.toxicity.merge(other.toxicity)
+
+    def copy(self) -> "ChatWindow":
+        clone = ChatWindow.__new__(ChatWindow)
+        clone.granularity = self.granularity
+        clone.start = self.start
+        clone.messages = self.messages
+        clone.toxicity_total = self.toxicity_total
+        clone.top_chatters = self.top_chatters.copy()
+        clone.top_toxic = self.top_toxic.copy()
+        clone.counts = self.counts.copy()
+        clone.toxicity = self.toxicity.copy()
+        return clone
+
+    def to_doc(self, channel: str, instance: str, minute_ttl_seconds: float) -> dict:
+        """
+        Snapshot document for the chat_sketches collection. Minute snapshots
+        keep only the top-k lists (per-user lookups use hour/day sketches) and
+        expire through a TTL index.
+        """
+        doc = {
+            "_id": f"{channel}|{self.granularity}|{int(self.start)}|{instance}",
+            "channel": channel,
+            "granularity": self.granularity,
+            "start": self.start,
+            "end": self.start + GRANULARITIES[self.granularity],
+            "instance": instance,
+            "updated_at": time.time(),
+            "messages": self.messages,
+            "toxicity_total": self.toxicity_total,
+            "capacity": self.top_chatters.capacity,
+            "top_chatters": self.top_chatters.to_list(),
+            "top_toxic": self.top_toxic.to_list(),
+        }
+        if self.granularity == MINUTE:
+            doc["expires_at"] = datetime.fromtimestamp(self.start, tz=timezone.utc) + timedelta(seconds=minute_ttl_seconds)
+        else:
+            doc.update({
+                "cms_width": self.counts.width,
+                "cms_depth": self.counts.depth,
+                "counts": self.counts.to_bytes(),
+                "toxicity": self.toxicity.to_bytes(),
+            })
+        return doc
+
+
+class ChatSketchAggregator:
+    """
+    Keeps per-channel chat sketches for the current minute, hour and day.
+
+    Only the minute window is touched per message. When a minute closes it is
+    merged into the hour and day windows, so the hot path costs two
+    Space-Saving and two Count-Min updates regardless of how many
+    granularities are kept. Snapshots are keyed by a per-process instance id,
+    so several ingestion processes (or restarts) write separate partial
+    snapshots that readers merge.
+    """
+    def __init__(self, capacity: int = 200, width: int = 2048, depth: int = 4,
+                 minute_ttl_seconds: float = 86400.0):
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.minute_ttl_seconds = minute_ttl_seconds
+        self.instance = uuid.uuid4().hex[:12]
+        self.windows = {}    # channel -> {granularity: ChatWindow}
+        self.closed = []     # (channel, window) closed since the last snapshot
+
+    def _new_window(self, granularity: str, ts: float) -> ChatWindow:
+        size = GRANULARITIES[granularity]
+        return ChatWindow(granularity, ts - ts % size, self.capacity, self.width, self.depth)
+
+    def update(self, channel: str, author: str, toxic: float, ts: float):
+        windows = self.windows.get(channel)
+        if windows is None:
+            windows = self.windows[channel] = {MINUTE: self._new_window(MINUTE, ts)}
+        minute = windows[MINUTE]
+        if ts >= minute.start + 60:
+            self._roll(channel, windows, ts)
+            minute = windows[MINUTE]
+        minute.add(author, toxic)
+
+    def _roll(self, channel: str, windows: dict, ts: float):
+        """Closes the current minute, folding it into the hour/day windows it belongs to."""
+        minute = windows[MINUTE]
+        self.closed.append((channel, minute))
+        for granularity in (HOUR, DAY):
+            size = GRANULARITIES[granularity]
+            bucket = minute.start - minute.start % size
+            window = windows.get(granularity)
+            if window is not None and window.start != bucket:
+                self.closed.append((channel, window))
+                window = None
+            if window is None:
+                window = windows[granularity] = self._new_window(granularity, minute.start)
+            window.merge(minute)
+        windows[MINUTE] = self._new_window(MINUTE, ts)
+        # An hour/day that ended before the new minute is final as well
+        for granularity in (HOUR, DAY):
+            window = windows.get(granularity)
+            if window is not None and ts >= window.start + GRANULARITIES[granularity]:
+                self.closed.append((channel, window))
+                del windows[granularity]
+
+    def snapshot_docs(self) -> list:
+        """
+        Documents for every window closed since the last call plus the open
+        ones. Open hour/day snapshots include the current minute.
+        """
+        docs = [window.to_doc(channel, self.instance, self.minute_ttl_seconds) for channel, window in self.closed]
+        self.closed = []
+        for channel, windows in self.windows.items():
+            minute = windows[MINUTE]
+            docs.append(minute.to_doc(channel, self.instance, self.minute_ttl_seconds))
+            for granularity in (HOUR, DAY):
+                size = GRANULARITIES[granularity]
+                window = windows.get(granularity)
+                if window is None:
+                    window = self._new_window(granularity, minute.start)
+                else:
+                    window = window.copy()
+                if window.start == minute.start - minute.start % size:
+                    window.merge(minute)
+                docs.append(window.to_doc(channel, self.instance, self.minute_ttl_seconds))
+        return docs
@@ -0,0 +1,70 @@
+import math
+from functools import lru_cache
+from hashlib import blake2b
+
+import numpy as np
+
+
+@lru_cache(maxsize=65536)
+def hash_pair(key: str):
+    """
+    Two independent 64-bit hashes of a key. Unlike hash(), these are stable
+    across processes, so sketches built by different workers can be merged.
+    Row i of a sketch uses (h1 + i * h2) mod width (Kirsch-Mitzenmacher).
+    """
+    digest = blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+@lru_cache(maxsize=65536)
+def cell_indexes(key: str, width: int, depth: int) -> np.ndarray:
+    """Flat table positions of a key, one per row (cached: chat authors repeat heavily)."""
+    h1, h2 = hash_pair(key)
+    return np.array([i * width + (h1 + i * h2) % width for i in range(depth)])
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch (Cormode & Muthukrishnan) of non-negative per-key sums.
+
+    An estimate never underestimates, and with probability 1 - delta it
+    overestimates by at most epsilon * total, where epsilon = e / width and
+    delta = exp(-depth). The default 2048 x 4 table (64 KB of doubles) gives
+    epsilon ~ 0.13% of the window total with 98% confidence. Sketches with
+    the same shape merge by adding their tables.
+    """
+    __slots__ = ("width", "depth", "table")
+
+    def __init__(self, width: int = 2048, depth: int = 4, table: np.ndarray = None):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros(width * depth) if table is None else table
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    def add(self, key: str, value: float = 1.0):
+        self.table[cell_indexes(key, self.width, self.depth)] += value
+
+    def estimate(self, key: str) -> float:
+        return float(self.table[cell_indexes(key, self.width, self.depth)].min())
+
+    def merge(self, other: "CountMinSketch"):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Count-Min sketches must have the same shape to merge")
+        self.table += other.table
+
+    def copy(self) -> "CountMinSketch":
+        return CountMinSketch(self.width, self.depth, self.table.copy())
+
+    def to_bytes(self) -> bytes:
+        return self.table.astype("<f8", copy=False).tobytes()
+
+    @classmethod
+    def from_bytes(cls, width: int, depth: int, data: bytes) -> "CountMinSketch":
+        return cls(width, depth, np.frombuffer(data, dtype="<f8").copy())
@@ -0,0 +1,66 @@
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from logic.sketches.chat_windows import GRANULARITIES, MINUTE
+from logic.sketches.hyperloglog import HyperLogLog
+
+
+class DistinctWindows:
+    """
+    HyperLogLog distinct counts per (metric, scope) for the current minute,
+    hour and day, e.g. ("chatters", "#channel") or ("symbols", "market").
+
+    Each value updates three small counters (one register compare each);
+    registers are snapshotted as bytes to the distinct_counts collection and
+    readers merge any set of windows into a distinct count for the range.
+    Like ChatSketchAggregator, snapshots carry a per-process instance id, and
+    a value older than the open window (clock steps back) is counted in the
+    open window rather than reopening a snapshot that was already written.
+    """
+    def __init__(self, precision: int = 12, minute_ttl_seconds: float = 86400.0):
+        self.precision = precision
+        self.minute_ttl_seconds = minute_ttl_seconds
+        self.instance = uuid.uuid4().hex[:12]
+        self.windows = {}    # (metric, scope) -> {granularity: (start, HyperLogLog)}
+        self.closed = []     # (metric, scope, granularity, start, HyperLogLog)
+
+    def add(self, metric: str, scope: str, value: str, ts: float):
+        windows = self.windows.get((metric, scope))
+        if windows is None:
+            windows = self.windows[(metric, scope)] = {}
+        for granularity, size in GRANULARITIES.items():
+            start = ts - ts % size
+            window = windows.get(granularity)
+            if window is None or start > window[0]:
+                if window is not None:
+                    self.closed.append((metric, scope, granularity) + window)
+                window = windows[granularity] = (start, HyperLogLog(self.precision))
+            window[1].add(value)
+
+    def _doc(self, metric: str, scope: str, granularity: str, start: float, counter: HyperLogLog) -> dict:
+        doc = {
+            "_id": f"{metric}|{scope}|{granularity}|{int(start)}|{self.instance}",
+            "metric": metric,
+            "scope": scope,
+            "granularity": granularity,
+            "start": start,
+            "end": start + GRANULARITIES[granularity],
+            "instance": self.instance,
+            "updated_at": time.time(),
+            "precision": counter.precision,
+            "registers": counter.to_bytes(),
+            "estimate": round(counter.estimate(), 1),
+        }
+        if granularity == MINUTE:
+            doc["expires_at"] = datetime.fromtimestamp(start, tz=timezone.utc) + timedelta(seconds=self.minute_ttl_seconds)
+        return doc
+
+    def snapshot_docs(self) -> list:
+        """Documents for every window closed since the last call plus the open ones."""
+        docs = [self._doc(*closed) for closed in self.closed]
+        self.closed = []
+        for (metric, scope), windows in self.windows.items():
+            for granularity, (start, counter) in windows.items():
+                docs.append(self._doc(metric, scope, granularity, start, counter))
+        return docs
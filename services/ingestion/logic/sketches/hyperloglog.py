@@ -0,0 +1,79 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from logic.sketches.count_min import hash_pair
+
+
+@lru_cache(maxsize=65536)
+def register_update(key: str, precision: int):
+    """Register index (top `precision` hash bits) and rank (leading zeros + 1 of the rest) of a key."""
+    h1, _ = hash_pair(key)
+    rest_bits = 64 - precision
+    rest = h1 & ((1 << rest_bits) - 1)
+    return h1 >> rest_bits, rest_bits - rest.bit_length() + 1
+
+
+def estimate_registers(registers: np.ndarray) -> float:
+    """Raw HyperLogLog estimate of a uint8 register array, with linear counting while registers are still empty."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / float(np.ldexp(1.0, -registers.astype(np.int64)).sum())
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * m and zeros:
+        return m * math.log(m / zeros)
+    return raw
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter (Flajolet et al.) with 2^precision one-byte
+    registers and the linear-counting correction for small cardinalities.
+
+    The relative standard error is 1.04 / sqrt(2^precision): the default
+    precision 12 uses 4 KB and is within ~1.6% (one sigma) at any cardinality,
+    while an exact set of usernames costs roughly 100 bytes per member.
+    Counters with the same precision merge (set union) by taking the
+    register-wise maximum, so any range of windows can be combined.
+    """
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 12, registers: bytearray = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision) if registers is None else registers
+
+    @property
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.registers)
+
+    def add(self, key: str):
+        index, rank = register_update(key, self.precision)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> float:
+        return estimate_registers(np.frombuffer(self.registers, dtype=np.uint8))
+
+    def merge(self, other: "HyperLogLog"):
+        if self.precision != other.precision:
+            raise ValueError("HyperLogLog counters must have the same precision to merge")
+        merged = np.maximum(np.frombuffer(self.registers, dtype=np.uint8),
+                            np.frombuffer(other.registers, dtype=np.uint8))
+        self.registers = bytearray(merged.tobytes())
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.precision, bytearray(self.registers))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(len(data).bit_length() - 1, bytearray(data))
@@ -0,0 +1,96 @@
+import math
+import random
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty) over floats.
+
+    Items enter level 0; a full level is sorted and every other item (random
+    offset) is promoted to the next level with twice the weight. Level
+    capacities shrink geometrically (factor c) below the top, so memory stays
+    around k / (1 - c) items regardless of stream length, and the normalized
+    rank error is on the order of 1/k (about 1% at the default k=200).
+    Updates are an append plus an amortized O(log k) compaction.
+    """
+    __slots__ = ("k", "c", "n", "size", "max_size", "compactors", "_random")
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.size = 0
+        self.max_size = 0
+        self.compactors = []
+        self._random = random.Random(seed)
+        self._grow()
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value: float):
+        self.compactors[0].append(value)
+        self.n += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            items = self.compactors[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self._grow()
+                items.sort()
+                # An odd item out stays at this level
+                keep = [items.pop()] if len(items) % 2 else []
+                self.compactors[level + 1].extend(items[self._random.randint(0, 1)::2])
+                self.compactors[level] = keep
+                self.size = sum(len(items) for items in self.compactors)
+                if self.size < self.max_size:
+                    break
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        self.size = sum(len(items) for items in self.compactors)
+        while self.size >= self.max_size:
+            before = self.size
+            self._compress()
+            if self.size == before:
+                self._grow()
+
+    def weighted_items(self):
+        """The retained items and their weights (2^level) as numpy arrays."""
+        values = np.fromiter((v for items in self.compactors for v in items), dtype=float, count=self.size)
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=float)
+                                  for level, items in enumerate(self.compactors)])
+        return values, weights
+
+    def quantiles(self, qs) -> np.ndarray:
+        values, weights = self.weighted_items()
+        return weighted_quantiles(values, weights, qs)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, qs) -> np.ndarray:
+    """Lower weighted quantiles: the smallest value whose cumulative weight reaches q of the total."""
+    if len(values) == 0:
+        return np.full(len(qs), np.nan)
+    order = np.argsort(values, kind="stable")
+    cumulative = np.cumsum(weights[order])
+    targets = np.asarray(qs, dtype=float) * cumulative[-1]
+    positions = np.minimum(np.searchsorted(cumulative, targets, side="left"), len(values) - 1)
+    return values[order][positions]
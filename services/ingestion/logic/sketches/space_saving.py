@@ -0,0 +1,108 @@
+from heapq import heappush, heappop, heapify
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k summary (Metwally et al.) over weighted keys.
+
+    Keeps at most `capacity` counters. A key's stored count overestimates its
+    true weight by at most its recorded error, and any key whose true weight
+    exceeds total / capacity is guaranteed to be present. Weights must be
+    non-negative, so the same structure serves message counts and toxicity sums.
+
+    The minimum counter is found with a lazily maintained heap: stale entries
+    are skipped on pop and the heap is rebuilt once it grows past a few
+    times the capacity, keeping updates O(log k) amortized.
+    """
+    __slots__ = ("capacity", "counts", "errors", "heap")
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, key, weight: float = 1.0):
+        if weight <= 0:
+            return
+        counts = self.counts
+        count = counts.get(key)
+        if count is not None:
+            count += weight
+            counts[key] = count
+        elif len(counts) < self.capacity:
+            count = counts[key] = weight
+            self.errors[key] = 0.0
+        else:
+            floor, evicted = self._pop_min()
+            del counts[evicted]
+            del self.errors[evicted]
+            count = counts[key] = floor + weight
+            self.errors[key] = floor
+        heappush(self.heap, (count, key))
+        if len(self.heap) > 4 * self.capacity + 64:
+            self._rebuild()
+
+    def _pop_min(self):
+        counts = self.counts
+        heap = self.heap
+        while True:
+            count, key = heappop(heap)
+            if counts.get(key) == count:
+                return count, key
+
+    def _rebuild(self):
+        self.heap = [(count, key) for key, count in self.counts.items()]
+        heapify(self.heap)
+
+    def min_count(self) -> float:
+        """Smallest stored count when the summary is full (the bound for absent keys), else 0."""
+        if len(self.counts) < self.capacity:
+            return 0.0
+        return min(self.counts.values())
+
+    def merge(self, other: "SpaceSaving"):
+        """
+        Folds another summary in (mergeable summaries, Agarwal et al.). A key
+        missing from a full summary is credited with that summary's minimum
+        count, which is also added to its error.
+        """
+        floor_self, floor_other = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+        for key in self.counts.keys() | other.counts.keys():
+            counts[key] = self.counts.get(key, floor_self) + other.counts.get(key, floor_other)
+            errors[key] = self.errors.get(key, floor_self) + other.errors.get(key, floor_other)
+        if len(counts) > self.capacity:
+            kept = sorted(counts, key=counts.get, reverse=True)[:self.capacity]
+            counts = {key: counts[key] for key in kept}
+            errors = {key: errors[key] for key in kept}
+        self.counts, self.errors = counts, errors
+        self._rebuild()
+
+    def top(self, n: int = 10):
+        """The n heaviest keys as (key, count, error), heaviest first."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+    def copy(self) -> "SpaceSaving":
+        clone = SpaceSaving(self.capacity)
+        clone.counts = dict(self.counts)
+        clone.errors = dict(self.errors)
+        clone.heap = list(self.heap)
+        return clone
+
+    def to_list(self):
+        """Compact serialized form: [[key, count, error], ...]."""
+        return [[key, count, self.errors[key]] for key, count in self.counts.items()]
+
+    @classmethod
+    def from_list(cls, capacity: int, entries) -> "SpaceSaving":
+        summary = cls(capacity)
+        for key, count, error in entries:
+            summary.counts[key] = count
+            summary.errors[key] = error
+        summary._rebuild()
+        return summary
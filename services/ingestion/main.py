@@ -4,12 +4,40 @@ from dotenv import load_dotenv
 
 from adapters.twitch_chat_adapter import TwitchChatAdapter
 from adapters.market_adapter import MarketAdapter
+from adapters.depth_adapter import DepthAdapter
+from adapters.stream_manager import StreamManager, add_stream_routes
+from logic.nlp_toxicity.toxicity_classifier import ToxicityClassifier
 from utils.kafka_producer import get_kafka_producer
-from utils.logger import get_logger
+from utils.latency import tracker
+from utils.logger import get_logger, configure_logging
+from utils.metrics import start_metrics_server, monitor_event_loop_lag
+from utils.mongo_client import save_latency_stats, save_chat_sketches, save_distinct_counts
 
 load_dotenv()
+configure_logging()
 logger = get_logger(__name__)
 
+async def latency_reporter(interval_seconds: float):
+    """
+    Periodically closes the latency histogram window and publishes the
+    per-stage snapshots to MongoDB for the Platform Status page.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        snapshots = tracker.rotate()
+        await asyncio.get_running_loop().run_in_executor(None, save_latency_stats, "ingestion", snapshots)
+
+async def sketch_reporter(manager: StreamManager, interval_seconds: float):
+    """Periodically persists the chat heavy-hitter sketches and HyperLogLog distinct counts of every stream."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        adapters = manager.adapters()
+        sketch_docs = [doc for adapter in adapters if hasattr(adapter, "sketches") for doc in adapter.sketches.snapshot_docs()]
+        await loop.run_in_executor(None, save_chat_sketches, sketch_docs)
+        distinct_docs = [doc for adapter in adapters if hasattr(adapter, "distinct") for doc in adapter.distinct.snapshot_docs()]
+        await loop.run_in_executor(None, save_distinct_counts, distinct_docs)
+
 async def main():
     """
     IngestionOrchestrator: Initializes and runs all data stream adapters concurrently.
@@ -22,31 +50,70 @@ async def main():
     twitch_nick = os.getenv("TWITCH_NICKNAME")
     twitch_channel = os.getenv("TWITCH_CHANNEL")
     market_symbol = os.getenv("MARKET_SYMBOL")
+    depth_symbol = os.getenv("DEPTH_SYMBOL")
     
     chat_topic = os.getenv("CHAT_KAFKA_TOPIC")
     market_topic = os.getenv("MARKET_KAFKA_TOPIC")
+    depth_topic = os.getenv("DEPTH_KAFKA_TOPIC", "depth_stream")
+    latency_interval = float(os.getenv("LATENCY_REPORT_INTERVAL_SECONDS", "10"))
+    sketch_interval = float(os.getenv("SKETCH_SNAPSHOT_INTERVAL_SECONDS", "30"))
+    metrics_host = os.getenv("METRICS_HOST", "0.0.0.0")
+    metrics_port = int(os.getenv("METRICS_PORT", "9100"))
 
-    # --- Initialize Adapters ---
-    twitch_adapter = TwitchChatAdapter(
-        token=twitch_oauth,
-        nickname=twitch_nick,
-        channel=twitch_channel,
-        producer=producer,
-        topic=chat_topic
-    )
-    
-    market_adapter = MarketAdapter(
-        symbol=market_symbol,
-        producer=producer,
-        topic=market_topic
-    )
+    server = await start_metrics_server(metrics_host, metrics_port)
+
+    # The depth snapshot file belongs to the first env-configured symbol; streams added later use the REST API
+    depth_snapshot_symbol = (depth_symbol or "").split(",")[0].strip().lower()
+    depth_snapshot_path = os.getenv("DEPTH_SNAPSHOT_PATH") or None
+
+    # --- Stream factories (one adapter per channel/symbol) ---
+    factories = {
+        "chat": lambda channel: TwitchChatAdapter(
+            token=twitch_oauth,
+            nickname=twitch_nick,
+            channel=channel,
+            producer=producer,
+            topic=chat_topic
+        ),
+        "market": lambda symbol: MarketAdapter(
+            symbol=symbol,
+            producer=producer,
+            topic=market_topic
+        ),
+        "depth": lambda symbol: DepthAdapter(
+            symbol=symbol,
+            producer=producer,
+            topic=depth_topic,
+            snapshot_path=depth_snapshot_path if symbol == depth_snapshot_symbol else None,
+            emit_interval=float(os.getenv("DEPTH_EMIT_INTERVAL_SECONDS", "1")),
+            levels=int(os.getenv("DEPTH_LEVELS", "10"))
+        ),
+    }
+    manager = StreamManager(factories)
+
+    async def handle_ready(request):
+        # Ingestion runs while the model warms up; this reports whether chat is being scored yet
+        classifier = ToxicityClassifier.get_instance()
+        status = 200 if classifier.ready else 503
+        return status, "application/json", {"toxicity_model": classifier.state}
+
+    server.route("GET", "/ready", handle_ready)
+    # Streams can be added/removed at runtime through /streams
+    add_stream_routes(server, manager, token=os.getenv("STREAM_API_TOKEN") or None, host=metrics_host)
 
     logger.info("Starting all data stream adapters...")
-    
-    # Run adapters concurrently
+
+    # Initial streams from env (comma-separated); order book depth is optional
+    for kind, keys in (("chat", twitch_channel), ("market", market_symbol), ("depth", depth_symbol)):
+        for key in (keys or "").split(","):
+            if key.strip():
+                manager.add(kind, key)
+
+    # Adapters run as managed tasks; these loops keep the service alive
     await asyncio.gather(
-        twitch_adapter.run(),
-        market_adapter.run()
+        latency_reporter(latency_interval),
+        sketch_reporter(manager, sketch_interval),
+        monitor_event_loop_lag()
     )
 
 if __name__ == "__main__":
@@ -17,7 +17,7 @@ def test_chat_anomaly():
         "enrichments": {"toxicity": {"toxic": 0.1}}
     }
     res = detector.detect(event_normal)
-    assert res["is_anomaly"] == "false"
+    assert res["is_anomaly"] is False
     
     # Test Toxicity Spike
     event_toxic = {
@@ -26,7 +26,7 @@ def test_chat_anomaly():
         "enrichments": {"toxicity": {"toxic": 0.9}}
     }
     res = detector.detect(event_toxic)
-    assert res["is_anomaly"] == "true"
+    assert res["is_anomaly"] is True
     assert res["type"] == "toxicity_spike"
     
     print("✅ Chat Anomaly Logic Verified")
@@ -34,20 +34,22 @@ def test_chat_anomaly():
 def test_market_anomaly():
     detector = MarketAnomalyDetector(z_score_threshold=2.0)
     
-    # Fill window
+    # Fill window with varied prices; a constant window has std 0 and scores nothing
     for i in range(10):
-        detector.detect(100.0)
-    
+        detector.detect(100.0 + (i % 3 - 1) * 0.5)
+
     # Test Outlier
     res = detector.detect(150.0)
-    assert res["is_anomaly"] == "true"
+    assert res["is_anomaly"] is True
+    assert res["type"] == "z_score_outlier" and res["z_score"] > 2.0
     assert "z_score" in res
     assert "mean" in res
     assert "std" in res
     
     # Test schema consistency
-    expected_keys = {"is_anomaly", "type", "severity", "mean", "std", "z_score"}
+    expected_keys = {"schema_version", "is_anomaly", "type", "severity", "mean", "std", "z_score"}
     assert set(res.keys()).issuperset(expected_keys)
+    assert isinstance(res["z_score"], float)
     
     print("✅ Market Anomaly Logic Verified")
 
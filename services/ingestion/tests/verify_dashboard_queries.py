@@ -0,0 +1,160 @@
+import sys
+import os
+
+# Add services/streamlit-ui to path (the dashboard's own utils package), then
+# services/ingestion for the sketches the dashboard reads
+sys.path.append(os.path.join(os.getcwd(), 'services/streamlit-ui'))
+sys.path.append(os.path.join(os.getcwd(), 'services/ingestion'))
+
+import numpy as np
+from utils import mongo_client
+from utils.sketches import estimate_registers, fold_registers, merge_top_k
+from logic.sketches import hyperloglog
+from logic.sketches.hyperloglog import HyperLogLog
+from logic.sketches.space_saving import SpaceSaving
+
+NOW = 1767225600.0
+
+class FakeCursor(list):
+    """Single-pass like a pymongo cursor."""
+    def __init__(self, docs):
+        super().__init__()
+        self.docs = iter(docs)
+    def __iter__(self):
+        return self.docs
+    def sort(self, *args):
+        return self
+    def limit(self, n):
+        return FakeCursor(list(self.docs)[:n])
+
+class FakeCollection:
+    def __init__(self, docs=(), aggregated=()):
+        self.docs = list(docs)
+        self.aggregated = list(aggregated)
+        self.pipelines = []
+        self.queries = []
+    def find(self, query=None, projection=None):
+        self.queries.append(query)
+        return FakeCursor(self.docs)
+    def find_one(self, query):
+        return self.docs[0] if self.docs else None
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return iter(self.aggregated)
+
+class FakeDB:
+    def __init__(self, **collections):
+        self.collections = collections
+    def __getattr__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+def _with_db(db, fn):
+    original = mongo_client.get_db
+    mongo_client.get_db = lambda: db
+    try:
+        return fn()
+    finally:
+        mongo_client.get_db = original
+
+def test_typed_anomalies_materialized():
+    docs = iter([
+        {"enrichments": {"anomaly": {"is_anomaly": "true", "z_score": "3.5"}}},
+        {"enrichments": {"anomaly": {"is_anomaly": False, "schema_version": 2}}},
+        {"payload": {}},
+    ])
+    result = mongo_client._with_typed_anomalies(docs)
+    assert isinstance(result, list) and len(result) == 3
+    assert len(list(result)) == 3  # readable more than once
+    assert result[0]["enrichments"]["anomaly"]["is_anomaly"] is True
+    assert result[0]["enrichments"]["anomaly"]["z_score"] == 3.5
+    assert not mongo_client._with_typed_anomalies(iter([]))
+    print("✅ Typed Anomaly Documents Verified")
+
+def test_rollup_series_keeps_markers():
+    bars = [{"_id": NOW - 86400 + i * 300, "open": 100.0, "high": 101.0 + i % 7, "low": 99.0, "close": 100.5, "count": 40}
+            for i in range(288)]
+    anomalies = [{"timestamp": NOW - 3600 * k, "payload": {"price": 105.0},
+                  "enrichments": {"anomaly": {"is_anomaly": "true", "severity": "7.5", "type": "price_spike"}}}
+                 for k in (20, 2)]
+    db = FakeDB(market_ohlcv=FakeCollection(aggregated=bars), market_anomalies=FakeCollection(anomalies),
+                compaction_state=FakeCollection([{"_id": "market_data", "compacted_until": NOW - 7200}]))
+    series = _with_db(db, lambda: mongo_client.get_price_series("BTCUSDT", 86400, points=1000, now=NOW))
+    assert series["resolution"] == 300 and len(series["timestamp"]) == 288
+    assert series["source_points"] == 288 * 40 and series["high"][6] == 107.0
+    assert [m["timestamp"] for m in series["markers"]] == [NOW - 72000, NOW - 7200]
+    assert all(m["is_anomaly"] is True and m["severity"] == 7.5 for m in series["markers"])
+    # Bars below the compaction watermark, raw ticks above it
+    pipeline = db.market_ohlcv.pipelines[0]
+    assert pipeline[0]["$match"]["timestamp"]["$lt"] == NOW - 7200
+    assert pipeline[2]["$unionWith"]["pipeline"][0]["$match"]["timestamp"]["$gte"] == NOW - 7200
+    print("✅ Rollup Price Series Verified")
+
+def test_raw_series_downsampled():
+    rng = np.random.default_rng(2)
+    prices = 100000 + np.cumsum(rng.standard_normal(20000))
+    ticks = [{"timestamp": NOW - 3000 + i * 0.1, "payload": {"price": float(price)},
+              "enrichments": {"anomaly": {"is_anomaly": i % 1000 == 7, "severity": 4.0}}}
+             for i, price in enumerate(prices)]
+    db = FakeDB(enriched_events=FakeCollection(ticks))
+    series = _with_db(db, lambda: mongo_client.get_price_series("BTCUSDT", 3600, points=500, now=NOW))
+    assert series["resolution"] == "raw" and series["source_points"] == 20000
+    assert len(series["timestamp"]) <= 500 and max(series["price"]) == prices.max()
+    assert len(series["markers"]) == 20 and all(isinstance(m["price"], float) for m in series["markers"])
+    assert set(m["timestamp"] for m in series["markers"]) <= set(series["timestamp"])
+    print("✅ Raw Price Series Downsampling Verified")
+
+def test_estimator_matches_ingestion():
+    rng = np.random.default_rng(5)
+    for registers in (np.zeros(4096, dtype=np.uint8), rng.integers(0, 12, 4096).astype(np.uint8),
+                      rng.integers(0, 3, 1024).astype(np.uint8)):
+        assert np.isclose(estimate_registers(registers), hyperloglog.estimate_registers(registers))
+    print("✅ Dashboard HyperLogLog Estimator Matches Ingestion")
+
+def test_distinct_count_mixed_precision():
+    # HLL_PRECISION changed from 12 to 10 half way through the range
+    before, after, whole = HyperLogLog(12), HyperLogLog(10), HyperLogLog(10)
+    for i in range(5000):
+        (before if i < 3000 else after).add(f"user{i}")
+        whole.add(f"user{i}")
+    folded = fold_registers(np.frombuffer(before.to_bytes(), dtype=np.uint8), 12, 10)
+    # Folding to a lower precision matches adding the same keys at that precision
+    assert np.array_equal(np.maximum(folded, np.frombuffer(after.to_bytes(), dtype=np.uint8)),
+                          np.frombuffer(whole.to_bytes(), dtype=np.uint8))
+
+    docs = [{"registers": before.to_bytes(), "precision": 12}, {"registers": after.to_bytes(), "precision": 10}]
+    db = FakeDB(distinct_counts=FakeCollection(docs))
+    estimate, error = _with_db(db, lambda: mongo_client.get_distinct_count("chatters", "#chan", 7200, now=NOW))
+    assert estimate == whole.estimate() and error == whole.standard_error
+    query = db.distinct_counts.queries[0]
+    assert query["metric"] == "chatters" and query["scope"] == "#chan"
+    assert {"granularity": "hour", "start": {"$in": [NOW - 7200, NOW - 3600]}} in query["$or"]
+    print("✅ Distinct Counts Across Precisions Verified")
+
+def test_top_k_merge_credits_earlier_floors():
+    full, later = SpaceSaving(3), SpaceSaving(3)
+    for key in ["a"] * 5 + ["b"] * 4 + ["c"] * 3 + ["d"] * 2:
+        full.add(key)
+    for key in ["e"] * 6 + ["a"]:
+        later.add(key)
+    merged = merge_top_k([full.to_list(), later.to_list()], capacity=3)
+    # "e" only appears in the second summary but is credited with the first (full) summary's floor
+    floor = min(count for _, count, _ in full.to_list())
+    assert merged["e"] == (6 + floor, floor)
+    reference = full.copy()
+    reference.merge(later)
+    for key, count, error in reference.top(3):
+        assert merged[key] == (count, error), key
+    print("✅ Top-k Merge Credits Every Full Summary")
+
+if __name__ == "__main__":
+    try:
+        test_typed_anomalies_materialized()
+        test_rollup_series_keeps_markers()
+        test_raw_series_downsampled()
+        test_estimator_matches_ingestion()
+        test_distinct_count_mixed_precision()
+        test_top_k_merge_credits_earlier_floors()
+        print("\n🎉 All tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
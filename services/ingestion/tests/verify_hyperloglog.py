@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+import tracemalloc
+
+# Add services/ingestion to path
+sys.path.append(os.path.join(os.getcwd(), 'services/ingestion'))
+
+from logic.sketches.hyperloglog import HyperLogLog
+from logic.sketches.distinct import DistinctWindows
+
+def test_estimate_within_error_bound():
+    for n in (50, 1000, 20000, 200000):
+        counter = HyperLogLog(precision=12)
+        for i in range(n):
+            counter.add(f"user{i}")
+            counter.add(f"user{i // 2}")  # duplicates must not count
+        relative = abs(counter.estimate() - n) / n
+        # 3 sigma of the 1.04/sqrt(m) standard error
+        assert relative <= 3 * counter.standard_error, (n, counter.estimate())
+    print("✅ HyperLogLog Error Bound Verified")
+
+def test_merge_is_union():
+    left, right, whole = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        (left if i < 20000 else right).add(f"user{i}")
+        whole.add(f"user{i}")
+    for i in range(10000, 20000):
+        right.add(f"user{i}")  # overlap
+    left.merge(right)
+    assert left.registers == whole.registers
+    restored = HyperLogLog.from_bytes(left.to_bytes())
+    assert restored.precision == 12 and restored.estimate() == left.estimate()
+    print("✅ HyperLogLog Merge Verified")
+
+def test_windows_roll_and_snapshot():
+    windows = DistinctWindows(precision=10)
+    start = 1767225600.0  # 2026-01-01 00:00 UTC
+    for second in range(0, 2 * 3600, 5):
+        windows.add("chatters", "#chan", f"user{second // 5 % 300}", start + second)
+    docs = windows.snapshot_docs()
+    hours = [doc for doc in docs if doc["granularity"] == "hour"]
+    minutes = [doc for doc in docs if doc["granularity"] == "minute"]
+    assert len(hours) == 2 and len(minutes) == 120
+    assert all("expires_at" in doc for doc in minutes)
+
+    # Merging the two hour windows counts the 300 chatters once
+    merged = HyperLogLog.from_bytes(hours[0]["registers"])
+    merged.merge(HyperLogLog.from_bytes(hours[1]["registers"]))
+    assert abs(merged.estimate() - 300) / 300 <= 3 * merged.standard_error
+    assert windows.snapshot_docs() and not windows.closed
+    print("✅ Distinct Count Windows Verified")
+
+def test_late_value_does_not_reopen_window():
+    windows = DistinctWindows(precision=10)
+    start = 1767225600.0
+    for i in range(200):
+        windows.add("chatters", "#chan", f"user{i}", start + 59.0)
+    windows.add("chatters", "#chan", "late", start + 60.5)
+    # The clock steps back across the minute boundary: counted in the open minute
+    windows.add("chatters", "#chan", "stepped_back", start + 59.9)
+    docs = {doc["_id"]: doc for doc in windows.snapshot_docs()}
+    minutes = sorted((doc for doc in docs.values() if doc["granularity"] == "minute"), key=lambda doc: doc["start"])
+    assert [doc["start"] for doc in minutes] == [start, start + 60]
+    assert abs(minutes[0]["estimate"] - 200) / 200 <= 3 * HyperLogLog(10).standard_error
+    assert minutes[1]["estimate"] == 2.0
+    print("✅ Late Values Kept Out of Closed Windows")
+
+def test_memory_against_exact_set():
+    n = 100000
+    tracemalloc.start()
+    exact = {f"chatter_{i}" for i in range(n)}
+    exact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    counter = HyperLogLog(precision=12)
+    started = time.perf_counter()
+    for name in exact:
+        counter.add(name)
+    per_add = (time.perf_counter() - started) / n
+    error = abs(counter.estimate() - n) / n
+
+    print(f"   exact set: {exact_bytes / 1024:.0f} KiB, HLL p=12: {counter.memory_bytes / 1024:.0f} KiB "
+          f"({exact_bytes / counter.memory_bytes:.0f}x smaller), error {error:.2%}, {per_add * 1e6:.2f} µs/add")
+    assert counter.memory_bytes * 100 < exact_bytes
+    print("✅ Memory Comparison Verified")
+
+if __name__ == "__main__":
+    try:
+        test_estimate_within_error_bound()
+        test_merge_is_union()
+        test_windows_roll_and_snapshot()
+        test_late_value_does_not_reopen_window()
+        test_memory_against_exact_set()
+        print("\n🎉 All tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,37 @@
+import sys
+import os
+import random
+import importlib.util
+
+# Add services/ingestion to path
+sys.path.append(os.path.join(os.getcwd(), 'services/ingestion'))
+
+from utils.latency import LatencyHistogram
+
+# The Spark job's copy, loaded from its file (the Spark jobs directory is not a package)
+spec = importlib.util.spec_from_file_location("spark_latency", os.path.join(os.getcwd(), 'services/spark/jobs/latency.py'))
+spark_latency = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(spark_latency)
+
+def test_bucket_layout_matches():
+    ingestion, spark = LatencyHistogram(), spark_latency.LatencyHistogram()
+    assert (ingestion.sub_bucket_bits, ingestion.max_index) == (spark.sub_bucket_bits, spark.max_index)
+    rng = random.Random(7)
+    for value_us in [0, 1, 127, 128, 1000, 65535, 10 ** 9, 2 ** 40] + [rng.randrange(2 ** 36) for _ in range(2000)]:
+        index = ingestion._index(value_us)
+        assert index == spark._index(value_us), value_us
+        assert ingestion._value_at(index) == spark._value_at(index), index
+    for seconds in (0.0004, 0.012, 0.25, 3.0):
+        ingestion.record(seconds)
+        spark.record(seconds)
+    snapshot = ingestion.snapshot()
+    assert snapshot == spark.snapshot()
+    print("✅ Ingestion and Spark Latency Histograms Share a Bucket Layout")
+
+if __name__ == "__main__":
+    try:
+        test_bucket_layout_matches()
+        print("\n🎉 All tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
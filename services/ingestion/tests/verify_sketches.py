@@ -0,0 +1,76 @@
+import sys
+import os
+from collections import Counter
+
+# Add services/ingestion to path
+sys.path.append(os.path.join(os.getcwd(), 'services/ingestion'))
+
+import numpy as np
+from logic.sketches.space_saving import SpaceSaving
+from logic.sketches.count_min import CountMinSketch
+from logic.sketches.chat_windows import ChatSketchAggregator
+
+def _zipf_authors(n, seed):
+    rng = np.random.default_rng(seed)
+    return [f"user{i}" for i in np.minimum(rng.zipf(1.3, n), 50000)]
+
+def test_space_saving_finds_heavy_hitters():
+    authors = _zipf_authors(50000, 1)
+    exact = Counter(authors)
+    summary = SpaceSaving(capacity=100)
+    for author in authors:
+        summary.add(author)
+
+    true_top = [key for key, _ in exact.most_common(10)]
+    found = [key for key, _, _ in summary.top(10)]
+    assert set(true_top[:5]) <= set(found), (true_top, found)
+    for key, count, error in summary.top(10):
+        # Never underestimates, overestimates by at most the recorded error
+        assert count - error <= exact[key] <= count
+    print("✅ Space-Saving top-k Verified")
+
+def test_merge_matches_single_stream():
+    authors = _zipf_authors(40000, 2)
+    left, right, whole = SpaceSaving(100), SpaceSaving(100), SpaceSaving(100)
+    cms_left, cms_right = CountMinSketch(1024, 4), CountMinSketch(1024, 4)
+    for i, author in enumerate(authors):
+        whole.add(author)
+        (left if i % 2 else right).add(author)
+        (cms_left if i % 2 else cms_right).add(author)
+    left.merge(right)
+    cms_left.merge(cms_right)
+
+    exact = Counter(authors)
+    assert [k for k, _, _ in left.top(5)] == [k for k, _, _ in whole.top(5)]
+    bound = cms_left.epsilon * len(authors)
+    within = sum(exact[k] <= cms_left.estimate(k) <= exact[k] + bound for k in list(exact)[:2000])
+    assert within / min(len(exact), 2000) >= 1 - cms_left.delta
+    print("✅ Sketch Merging Verified")
+
+def test_aggregator_rolls_windows():
+    aggregator = ChatSketchAggregator(capacity=20, width=256, depth=4)
+    start = 1767225600.0  # 2026-01-01 00:00 UTC
+    for second in range(0, 3 * 3600, 10):
+        aggregator.update("#chan", f"user{second % 7}", 0.9 if second % 7 == 0 else 0.0, start + second)
+    docs = aggregator.snapshot_docs()
+    by_kind = Counter(doc["granularity"] for doc in docs)
+    assert by_kind["hour"] == 3 and by_kind["day"] == 1 and by_kind["minute"] == 180
+
+    day = next(doc for doc in docs if doc["granularity"] == "day")
+    assert day["messages"] == 3 * 360
+    top_toxic = max(day["top_toxic"], key=lambda entry: entry[1])
+    assert top_toxic[0] == "user0"
+    day_cms = CountMinSketch.from_bytes(day["cms_width"], day["cms_depth"], day["counts"])
+    assert day_cms.estimate("user1") >= sum(1 for s in range(0, 3 * 3600, 10) if s % 7 == 1)
+    assert aggregator.snapshot_docs() and not aggregator.closed
+    print("✅ Windowed Chat Sketches Verified")
+
+if __name__ == "__main__":
+    try:
+        test_space_saving_finds_heavy_hitters()
+        test_merge_matches_single_stream()
+        test_aggregator_rolls_windows()
+        print("\n🎉 All tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,178 @@
+import sys
+import os
+import asyncio
+import json
+
+# Add services/ingestion to path
+sys.path.append(os.path.join(os.getcwd(), 'services/ingestion'))
+
+from adapters.base_stream_source import BaseStreamSource
+from adapters.stream_manager import StreamManager, StreamAlreadyRunning, StreamNotFound, add_stream_routes
+from logic.anomaly_detection.market_anomaly import MarketAnomalyDetector
+from utils.http_server import HttpServer
+from utils.metrics import registry
+
+class TickAdapter(BaseStreamSource):
+    """Feeds a detector a steady price, standing in for a live source."""
+    instances = 0
+
+    def __init__(self, symbol):
+        TickAdapter.instances += 1
+        self.symbol = symbol
+        self.websocket = None
+        self.detector = MarketAnomalyDetector(window_size=1000)
+        self.closed = 0
+        self.init_metrics("tick", symbol)
+
+    async def connect(self):
+        pass
+
+    async def fetch_event(self):
+        pass
+
+    def normalize(self, raw_event):
+        return raw_event
+
+    async def run(self):
+        while True:
+            self.detector.detect(100.0)
+            self.events_total.inc()
+            await asyncio.sleep(0.001)
+
+    async def close(self):
+        self.closed += 1
+        await super().close()
+
+class BrokenAdapter(TickAdapter):
+    async def run(self):
+        raise ConnectionError("source unavailable")
+
+async def _request(port, method, target, body=None, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: x\r\n{headers}Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+async def _manager_keeps_state():
+    manager = StreamManager({"market": TickAdapter, "broken": BrokenAdapter})
+    manager.add("market", "BTCUSDT")
+    manager.add("market", "ethusdt")
+    await asyncio.sleep(0.05)
+    try:
+        manager.add("market", "btcusdt")
+        raise AssertionError("duplicate stream accepted")
+    except StreamAlreadyRunning:
+        pass
+
+    adapter = manager.streams["market:btcusdt"].adapter
+    await manager.remove("market", "btcusdt")
+    seen = len(adapter.detector.prices)
+    assert seen > 0 and adapter.closed == 1
+    await asyncio.sleep(0.02)
+    assert len(adapter.detector.prices) == seen  # stopped
+    statuses = {s["id"]: s["status"] for s in manager.list()}
+    assert statuses == {"market:btcusdt": "stopped", "market:ethusdt": "running"}
+    # The removed stream's series are no longer exported, the running one's are
+    exported = registry.render()
+    assert 'stream="btcusdt"' not in exported and 'stream="ethusdt"' in exported
+    events = adapter.events_total.value
+
+    # Re-adding resumes the same adapter and detector window
+    manager.add("market", "BTCUSDT")
+    await asyncio.sleep(0.02)
+    assert manager.streams["market:btcusdt"].adapter is adapter and len(adapter.detector.prices) > seen
+    assert TickAdapter.instances == 2
+    assert 'ingestion_source_queue_depth{adapter="tick",stream="btcusdt"}' in registry.render()
+    assert registry.counter("ingestion_events_total", "", adapter="tick", stream="btcusdt").value >= events > 0
+
+    # A failing source is reported without affecting the others
+    manager.add("broken", "x")
+    await asyncio.sleep(0.01)
+    statuses = {s["id"]: s for s in manager.list()}
+    assert statuses["broken:x"]["status"] == "failed" and "unavailable" in statuses["broken:x"]["error"]
+    assert statuses["market:ethusdt"]["status"] == "running"
+    try:
+        await manager.remove("market", "solusdt")
+        raise AssertionError("unknown stream removed")
+    except StreamNotFound:
+        pass
+    for stream in list(manager.streams.values()):
+        if stream.status == "running":
+            await manager.remove(stream.kind, stream.key)
+
+def test_manager_keeps_state():
+    asyncio.run(_manager_keeps_state())
+    print("✅ Stream Manager Lifecycle Verified")
+
+async def _control_api():
+    manager = StreamManager({"market": TickAdapter})
+    server = HttpServer()
+    add_stream_routes(server, manager)
+    await server.start("127.0.0.1", 0)
+    port = server.server.sockets[0].getsockname()[1]
+    try:
+        status, body = await _request(port, "POST", "/streams", {"kind": "market", "key": "btcusdt"})
+        assert status == 201 and body["id"] == manager.list()[0]["id"] and body["status"] == "running"
+        status, _ = await _request(port, "POST", "/streams", {"kind": "market", "key": "BTCUSDT"})
+        assert status == 409
+        status, _ = await _request(port, "POST", "/streams", {"kind": "options", "key": "x"})
+        assert status == 400
+        status, body = await _request(port, "GET", "/streams")
+        assert status == 200 and [s["id"] for s in body["streams"]] == ["market:btcusdt"]
+        status, body = await _request(port, "DELETE", "/streams?kind=market&key=btcusdt")
+        assert status == 200 and body["status"] == "stopped"
+        status, _ = await _request(port, "DELETE", "/streams?kind=market&key=btcusdt")
+        assert status == 404
+    finally:
+        server.server.close()
+
+    secured = HttpServer()
+    add_stream_routes(secured, StreamManager({"market": TickAdapter}), token="secret")
+    await secured.start("127.0.0.1", 0)
+    port = secured.server.sockets[0].getsockname()[1]
+    try:
+        status, _ = await _request(port, "POST", "/streams", {"kind": "market", "key": "btcusdt"})
+        assert status == 401
+        status, _ = await _request(port, "POST", "/streams", {"kind": "market", "key": "btcusdt"},
+                                   headers="Authorization: Bearer secreT\r\n")
+        assert status == 401
+        status, body = await _request(port, "POST", "/streams", {"kind": "market", "key": "btcusdt"},
+                                      headers="Authorization: Bearer secret\r\n")
+        assert status == 201
+        status, _ = await _request(port, "DELETE", "/streams?kind=market&key=btcusdt",
+                                   headers="Authorization: Bearer secret\r\n")
+        assert status == 200
+    finally:
+        secured.server.close()
+
+    # No token on a non-loopback bind: changes are refused, listing still works
+    exposed = HttpServer()
+    add_stream_routes(exposed, StreamManager({"market": TickAdapter}), host="0.0.0.0")
+    await exposed.start("127.0.0.1", 0)
+    port = exposed.server.sockets[0].getsockname()[1]
+    try:
+        status, _ = await _request(port, "POST", "/streams", {"kind": "market", "key": "btcusdt"})
+        assert status == 403
+        status, _ = await _request(port, "DELETE", "/streams?kind=market&key=btcusdt")
+        assert status == 403
+        status, body = await _request(port, "GET", "/streams")
+        assert status == 200 and body["streams"] == []
+    finally:
+        exposed.server.close()
+
+def test_control_api():
+    asyncio.run(_control_api())
+    print("✅ Stream Control API Verified")
+
+if __name__ == "__main__":
+    try:
+        test_manager_keeps_state()
+        test_control_api()
+        print("\n🎉 All tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
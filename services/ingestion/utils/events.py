@@ -0,0 +1,101 @@
+import json
+
+# Compact separators: consumers parse the JSON, so the default ", " / ": " padding is wasted bytes
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class Event:
+    """
+    Slotted in-process form of a normalized event. Adapters fill the fields
+    directly instead of building nested dicts; the unified schema document
+    is only materialized at the edges:
+
+        encode()   -> UTF-8 JSON for Kafka, built once and cached
+        to_dict()  -> schema document for MongoDB / consumers of the dict form
+
+    The produce stage must be stamped before the first encode(); stamps taken
+    afterwards (e.g. the MongoDB write) are not part of the Kafka payload.
+    """
+    __slots__ = ("event_id", "timestamp", "stages", "anomaly", "_encoded")
+    source = None
+    type = None
+
+    def payload(self) -> dict:
+        raise NotImplementedError
+
+    def enrichments(self) -> dict:
+        raise NotImplementedError
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "type": self.type,
+            "event_id": self.event_id,
+            "timestamp": self.timestamp,
+            "stages": self.stages,
+            "payload": self.payload(),
+            "enrichments": self.enrichments(),
+        }
+
+    def encode(self) -> bytes:
+        encoded = self._encoded
+        if encoded is None:
+            encoded = self._encoded = _encode(self.to_dict()).encode()
+        return encoded
+
+
+class TradeEvent(Event):
+    __slots__ = ("symbol", "price", "quantity", "indicators")
+    source = "market_data"
+    type = "trade"
+
+    def __init__(self, event_id, timestamp: float, stages: list, symbol: str, price: float, quantity: float,
+                 indicators: dict = None, anomaly: dict = None):
+        self.event_id = event_id
+        self.timestamp = timestamp
+        self.stages = stages
+        self.symbol = symbol
+        self.price = price
+        self.quantity = quantity
+        self.indicators = indicators
+        self.anomaly = anomaly
+        self._encoded = None
+
+    def payload(self) -> dict:
+        return {"symbol": self.symbol, "price": self.price, "quantity": self.quantity}
+
+    def enrichments(self) -> dict:
+        enrichments = {"indicators": self.indicators}
+        if self.anomaly is not None:
+            enrichments["anomaly"] = self.anomaly
+        return enrichments
+
+
+class ChatEvent(Event):
+    __slots__ = ("author", "text", "channel", "toxicity", "scored")
+    source = "twitch_chat"
+    type = "chat"
+
+    def __init__(self, event_id: str, timestamp: float, stages: list, author: str, text: str, channel: str,
+                 toxicity: dict, scored: bool = True, anomaly: dict = None):
+        self.event_id = event_id
+        self.timestamp = timestamp
+        self.stages = stages
+        self.author = author
+        self.text = text
+        self.channel = channel
+        self.toxicity = toxicity
+        self.scored = scored
+        self.anomaly = anomaly
+        self._encoded = None
+
+    def payload(self) -> dict:
+        return {"author": self.author, "text": self.text, "channel": self.channel}
+
+    def enrichments(self) -> dict:
+        enrichments = {"toxicity": self.toxicity}
+        if not self.scored:
+            enrichments["toxicity_status"] = "unscored"
+        if self.anomaly is not None:
+            enrichments["anomaly"] = self.anomaly
+        return enrichments
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpRequest:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b"{}")
+
+
+class HttpServer:
+    """
+    Minimal asyncio HTTP/1.1 server for internal endpoints (metrics, control).
+    Handlers are coroutines taking an HttpRequest and returning
+    (status, content_type, body). Runs on the ingestion event loop, so it
+    adds no threads and no extra dependencies.
+    """
+    def __init__(self):
+        self.routes = {}
+        self.server = None
+
+    def route(self, method: str, path: str, handler):
+        self.routes[(method.upper(), path)] = handler
+
+    async def start(self, host: str, port: int):
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            body = await reader.readexactly(length) if length else b""
+
+            path, _, query_string = target.partition("?")
+            query = dict(part.partition("=")[::2] for part in query_string.split("&") if part)
+            request = HttpRequest(method.upper(), path, query, headers, body)
+
+            handler = self.routes.get((request.method, path))
+            if handler is None:
+                status = 405 if any(route_path == path for _, route_path in self.routes) else 404
+                content_type, payload = "text/plain", STATUS_TEXT[status]
+            else:
+                try:
+                    status, content_type, payload = await handler(request)
+                except Exception as e:
+                    logger.error(f"HTTP handler error for {method} {path}: {e}", exc_info=True)
+                    status, content_type, payload = 500, "text/plain", STATUS_TEXT[500]
+
+            if not isinstance(payload, (bytes, str)):
+                payload, content_type = json.dumps(payload), "application/json"
+            data = payload.encode("utf-8") if isinstance(payload, str) else payload
+            writer.write(
+                f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Dropped malformed HTTP request: {e}")
+        finally:
+            writer.close()
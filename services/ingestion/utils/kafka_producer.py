@@ -1,15 +1,20 @@
 import os
 from aiokafka import AIOKafkaProducer
 from utils.logger import get_logger
+from utils.metrics import registry
 
 logger = get_logger(__name__)
 
-async def get_kafka_producer():
+kafka_inflight = registry.gauge("ingestion_kafka_inflight", "Kafka sends awaiting broker acknowledgement.")
+kafka_errors = registry.counter("ingestion_kafka_errors_total", "Kafka sends that raised an error.")
+
+async def get_kafka_producer(**options):
     """
-    Creates and returns an AIOKafkaProducer instance.
+    Creates and returns an AIOKafkaProducer instance. Extra options (e.g.
+    linger_ms, max_batch_size for bulk jobs) are passed to the producer.
     """
     bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
-    producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers)
+    producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers, **options)
     try:
         await producer.start()
         logger.info(f"Kafka producer connected to {bootstrap_servers}")
@@ -0,0 +1,171 @@
+import time
+from array import array
+
+# --- Stage Timestamp Vector ---
+# Every event carries a fixed-length list of epoch-second stamps under "stages".
+# Unset stages are None so the vector keeps the same shape end to end.
+STAGE_SOURCE = 0      # Time reported by the upstream source (trade time / tmi-sent-ts)
+STAGE_RECEIVED = 1    # Ingestion service received the raw message
+STAGE_ENRICHED = 2    # NLP / anomaly enrichment finished
+STAGE_PRODUCED = 3    # Handed to the Kafka producer
+STAGE_PROCESSED = 4   # Spark micro-batch started processing
+STAGE_WRITTEN = 5     # Written to MongoDB
+
+STAGE_NAMES = ("source", "received", "enriched", "produced", "processed", "written")
+
+# Stage pairs measured by the ingestion service.
+INGESTION_PAIRS = (
+    (STAGE_SOURCE, STAGE_RECEIVED),
+    (STAGE_RECEIVED, STAGE_ENRICHED),
+    (STAGE_ENRICHED, STAGE_PRODUCED),
+    (STAGE_SOURCE, STAGE_PRODUCED),
+)
+
+
+def new_stages(source_ts=None, received_ts=None) -> list:
+    """Creates a stage vector with the source and received stamps filled in."""
+    stages = [None] * len(STAGE_NAMES)
+    stages[STAGE_SOURCE] = source_ts
+    stages[STAGE_RECEIVED] = received_ts if received_ts is not None else time.time()
+    return stages
+
+
+def stamp(event, stage: int, ts: float = None):
+    """Records the time an event (a dict or a utils.events.Event) reached the given stage."""
+    if not isinstance(event, dict):
+        event.stages[stage] = ts if ts is not None else time.time()
+        return
+    stages = event.get("stages")
+    if stages is None:
+        stages = event["stages"] = [None] * len(STAGE_NAMES)
+    stages[stage] = ts if ts is not None else time.time()
+
+
+def pair_name(start: int, end: int) -> str:
+    return f"{STAGE_NAMES[start]}->{STAGE_NAMES[end]}"
+
+
+# Copied to services/spark/jobs/latency.py (the Spark image cannot import this
+# package); keep the bucket layout identical in both.
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram over microsecond latencies.
+    Each power-of-two range is split into equal sub-buckets, giving a bounded
+    relative error (~1.6% with 7 sub-bucket bits) in a fixed-size counts array.
+    """
+    def __init__(self, sub_bucket_bits=7, max_shift=34):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.max_index = self.sub_bucket_count + max_shift * self.half_count - 1
+        self.reset()
+
+    def reset(self):
+        self.counts = array('q', bytes(8 * (self.max_index + 1)))
+        self.total = 0
+        self.min_us = None
+        self.max_us = 0
+        self.sum_us = 0
+
+    def _index(self, value_us: int) -> int:
+        if value_us < self.sub_bucket_count:
+            return value_us
+        shift = value_us.bit_length() - self.sub_bucket_bits
+        index = self.sub_bucket_count + (shift - 1) * self.half_count + ((value_us >> shift) - self.half_count)
+        return index if index < self.max_index else self.max_index
+
+    def _value_at(self, index: int) -> int:
+        """Returns the midpoint of a bucket in microseconds."""
+        if index < self.sub_bucket_count:
+            return index
+        offset = index - self.sub_bucket_count
+        shift = offset // self.half_count + 1
+        mantissa = offset % self.half_count + self.half_count
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, seconds: float):
+        """Records one latency sample given in seconds. Negative values (clock skew) clamp to 0."""
+        value_us = int(seconds * 1_000_000) if seconds > 0 else 0
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+        if self.min_us is None or value_us < self.min_us:
+            self.min_us = value_us
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, q: float) -> float:
+        """Returns the q-th percentile (0-100) in milliseconds."""
+        if self.total == 0:
+            return 0.0
+        target = max(1, int(round(self.total * q / 100.0)))
+        running = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                running += c
+                if running >= target:
+                    return min(self._value_at(i), self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def snapshot(self) -> dict:
+        """Summarizes the histogram in milliseconds."""
+        return {
+            "count": self.total,
+            "min_ms": (self.min_us or 0) / 1000.0,
+            "mean_ms": (self.sum_us / self.total / 1000.0) if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max_us / 1000.0,
+        }
+
+
+class LatencyTracker:
+    """
+    Keeps one histogram per stage pair for the current reporting window.
+    `rotate()` closes the window and returns its snapshots.
+    """
+    def __init__(self, pairs=INGESTION_PAIRS):
+        self.pairs = tuple(pairs)
+        self.histograms = {pair: LatencyHistogram() for pair in self.pairs}
+        self.window_start = time.time()
+        self.last_snapshots = {}
+
+    def record_event(self, event: dict):
+        self.record(event.get("stages"))
+
+    def record(self, stages: list):
+        if not stages:
+            return
+        for (start, end), hist in self.histograms.items():
+            t0 = stages[start]
+            t1 = stages[end]
+            if t0 is not None and t1 is not None:
+                hist.record(t1 - t0)
+
+    def rotate(self) -> dict:
+        now = time.time()
+        snapshots = {}
+        for (start, end), hist in self.histograms.items():
+            snap = hist.snapshot()
+            snap["window_seconds"] = now - self.window_start
+            snapshots[pair_name(start, end)] = snap
+            hist.reset()
+        self.window_start = now
+        self.last_snapshots = snapshots
+        return snapshots
+
+
+# Process-wide tracker shared by all adapters.
+tracker = LatencyTracker()
@@ -1,25 +1,158 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import time
+
+# Logging is configured once per process:
+#   loggers -> DroppingQueueHandler -> bounded queue -> QueueListener thread -> stdout
+# so the event loop never blocks on stdout I/O.
+#
+# Environment:
+#   LOG_LEVEL       default level for every module (default INFO)
+#   LOG_LEVELS      per-module overrides, e.g. "adapters.twitch_chat_adapter=WARNING,utils=DEBUG"
+#   LOG_FORMAT      "text" (default) or "json" for structured output
+#   LOG_QUEUE_SIZE  records buffered before new ones are dropped (default 10000)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_queue = None
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_level(value: str, default=logging.INFO):
+    level = logging.getLevelName(value.strip().upper()) if value else default
+    return level if isinstance(level, int) else default
+
+
+def _apply_levels():
+    logging.getLogger().setLevel(_parse_level(os.getenv("LOG_LEVEL", "INFO")))
+    overrides = os.getenv("LOG_LEVELS", "")
+    for item in overrides.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level:
+            logging.getLogger(name.strip()).setLevel(_parse_level(level))
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """
+    Installs the queue-based handler on the root logger. Every call re-reads
+    the environment, so calling it again after load_dotenv() rebuilds the
+    output format and the queue (records already queued are still written)
+    and re-applies the levels.
+    """
+    global _queue, _listener, _handler
+    old_listener = _listener
+    _queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+
+    handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    _listener = logging.handlers.QueueListener(_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    if _handler is None:
+        _handler = DroppingQueueHandler(_queue)
+        logging.getLogger().addHandler(_handler)
+        atexit.register(_stop_listener)
+    else:
+        # New records go to the new queue; stopping the old listener drains what it still holds
+        _handler.queue = _queue
+    if old_listener is not None:
+        old_listener.stop()
+    _apply_levels()
+
+
+def log_queue_depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+def dropped_log_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
 
 def get_logger(name: str):
     """
-        Initializes and returns a logger instance.
+        Initializes and returns a logger instance. Installs a default handler
+        if configure_logging() has not run yet; running it later still applies
+        the environment.
+    """
+    if _listener is None:
+        configure_logging()
+    return logging.getLogger(name)
+
+
+class SampledLogger:
+    """
+    Rate-limits a per-event log call site to `max_per_interval` records per
+    `interval_seconds`. Suppressed records are counted and summarized once
+    the next interval starts. Level checks happen before any formatting.
     """
-    logger = logging.getLogger(name)
-    if not logger.handlers: # Avoid adding handlers multiple times
-        logger.setLevel(logging.DEBUG)
-        
-        # Create a handler to print to stdout
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(logging.DEBUG)
-        
-        # Create a formatter and add it to the handler
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        handler.setFormatter(formatter)
-        
-        # Add the handler to the logger
-        logger.addHandler(handler)
-        
-    return logger
+    def __init__(self, logger: logging.Logger, max_per_interval: int = 10, interval_seconds: float = 1.0):
+        self.logger = logger
+        self.max_per_interval = max_per_interval
+        self.interval_seconds = interval_seconds
+        self.window_start = 0.0
+        self.emitted = 0
+        self.suppressed = 0
+
+    def log(self, level: int, msg: str, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        if now - self.window_start >= self.interval_seconds:
+            if self.suppressed:
+                self.logger.log(level, "... %d similar messages suppressed in the last %.1fs",
+                                self.suppressed, self.interval_seconds)
+            self.window_start = now
+            self.emitted = 0
+            self.suppressed = 0
+        if self.emitted < self.max_per_interval:
+            self.emitted += 1
+            self.logger.log(level, msg, *args)
+        else:
+            self.suppressed += 1
+
+    def debug(self, msg: str, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(logging.INFO, msg, *args)
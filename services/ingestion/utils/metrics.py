@@ -0,0 +1,223 @@
+import asyncio
+from array import array
+
+from utils.http_server import HttpServer
+from utils.latency import tracker
+from utils.logger import get_logger, log_queue_depth, dropped_log_records
+
+logger = get_logger(__name__)
+
+# Metrics are only ever updated from the asyncio event loop thread, so plain
+# attribute arithmetic is safe without locks. Every metric object is created up
+# front (per adapter / per stream); the hot path only increments existing slots.
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Counter:
+    __slots__ = ("labels", "value")
+
+    def __init__(self, labels: dict):
+        self.labels = _format_labels(labels)
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield f"{name}{self.labels} {self.value}"
+
+
+class Gauge:
+    __slots__ = ("labels", "value", "fn")
+
+    def __init__(self, labels: dict, fn=None):
+        self.labels = _format_labels(labels)
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self, name):
+        value = self.value
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                value = 0
+        yield f"{name}{self.labels} {value}"
+
+
+class Histogram:
+    """Prometheus histogram with fixed upper bounds and an array-backed bucket counter."""
+    __slots__ = ("labels", "label_dict", "bounds", "counts", "count", "sum")
+
+    def __init__(self, labels: dict, bounds):
+        self.labels = _format_labels(labels)
+        self.label_dict = labels
+        self.bounds = tuple(bounds)
+        self.counts = array('q', bytes(8 * len(self.bounds)))
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def samples(self, name):
+        cumulative = 0
+        for bound, c in zip(self.bounds, self.counts):
+            cumulative += c
+            labels = _format_labels({**self.label_dict, "le": repr(float(bound))})
+            yield f"{name}_bucket{labels} {cumulative}"
+        labels = _format_labels({**self.label_dict, "le": "+Inf"})
+        yield f"{name}_bucket{labels} {self.count}"
+        yield f"{name}_sum{self.labels} {self.sum}"
+        yield f"{name}_count{self.labels} {self.count}"
+
+
+class MetricsRegistry:
+    """
+    Holds all metric families of the process and renders them in the
+    Prometheus text exposition format.
+    """
+    def __init__(self):
+        self.families = {}
+        self.collectors = []
+
+    def _family(self, name, help_text, metric_type):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = {"help": help_text, "type": metric_type, "metrics": {}}
+        return family
+
+    def _get(self, name, help_text, metric_type, labels, factory):
+        family = self._family(name, help_text, metric_type)
+        key = tuple(sorted(labels.items()))
+        metric = family["metrics"].get(key)
+        if metric is None:
+            metric = family["metrics"][key] = factory()
+        return metric
+
+    def counter(self, name, help_text, **labels) -> Counter:
+        return self._get(name, help_text, "counter", labels, lambda: Counter(labels))
+
+    def gauge(self, name, help_text, fn=None, **labels) -> Gauge:
+        gauge = self._get(name, help_text, "gauge", labels, lambda: Gauge(labels))
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help_text, bounds, **labels) -> Histogram:
+        return self._get(name, help_text, "histogram", labels, lambda: Histogram(labels, bounds))
+
+    def unregister(self, **labels) -> list:
+        """
+        Removes every series whose labels include all of `labels` (e.g. one
+        adapter's stream) so it is no longer exported and its gauge callbacks
+        are released. Returns the removed series for restore().
+        """
+        wanted = set(labels.items())
+        removed = []
+        for name, family in list(self.families.items()):
+            for key in [key for key in family["metrics"] if wanted <= set(key)]:
+                removed.append((name, family["help"], family["type"], key, family["metrics"].pop(key)))
+            if not family["metrics"]:
+                del self.families[name]
+        return removed
+
+    def restore(self, series):
+        """Re-registers series returned by unregister(), keeping their values."""
+        for name, help_text, metric_type, key, metric in series:
+            self._family(name, help_text, metric_type)["metrics"].setdefault(key, metric)
+
+    def register_collector(self, collector):
+        """Registers a callable returning extra exposition lines, evaluated at scrape time."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for name, family in self.families.items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for metric in family["metrics"].values():
+                lines.extend(metric.samples(name))
+        for collector in self.collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry.
+registry = MetricsRegistry()
+
+LATENCY_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+event_loop_lag = registry.gauge("ingestion_event_loop_lag_seconds", "Delay of the last event loop lag probe.")
+event_loop_lag_max = registry.gauge("ingestion_event_loop_lag_max_seconds", "Largest event loop lag seen since start.")
+registry.gauge("ingestion_log_queue_depth", "Log records waiting for the log writer thread.", fn=log_queue_depth)
+registry.gauge("ingestion_log_records_dropped", "Log records dropped because the log queue was full.", fn=dropped_log_records)
+
+
+async def monitor_event_loop_lag(interval_seconds: float = 0.5):
+    """Measures how late a periodic sleep wakes up, i.e. how long the loop was blocked."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval_seconds
+        await asyncio.sleep(interval_seconds)
+        lag = max(0.0, loop.time() - expected)
+        event_loop_lag.set(lag)
+        if lag > event_loop_lag_max.value:
+            event_loop_lag_max.set(lag)
+
+
+def latency_collector():
+    """
+    Exposes the last closed stage-latency window. The window resets on every
+    report, so quantiles and sample counts are gauges rather than a summary.
+    """
+    name = "ingestion_stage_latency_seconds"
+    yield f"# HELP {name} Per-stage event latency quantiles over the last reporting window."
+    yield f"# TYPE {name} gauge"
+    for pair, snap in tracker.last_snapshots.items():
+        for quantile, key in (("0.5", "p50_ms"), ("0.9", "p90_ms"), ("0.99", "p99_ms"), ("0.999", "p999_ms")):
+            yield f'{name}{{pair="{pair}",quantile="{quantile}"}} {snap[key] / 1000.0}'
+    yield f"# HELP {name}_window_count Samples in the last reporting window."
+    yield f"# TYPE {name}_window_count gauge"
+    for pair, snap in tracker.last_snapshots.items():
+        yield f'{name}_window_count{{pair="{pair}"}} {snap["count"]}'
+
+
+registry.register_collector(latency_collector)
+
+
+async def start_metrics_server(host: str, port: int):
+    """Starts the HTTP endpoint serving /metrics."""
+    server = HttpServer()
+
+    async def handle_metrics(request):
+        return 200, "text/plain; version=0.0.4", registry.render()
+
+    server.route("GET", "/metrics", handle_metrics)
+    await server.start(host, port)
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -1,11 +1,23 @@
 import os
-from pymongo import MongoClient
-from utils.logger import get_logger
+import time
+import logging
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient, UpdateOne, ReplaceOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from logic.anomaly_detection.schema import is_anomaly
+from utils.events import Event
+from utils.latency import stamp, STAGE_WRITTEN
+from utils.logger import get_logger, SampledLogger
 
 logger = get_logger(__name__)
+error_log = SampledLogger(logger, max_per_interval=1, interval_seconds=10.0)
 
 _client = None
 _db = None
+_sketch_indexes_ready = False
+_distinct_indexes_ready = False
 
 def get_mongo_client():
     global _client, _db
@@ -17,21 +29,100 @@ def get_mongo_client():
         logger.info(f"Connected to MongoDB: {db_name}")
     return _db
 
-def save_event(event: dict):
-    """Save an enriched event directly to MongoDB."""
+ANOMALY_COLLECTIONS = {"twitch_chat": "chat_anomalies", "market_data": "market_anomalies"}
+
+def save_event(event):
+    """
+    Save an enriched event (a typed Event or a schema dict) directly to MongoDB.
+    The document is BSON-encoded once; an anomaly's copy in its own collection
+    reuses the same bytes and _id.
+    """
     try:
         db = get_mongo_client()
-        db.enriched_events.insert_one(event)
-        
+        doc = event.to_dict() if isinstance(event, Event) else event
+        stamp(doc, STAGE_WRITTEN)
+        doc.setdefault("_id", ObjectId())
+        raw = RawBSONDocument(bson.encode(doc))
+        db.enriched_events.insert_one(raw)
+
         # Also save to specific anomaly collection if applicable
-        source = event.get("source", "")
-        anomaly = event.get("enrichments", {}).get("anomaly", {})
-        is_anomaly = anomaly.get("is_anomaly", anomaly.get("isAnomaly", "False"))
-        
-        if is_anomaly in [True, "True", "true"]:
-            if source == "twitch_chat":
-                db.chat_anomalies.insert_one(event)
-            elif source == "market_data":
-                db.market_anomalies.insert_one(event)
+        collection = ANOMALY_COLLECTIONS.get(doc.get("source", ""))
+        if collection and is_anomaly(doc.get("enrichments", {}).get("anomaly", {})):
+            db[collection].insert_one(raw)
+    except Exception as e:
+        error_log.log(logging.ERROR, "Error saving to MongoDB: %s", e)
+
+def _insert_unordered(collection, docs: list) -> int:
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicate _ids come from re-running an interrupted chunk; anything else is a real failure
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nInserted", 0)
+
+def save_events_bulk(events: list) -> int:
+    """
+    Unordered bulk insert of enriched events with preassigned _ids (backfills),
+    copying anomalies to their collections like save_event. Errors propagate
+    so the caller does not checkpoint a failed batch. Returns the number of
+    new events.
+    """
+    if not events:
+        return 0
+    db = get_mongo_client()
+    inserted = _insert_unordered(db.enriched_events, events)
+    for source, collection in ANOMALY_COLLECTIONS.items():
+        anomalies = [event for event in events
+                     if event["source"] == source and is_anomaly(event["enrichments"].get("anomaly"))]
+        if anomalies:
+            _insert_unordered(db[collection], anomalies)
+    return inserted
+
+def save_latency_stats(service: str, snapshots: dict):
+    """Upsert the latest latency histogram snapshot for each stage pair."""
+    try:
+        db = get_mongo_client()
+        now = time.time()
+        ops = [
+            UpdateOne(
+                {"_id": f"{service}|{pair}"},
+                {"$set": {"service": service, "pair": pair, "updated_at": now, **snap}},
+                upsert=True,
+            )
+            for pair, snap in snapshots.items()
+        ]
+        if ops:
+            db.latency_stats.bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.error(f"Error saving latency stats to MongoDB: {e}")
+
+
+def save_chat_sketches(docs: list):
+    """Upsert chat sketch snapshots (one document per channel, granularity, bucket and process)."""
+    global _sketch_indexes_ready
+    try:
+        db = get_mongo_client()
+        if not _sketch_indexes_ready:
+            db.chat_sketches.create_index([("channel", ASCENDING), ("granularity", ASCENDING), ("start", ASCENDING)])
+            # Minute snapshots carry expires_at; hour/day snapshots have none and are kept
+            db.chat_sketches.create_index("expires_at", expireAfterSeconds=0)
+            _sketch_indexes_ready = True
+        if docs:
+            db.chat_sketches.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+    except Exception as e:
+        logger.error(f"Error saving chat sketches to MongoDB: {e}")
+
+def save_distinct_counts(docs: list):
+    """Upsert HyperLogLog window snapshots (registers stored as bytes)."""
+    global _distinct_indexes_ready
+    try:
+        db = get_mongo_client()
+        if not _distinct_indexes_ready:
+            db.distinct_counts.create_index([("metric", ASCENDING), ("scope", ASCENDING), ("granularity", ASCENDING), ("start", ASCENDING)])
+            db.distinct_counts.create_index("expires_at", expireAfterSeconds=0)
+            _distinct_indexes_ready = True
+        if docs:
+            db.distinct_counts.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
     except Exception as e:
-        logger.error(f"Error saving to MongoDB: {e}")
+        logger.error(f"Error saving distinct counts to MongoDB: {e}")
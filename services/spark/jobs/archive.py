@@ -0,0 +1,153 @@
+"""
+Parquet archive helpers (pyarrow only, no Spark needed).
+
+The streaming sink in stream_processor.py appends one small file per partition
+per micro-batch under <root>/<topic>/source=/key=/date=/hour=. `compact_archive`
+rewrites each closed hour into a single file, and `read_range` reads a time
+range back, pruning partitions by date/hour and projecting only the requested
+columns.
+
+    python archive.py compact --root /data/archive
+    python archive.py query --root /data/archive --topic market --key BTCUSDT \\
+        --start 2026-01-01T00:00 --end 2026-01-01T06:00 --columns timestamp,price,quantity
+"""
+import argparse
+import glob
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", "/data/archive")
+PARTITION_SCHEMA = pa.schema([
+    ("source", pa.string()),
+    ("key", pa.string()),
+    ("date", pa.string()),
+    ("hour", pa.string()),
+])
+COMPACTED_PREFIX = "compacted-"
+
+
+def _partition_values(ts: float):
+    """(date, hour) partition strings for a UNIX timestamp, in UTC like the sink."""
+    moment = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%H")
+
+
+def _range_filter(start: float, end: float):
+    """Partition filter for [start, end]; the string forms of date and hour sort chronologically."""
+    date, hour = ds.field("date"), ds.field("hour")
+    start_date, start_hour = _partition_values(start)
+    end_date, end_hour = _partition_values(end)
+    after_start = (date > start_date) | ((date == start_date) & (hour >= start_hour))
+    before_end = (date < end_date) | ((date == end_date) & (hour <= end_hour))
+    return after_start & before_end
+
+
+def open_topic(root: str, topic: str) -> ds.Dataset:
+    return ds.dataset(
+        os.path.join(root, topic), format="parquet",
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+    )
+
+
+def read_range(root: str, topic: str, start: float, end: float, columns=None, key=None, source=None):
+    """
+    Returns a pandas DataFrame of the topic's rows with start <= timestamp <= end.
+    Only the date/hour (and key/source, if given) partitions that overlap the
+    range are opened, and only `columns` are read from the files.
+    """
+    predicate = _range_filter(start, end)
+    if key is not None:
+        predicate &= ds.field("key") == key
+    if source is not None:
+        predicate &= ds.field("source") == source
+    # Exact bound on the event time inside the boundary hours
+    predicate &= (ds.field("timestamp") >= start) & (ds.field("timestamp") <= end)
+    table = open_topic(root, topic).to_table(columns=columns, filter=predicate)
+    return table.to_pandas()
+
+
+def compact_partition(directory: str) -> int:
+    """
+    Rewrites all Parquet files of one partition directory into a single file.
+    The new file is written under a hidden name and renamed into place before
+    the inputs are removed, so readers never see a partial file.
+    Returns the number of input files replaced (0 if already compact).
+    """
+    files = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    if len(files) <= 1:
+        return 0
+    table = ds.dataset(files, format="parquet").to_table()
+    name = f"{COMPACTED_PREFIX}{uuid.uuid4().hex}.parquet"
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, tmp_path, compression="snappy")
+    os.replace(tmp_path, os.path.join(directory, name))
+    for path in files:
+        os.remove(path)
+        # Checksum side files written by Spark's local filesystem
+        crc = os.path.join(directory, f".{os.path.basename(path)}.crc")
+        if os.path.exists(crc):
+            os.remove(crc)
+    return len(files)
+
+
+def compact_archive(root: str, min_age_seconds: float = 3600.0, now: float = None) -> dict:
+    """
+    Compacts every hour partition that closed at least `min_age_seconds` ago,
+    leaving the hour the sink is still appending to alone.
+    Returns {"partitions": compacted partition count, "files": files replaced}.
+    """
+    now = time.time() if now is None else now
+    stats = {"partitions": 0, "files": 0}
+    for directory in glob.glob(os.path.join(root, "*", "source=*", "key=*", "date=*", "hour=*")):
+        date = os.path.basename(os.path.dirname(directory)).split("=", 1)[1]
+        hour = os.path.basename(directory).split("=", 1)[1]
+        hour_start = datetime.strptime(f"{date} {hour}", "%Y-%m-%d %H").replace(tzinfo=timezone.utc).timestamp()
+        if hour_start + 3600 + min_age_seconds > now:
+            continue
+        replaced = compact_partition(directory)
+        if replaced:
+            stats["partitions"] += 1
+            stats["files"] += replaced
+    return stats
+
+
+def _parse_time(value: str) -> float:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parquet archive maintenance and queries.")
+    parser.add_argument("command", choices=["compact", "query"])
+    parser.add_argument("--root", default=ARCHIVE_PATH)
+    parser.add_argument("--min-age-seconds", type=float, default=3600.0)
+    parser.add_argument("--topic", default="market")
+    parser.add_argument("--start", help="ISO time (UTC if no offset)")
+    parser.add_argument("--end", help="ISO time (UTC if no offset)")
+    parser.add_argument("--key", help="Symbol or channel")
+    parser.add_argument("--columns", help="Comma-separated column projection")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        stats = compact_archive(args.root, args.min_age_seconds)
+        print(f"Compacted {stats['partitions']} partitions ({stats['files']} files).")
+        return
+
+    end = _parse_time(args.end) if args.end else time.time()
+    start = _parse_time(args.start) if args.start else end - 3600
+    columns = args.columns.split(",") if args.columns else None
+    df = read_range(args.root, args.topic, start, end, columns=columns, key=args.key)
+    print(df.to_string(max_rows=50))
+    print(f"{len(df)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Keyed, checkpointed anomaly detection for DETECTION_MODE=spark.
+
+Mirrors MarketAnomalyDetector (rolling z-score per symbol) and
+ChatAnomalyDetector (toxicity spike plus per-author frequency spam) from the
+ingestion service, but keeps the rolling state in Spark's state store through
+applyInPandasWithState, so detection scales with executors and survives
+restarts. Results are emitted as the JSON of the same typed (schema version 2)
+anomaly dict the ingestion detectors produce.
+
+Thresholds are read once on the driver (detection_settings) and bound into
+the state functions with functools.partial, so executors never depend on
+their own environment. Chat state is keyed by (channel, author).
+
+Shipped to executors with addPyFile; only pandas/numpy are needed here.
+"""
+import json
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+ANOMALY_SCHEMA_VERSION = 2
+
+OUTPUT_SCHEMA = "value string, anomaly string"
+MARKET_STATE_SCHEMA = "prices array<double>"
+CHAT_STATE_SCHEMA = "timestamps array<double>"
+
+
+def detection_settings() -> dict:
+    """Detector thresholds from the driver's environment, as keyword arguments per detector."""
+    return {
+        "market": {
+            "window_size": int(os.getenv("ANOMALY_WINDOW_SIZE", "50")),
+            "z_threshold": float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0")),
+        },
+        "chat": {
+            "window_seconds": float(os.getenv("CHAT_WINDOW_SECONDS", "60")),
+            "toxicity_threshold": float(os.getenv("CHAT_TOXICITY_THRESHOLD", "0.8")),
+            "freq_threshold": int(os.getenv("CHAT_FREQ_THRESHOLD", "10")),
+        },
+    }
+
+
+def market_result(prices: deque, price: float, z_threshold: float = 3.0) -> dict:
+    """Z-score of `price` against the window, then appends it (same semantics as MarketAnomalyDetector)."""
+    if len(prices) < 2:
+        prices.append(price)
+        return {"schema_version": ANOMALY_SCHEMA_VERSION, "is_anomaly": False, "type": None, "reason": "Insufficient data"}
+
+    window = np.fromiter(prices, dtype=float, count=len(prices))
+    mean = window.mean()
+    std = window.std()
+    z_score = 0.0 if std == 0 else (price - mean) / std
+    is_anomaly = abs(z_score) > z_threshold
+    prices.append(price)
+
+    return {
+        "schema_version": ANOMALY_SCHEMA_VERSION,
+        "is_anomaly": bool(is_anomaly),
+        "type": "z_score_outlier" if is_anomaly else "normal",
+        "severity": round(float(abs(z_score)), 4),
+        "mean": round(float(mean), 4),
+        "std": round(float(std), 4),
+        "z_score": round(float(z_score), 4),
+        "threshold": z_threshold,
+    }
+
+
+def chat_result(timestamps: deque, author: str, timestamp: float, toxic_score, window_seconds: float = 60.0,
+                toxicity_threshold: float = 0.8, freq_threshold: int = 10) -> dict:
+    """Toxicity spike and frequency spam check for one message (same semantics as ChatAnomalyDetector)."""
+    result = {"schema_version": ANOMALY_SCHEMA_VERSION, "is_anomaly": False, "type": None, "details": {}}
+    if toxic_score is not None and toxic_score > toxicity_threshold:
+        result = {
+            "schema_version": ANOMALY_SCHEMA_VERSION,
+            "is_anomaly": True,
+            "type": "toxicity_spike",
+            "details": {"user": author, "score": float(toxic_score)},
+        }
+
+    timestamps.append(timestamp)
+    while timestamps and timestamps[0] < timestamp - window_seconds:
+        timestamps.popleft()
+
+    if len(timestamps) > freq_threshold:
+        result = {
+            "schema_version": ANOMALY_SCHEMA_VERSION,
+            "is_anomaly": True,
+            "type": "frequency_spam",
+            "details": {"user": author, "count_in_window": len(timestamps)},
+        }
+    return result
+
+
+def _ordered(pdfs):
+    """All rows of one key in this micro-batch, in event-time order."""
+    pdf = pd.concat(list(pdfs), ignore_index=True)
+    return pdf.sort_values("timestamp", kind="stable")
+
+
+def detect_market(key, pdfs, state, window_size: int = 50, z_threshold: float = 3.0):
+    """applyInPandasWithState function keyed by symbol; state is the rolling price window."""
+    prices = deque(state.get[0] if state.exists else (), maxlen=window_size)
+    pdf = _ordered(pdfs)
+    anomalies = [json.dumps(market_result(prices, price, z_threshold)) for price in pdf["price"].to_numpy()]
+    state.update((list(prices),))
+    yield pd.DataFrame({"value": pdf["value"].to_numpy(), "anomaly": anomalies})
+
+
+def detect_chat(key, pdfs, state, window_seconds: float = 60.0, toxicity_threshold: float = 0.8,
+                freq_threshold: int = 10):
+    """
+    applyInPandasWithState function keyed by (channel, author); state is the
+    author's message times in that channel inside the window. Idle authors
+    time out and are dropped.
+    """
+    if state.hasTimedOut:
+        state.remove()
+        return
+    timestamps = deque(state.get[0] if state.exists else ())
+    author = key[1]
+    pdf = _ordered(pdfs)
+    anomalies = [
+        json.dumps(chat_result(timestamps, author, ts, None if pd.isna(score) else score,
+                               window_seconds, toxicity_threshold, freq_threshold))
+        for ts, score in zip(pdf["timestamp"].to_numpy(), pdf["toxic"].to_numpy())
+    ]
+    state.update((list(timestamps),))
+    state.setTimeoutDuration(int(window_seconds * 1000))
+    yield pd.DataFrame({"value": pdf["value"].to_numpy(), "anomaly": anomalies})
@@ -0,0 +1,144 @@
+from array import array
+
+# Stage indexes of the "stages" vector stamped by the ingestion service.
+STAGE_SOURCE = 0
+STAGE_RECEIVED = 1
+STAGE_ENRICHED = 2
+STAGE_PRODUCED = 3
+STAGE_PROCESSED = 4
+STAGE_WRITTEN = 5
+
+STAGE_NAMES = ("source", "received", "enriched", "produced", "processed", "written")
+
+# Stage pairs measured by the Spark job.
+SPARK_PAIRS = (
+    (STAGE_PRODUCED, STAGE_PROCESSED),
+    (STAGE_PROCESSED, STAGE_WRITTEN),
+    (STAGE_SOURCE, STAGE_WRITTEN),
+)
+
+
+def pair_name(start: int, end: int) -> str:
+    return f"{STAGE_NAMES[start]}->{STAGE_NAMES[end]}"
+
+
+# The bucket layout (sub_bucket_bits, max_shift, _index/_value_at) must match
+# services/ingestion/utils/latency.py: the Platform Status page compares the
+# snapshots of both services side by side. The Spark image is built from
+# services/spark only, so the class is copied rather than imported;
+# services/ingestion/tests/verify_latency_layout.py checks the copies agree.
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram over microsecond latencies.
+    Each power-of-two range is split into equal sub-buckets, giving a bounded
+    relative error (~1.6% with 7 sub-bucket bits) in a fixed-size counts array.
+    """
+    def __init__(self, sub_bucket_bits=7, max_shift=34):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.max_index = self.sub_bucket_count + max_shift * self.half_count - 1
+        self.reset()
+
+    def reset(self):
+        self.counts = array('q', bytes(8 * (self.max_index + 1)))
+        self.total = 0
+        self.min_us = None
+        self.max_us = 0
+        self.sum_us = 0
+
+    def _index(self, value_us: int) -> int:
+        if value_us < self.sub_bucket_count:
+            return value_us
+        shift = value_us.bit_length() - self.sub_bucket_bits
+        index = self.sub_bucket_count + (shift - 1) * self.half_count + ((value_us >> shift) - self.half_count)
+        return index if index < self.max_index else self.max_index
+
+    def _value_at(self, index: int) -> int:
+        """Returns the midpoint of a bucket in microseconds."""
+        if index < self.sub_bucket_count:
+            return index
+        offset = index - self.sub_bucket_count
+        shift = offset // self.half_count + 1
+        mantissa = offset % self.half_count + self.half_count
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, seconds: float):
+        """Records one latency sample given in seconds. Negative values (clock skew) clamp to 0."""
+        value_us = int(seconds * 1_000_000) if seconds > 0 else 0
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+        if self.min_us is None or value_us < self.min_us:
+            self.min_us = value_us
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, q: float) -> float:
+        """Returns the q-th percentile (0-100) in milliseconds."""
+        if self.total == 0:
+            return 0.0
+        target = max(1, int(round(self.total * q / 100.0)))
+        running = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                running += c
+                if running >= target:
+                    return min(self._value_at(i), self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def snapshot(self) -> dict:
+        """Summarizes the histogram in milliseconds."""
+        return {
+            "count": self.total,
+            "min_ms": (self.min_us or 0) / 1000.0,
+            "mean_ms": (self.sum_us / self.total / 1000.0) if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max_us / 1000.0,
+        }
+
+
+def partition_histograms(rows, pairs=SPARK_PAIRS):
+    """
+    mapPartitions function: builds one histogram per stage pair from rows
+    holding a "stages" array and yields a single {pair: histogram} dict.
+    """
+    histograms = {pair: LatencyHistogram() for pair in pairs}
+    for row in rows:
+        stages = row["stages"]
+        if not stages:
+            continue
+        for (start, end), hist in histograms.items():
+            t0 = stages[start]
+            t1 = stages[end]
+            if t0 is not None and t1 is not None:
+                hist.record(t1 - t0)
+    yield histograms
+
+
+def merge_histograms(left: dict, right: dict) -> dict:
+    for pair, hist in right.items():
+        left[pair].merge(hist)
+    return left
+
+
+def snapshot_histograms(histograms: dict, window_seconds: float) -> dict:
+    snapshots = {}
+    for (start, end), hist in histograms.items():
+        snap = hist.snapshot()
+        snap["window_seconds"] = window_seconds
+        snapshots[pair_name(start, end)] = snap
+    return snapshots
@@ -1,7 +1,22 @@
 import os
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import from_json, col, window, avg
-from pyspark.sql.types import StructType, StructField, StringType, DoubleType, LongType, MapType
+import time
+from functools import partial
+from pyspark.sql import SparkSession, Row
+from pyspark.sql.functions import (
+    from_json, col, window, avg, array, lit, udf, coalesce, date_format, get_json_object, lower, struct, when,
+)
+from pyspark.sql.types import (
+    StructType, StructField, StringType, DoubleType, LongType, MapType, ArrayType, BooleanType, IntegerType,
+)
+from pyspark.sql.streaming.state import GroupStateTimeout
+
+from latency import (
+    STAGE_SOURCE, STAGE_RECEIVED, STAGE_ENRICHED, STAGE_PRODUCED,
+    partition_histograms, merge_histograms, snapshot_histograms,
+)
+from detection import (
+    detect_market, detect_chat, detection_settings, OUTPUT_SCHEMA, MARKET_STATE_SCHEMA, CHAT_STATE_SCHEMA,
+)
 
 # --- Configuration ---
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
@@ -9,69 +24,388 @@ MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017/")
 MONGO_DATABASE = os.getenv("MONGO_DATABASE", "DataFlowDB")
 CHAT_TOPIC = os.getenv("CHAT_KAFKA_TOPIC", "chat_stream")
 MARKET_TOPIC = os.getenv("MARKET_KAFKA_TOPIC", "market_stream")
+DEPTH_TOPIC = os.getenv("DEPTH_KAFKA_TOPIC", "depth_stream")
+JOBS_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_DIR = os.getenv("SPARK_CHECKPOINT_DIR", "/tmp/spark-checkpoints")
+# "ingestion": events arrive already scored; "spark": keyed stateful detection runs here
+DETECTION_MODE = os.getenv("DETECTION_MODE", "ingestion").lower()
+# Parquet archive on a local or mounted filesystem; set ARCHIVE_PATH to empty to disable
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", "/data/archive")
+ARCHIVE_TRIGGER_INTERVAL = os.getenv("ARCHIVE_TRIGGER_INTERVAL", "1 minute")
+ARCHIVE_PARTITIONS = ["source", "key", "date", "hour"]
 
 # --- Schemas ---
+# Typed anomaly result, schema version 2 (see logic/anomaly_detection/schema.py in ingestion)
+ANOMALY_DETAILS_SCHEMA = StructType([
+    StructField("user", StringType(), True),
+    StructField("score", DoubleType(), True),
+    StructField("count_in_window", LongType(), True),
+])
+
+ANOMALY_SCHEMA = StructType([
+    StructField("schema_version", IntegerType(), True),
+    StructField("is_anomaly", BooleanType(), True),
+    StructField("type", StringType(), True),
+    StructField("reason", StringType(), True),
+    StructField("severity", DoubleType(), True),
+    StructField("mean", DoubleType(), True),
+    StructField("std", DoubleType(), True),
+    StructField("z_score", DoubleType(), True),
+    StructField("details", ANOMALY_DETAILS_SCHEMA, True),
+    # Quantile (median/MAD over log returns) market detector
+    StructField("log_return", DoubleType(), True),
+    StructField("median", DoubleType(), True),
+    StructField("mad", DoubleType(), True),
+])
+QUANTILE_FIELDS = ("log_return", "median", "mad")
+
+# Version 1 producers sent every anomaly value as a string
+LEGACY_ANOMALY_SCHEMA = MapType(StringType(), StringType())
+
 CHAT_SCHEMA = StructType([
     StructField("source", StringType(), True),
     StructField("timestamp", DoubleType(), True),
+    StructField("stages", ArrayType(DoubleType()), True),
     StructField("payload", StructType([
         StructField("author", StringType(), True),
         StructField("text", StringType(), True),
+        StructField("channel", StringType(), True),
     ])),
     StructField("enrichments", StructType([
         StructField("toxicity", MapType(StringType(), DoubleType()), True),
-        StructField("anomaly", MapType(StringType(), StringType()), True), # Anomaly details are mixed type, handle as string map
+        StructField("toxicity_status", StringType(), True), # "unscored" while the model was warming up
+        StructField("anomaly", ANOMALY_SCHEMA, True),
     ]))
 ])
 
+INDICATOR_SCHEMA = StructType([
+    StructField(name, DoubleType(), True)
+    for name in ("ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist",
+                 "rsi", "bb_mid", "bb_upper", "bb_lower", "vwap")
+])
+
 MARKET_SCHEMA = StructType([
     StructField("source", StringType(), True),
     StructField("timestamp", DoubleType(), True),
+    StructField("stages", ArrayType(DoubleType()), True),
     StructField("payload", StructType([
         StructField("symbol", StringType(), True),
         StructField("price", DoubleType(), True),
         StructField("quantity", DoubleType(), True),
     ])),
     StructField("enrichments", StructType([
-        StructField("anomaly", MapType(StringType(), StringType()), True),
+        StructField("anomaly", ANOMALY_SCHEMA, True),
+        StructField("indicators", INDICATOR_SCHEMA, True),
     ]))
 ])
 
+BOOK_LEVELS = ArrayType(ArrayType(DoubleType()))
+
+DEPTH_SCHEMA = StructType([
+    StructField("source", StringType(), True),
+    StructField("timestamp", DoubleType(), True),
+    StructField("stages", ArrayType(DoubleType()), True),
+    StructField("payload", StructType([
+        StructField("symbol", StringType(), True),
+        StructField("last_update_id", LongType(), True),
+        StructField("best_bid", DoubleType(), True),
+        StructField("best_ask", DoubleType(), True),
+        StructField("spread", DoubleType(), True),
+        StructField("mid", DoubleType(), True),
+        StructField("spread_bps", DoubleType(), True),
+        StructField("bid_depth", DoubleType(), True),
+        StructField("ask_depth", DoubleType(), True),
+        StructField("imbalance", DoubleType(), True),
+        StructField("bids", BOOK_LEVELS, True),
+        StructField("asks", BOOK_LEVELS, True),
+    ])),
+])
+
 def create_spark_session():
     """Creates and configures a SparkSession."""
     return (
         SparkSession.builder.appName("DataFlowStreamProcessor")
         .config("spark.mongodb.output.uri", f"{MONGO_URI}{MONGO_DATABASE}")
         .config("spark.jars.packages", "org.apache.spark:spark-sql-kafka-0-10_2.12:3.4.0,org.mongodb.spark:mongo-spark-connector_2.12:3.0.1")
-        .config("spark.sql.streaming.checkpointLocation", "/tmp/spark-checkpoints")
+        .config("spark.sql.streaming.checkpointLocation", CHECKPOINT_DIR)
+        # Archive date/hour partitions are derived in UTC
+        .config("spark.sql.session.timeZone", "UTC")
         .getOrCreate()
     )
 
-def process_stream(df, schema, collection_name):
-    """General function to process a Kafka stream and write to MongoDB."""
+def without_anomaly(schema):
+    """The event schema minus enrichments.anomaly, which parse_events reads separately."""
+    fields = []
+    for field in schema.fields:
+        if field.name == "enrichments":
+            inner = StructType([f for f in field.dataType.fields if f.name != "anomaly"])
+            field = StructField(field.name, inner, field.nullable)
+        fields.append(field)
+    return StructType(fields)
+
+def anomaly_column(anomaly_json):
+    """
+    Typed anomaly struct from the anomaly's JSON text. Version 2 JSON parses
+    directly; version 1 string maps are converted field by field (and tagged
+    schema_version 1) so both generations land in the same columns.
+    """
+    legacy = from_json(anomaly_json, LEGACY_ANOMALY_SCHEMA)
+    upgraded = struct(
+        lit(1).alias("schema_version"),
+        (lower(legacy["is_anomaly"]) == "true").alias("is_anomaly"),
+        legacy["type"].alias("type"),
+        legacy["reason"].alias("reason"),
+        *[legacy[name].cast("double").alias(name) for name in ("severity", "mean", "std", "z_score")],
+        from_json(legacy["details"], ANOMALY_DETAILS_SCHEMA).alias("details"),
+        *[lit(None).cast("double").alias(name) for name in QUANTILE_FIELDS],
+    )
+    return (
+        when(anomaly_json.isNull(), lit(None).cast(ANOMALY_SCHEMA))
+        .when(get_json_object(anomaly_json, "$.schema_version").isNotNull(), from_json(anomaly_json, ANOMALY_SCHEMA))
+        .otherwise(upgraded)
+    )
+
+def parse_events(df, schema):
+    """
+    Deserializes Kafka values into the event schema. The anomaly is parsed on
+    its own so a legacy string-typed anomaly cannot null out the whole event.
+    """
+    value = col("value").cast("string")
+    parsed = df.select(
+        from_json(value, without_anomaly(schema)).alias("data"),
+        get_json_object(value, "$.enrichments.anomaly").alias("anomaly_json"),
+    ).select("data.*", "anomaly_json")
+    return (
+        parsed.withColumn("enrichments", col("enrichments").withField("anomaly", anomaly_column(col("anomaly_json"))))
+        .drop("anomaly_json")
+    )
+
+# Evaluated per row on the executor while the row is being written out
+write_clock = udf(lambda: time.time(), DoubleType()).asNondeterministic()
+
+def stamp_stages(batch_df, processed_ts):
+    """Fills the Spark processed and Mongo written stamps of the stage vector."""
+    stages = col("stages")
+    return batch_df.withColumn("stages", array(
+        stages[STAGE_SOURCE], stages[STAGE_RECEIVED], stages[STAGE_ENRICHED], stages[STAGE_PRODUCED],
+        lit(processed_ts), write_clock(),
+    ))
+
+# When each stream's latency snapshots were last published; window_seconds is the interval since then
+JOB_STARTED = time.time()
+_latency_window_start = {}
+
+def publish_latency(batch_df, stream):
+    """
+    Builds per-stage latency histograms on the executors and upserts their
+    snapshots into MongoDB, one document per stream and stage pair, so the
+    chat and market queries do not overwrite each other.
+    """
+    histograms = batch_df.select("stages").rdd.mapPartitions(partition_histograms).reduce(merge_histograms)
+    now = time.time()
+    snapshots = snapshot_histograms(histograms, now - _latency_window_start.get(stream, JOB_STARTED))
+    _latency_window_start[stream] = now
+    rows = [
+        Row(_id=f"spark|{stream}|{pair}", service="spark", stream=stream, pair=pair, updated_at=now, **snap)
+        for pair, snap in snapshots.items() if snap["count"]
+    ]
+    if rows:
+        spark = batch_df.sparkSession
+        spark.createDataFrame(rows).write.format("mongo").mode("append").option("collection", "latency_stats").save()
+
+def write_batch(batch_df, collection_name, latency_stream=None):
+    """
+    Stamps a micro-batch with its processing times and appends it to a MongoDB
+    collection. With `latency_stream`, also publishes the batch's stage latencies under that stream.
+    """
+    if batch_df.rdd.isEmpty():
+        return
+    processed_ts = time.time()
+    # Persisted so the latency pass reads the same written stamps as MongoDB
+    stamped = stamp_stages(batch_df, processed_ts).persist()
+    try:
+        stamped.write.format("mongo").mode("append").option("collection", collection_name).save()
+        if latency_stream:
+            publish_latency(stamped, latency_stream)
+    finally:
+        stamped.unpersist()
+
+def flatten_columns(schema, prefix=()):
+    """
+    Expands nested structs into top-level columns named by their path, with the
+    payload/enrichments prefixes dropped (payload.price -> price,
+    enrichments.indicators.rsi -> indicators_rsi). Maps and arrays are kept as is.
+    """
+    columns = []
+    for field in schema.fields:
+        path = prefix + (field.name,)
+        if isinstance(field.dataType, StructType):
+            columns.extend(flatten_columns(field.dataType, path))
+        else:
+            name = "_".join(part for part in path if part not in ("payload", "enrichments"))
+            columns.append(col(".".join(path)).alias(name))
+    return columns
+
+def write_archive(batch_df, topic_name, key_field):
+    """Appends a micro-batch to the Parquet archive, partitioned by source, symbol/channel and UTC date/hour."""
+    if batch_df.rdd.isEmpty():
+        return
+    event_time = col("timestamp").cast("timestamp")
+    flat = batch_df.select(
+        *flatten_columns(batch_df.schema),
+        coalesce(col(key_field), lit("unknown")).alias("key"),
+        date_format(event_time, "yyyy-MM-dd").alias("date"),
+        date_format(event_time, "HH").alias("hour"),
+    )
+    # One file per partition directory per batch; archive.py compacts closed hours afterwards
+    (
+        flat.repartition(*ARCHIVE_PARTITIONS)
+        .write.mode("append")
+        .partitionBy(*ARCHIVE_PARTITIONS)
+        .parquet(os.path.join(ARCHIVE_PATH, topic_name))
+    )
+
+def archive_stream(parsed_df, topic_name, key_field, checkpoint_name=None):
+    """Starts the Parquet archive sink for one topic; a longer trigger keeps files from getting too small."""
+    writer = parsed_df.writeStream
+    if checkpoint_name:
+        writer = writer.queryName(checkpoint_name).option(
+            "checkpointLocation", os.path.join(CHECKPOINT_DIR, checkpoint_name))
+    return (
+        writer
+        .trigger(processingTime=ARCHIVE_TRIGGER_INTERVAL)
+        .foreachBatch(lambda batch_df, batch_id: write_archive(batch_df, topic_name, key_field))
+        .start()
+    )
+
+# Per-detector inputs: grouping key, the fields the detector reads, its state function
+# and the query name its checkpoint lives under (changing the key needs a new one)
+DETECTORS = {
+    "market": {
+        "key": ["symbol"],
+        "query": "detect_market",
+        "fields": [col("data.payload.symbol").alias("symbol"), col("data.payload.price").alias("price")],
+        "fn": detect_market,
+        "state": MARKET_STATE_SCHEMA,
+        "timeout": GroupStateTimeout.NoTimeout,
+    },
+    "chat": {
+        "key": ["channel", "author"],
+        "query": "detect_chat_by_channel",
+        "fields": [
+            col("data.payload.channel").alias("channel"),
+            col("data.payload.author").alias("author"),
+            col("data.enrichments.toxicity").getItem("toxic").alias("toxic"),
+        ],
+        "fn": detect_chat,
+        "state": CHAT_STATE_SCHEMA,
+        "timeout": GroupStateTimeout.ProcessingTimeTimeout,
+    },
+}
+
+def detect_stream(df, schema, detector_name, settings):
+    """
+    Runs a detector as a keyed stateful operator and returns the parsed events
+    with enrichments.anomaly filled in, in the same shape ingestion produces.
+    `settings` comes from detection_settings() on the driver and is bound into
+    the state function, so executors need no detector environment.
+    """
+    detector = DETECTORS[detector_name]
+    fn = partial(detector["fn"], **settings[detector_name])
+    raw = df.select(col("value").cast("string").alias("value"))
+    keyed = raw.select("value", from_json(col("value"), schema).alias("data")).select(
+        "value", col("data.timestamp").alias("timestamp"), *detector["fields"])
+    scored = keyed.groupBy(*detector["key"]).applyInPandasWithState(
+        fn, OUTPUT_SCHEMA, detector["state"], "append", detector["timeout"])
+    return (
+        scored.select(from_json(col("value"), without_anomaly(schema)).alias("data"), col("anomaly"))
+        .select(col("data.*"), from_json(col("anomaly"), ANOMALY_SCHEMA).alias("anomaly"))
+        .withColumn("enrichments", col("enrichments").withField("anomaly", col("anomaly")))
+        .drop("anomaly")
+    )
+
+def write_detected_batch(batch_df, collection_name, stream):
+    """
+    Writes one detected micro-batch to enriched_events and its anomalies to
+    their collection. Both MongoDB sinks share this one query so the stateful
+    detector runs once per event on the default trigger.
+    """
+    batch_df.persist()
+    try:
+        write_batch(batch_df, "enriched_events", latency_stream=stream)
+        write_batch(batch_df.filter(col("enrichments.anomaly.is_anomaly")), collection_name)
+    finally:
+        batch_df.unpersist()
+
+def process_detected_stream(df, schema, collection_name, detector_name, settings, archive_key=None):
+    """
+    DETECTION_MODE=spark counterpart of process_stream: one checkpointed
+    stateful query per topic, named by `detector_name` in the archive and in
+    latency_stats. The archive runs as its own query on
+    ARCHIVE_TRIGGER_INTERVAL, with its own copy of the detector state, so the
+    MongoDB sinks keep their latency while Parquet files stay large.
+    """
+    query_name = DETECTORS[detector_name]["query"]
+    query = (
+        detect_stream(df, schema, detector_name, settings).writeStream
+        .queryName(query_name)
+        # A stable location so the detector state survives restarts
+        .option("checkpointLocation", os.path.join(CHECKPOINT_DIR, query_name))
+        .foreachBatch(lambda batch_df, batch_id: write_detected_batch(batch_df, collection_name, detector_name))
+        .start()
+    )
+    queries = [query]
+    if ARCHIVE_PATH and archive_key:
+        queries.append(archive_stream(detect_stream(df, schema, detector_name, settings),
+                                      detector_name, archive_key, f"archive_{query_name}"))
+    return queries
+
+def process_stream(df, schema, collection_name, stream, archive_key=None):
+    """
+    General function to process a Kafka stream and write to MongoDB (and the
+    Parquet archive). `stream` names it in the archive and in latency_stats.
+    """
     # Deserialize JSON from Kafka
-    parsed_df = df.select(from_json(col("value").cast("string"), schema).alias("data")).select("data.*")
+    parsed_df = parse_events(df, schema)
 
     # Write raw enriched data to a general collection
     query = (
         parsed_df.writeStream
-        .foreachBatch(lambda batch_df, batch_id: batch_df.write.format("mongo").mode("append").option("collection", "enriched_events").save())
+        .foreachBatch(lambda batch_df, batch_id: write_batch(batch_df, "enriched_events", latency_stream=stream))
         .start()
     )
 
     # Filter for anomalies and write to a specific anomaly collection
-    anomaly_df = parsed_df.filter(col("enrichments.anomaly.is_anomaly") == "true")
+    anomaly_df = parsed_df.filter(col("enrichments.anomaly.is_anomaly"))
     anomaly_query = (
         anomaly_df.writeStream
-        .foreachBatch(lambda batch_df, batch_id: batch_df.write.format("mongo").mode("append").option("collection", collection_name).save())
+        .foreachBatch(lambda batch_df, batch_id: write_batch(batch_df, collection_name))
         .start()
     )
     
-    return [query, anomaly_query]
+    queries = [query, anomaly_query]
+    if ARCHIVE_PATH and archive_key:
+        queries.append(archive_stream(parsed_df, stream, archive_key))
+    return queries
+
+def process_snapshots(df, schema, collection_name, archive_name=None, archive_key=None):
+    """Writes periodic snapshot streams (e.g. order book top-N) straight to their own collection."""
+    parsed_df = df.select(from_json(col("value").cast("string"), schema).alias("data")).select("data.*")
+    queries = [
+        parsed_df.writeStream
+        .foreachBatch(lambda batch_df, batch_id: write_batch(batch_df, collection_name))
+        .start()
+    ]
+    if ARCHIVE_PATH and archive_name:
+        queries.append(archive_stream(parsed_df, archive_name, archive_key))
+    return queries
 
 def main():
     spark = create_spark_session()
     spark.sparkContext.setLogLevel("WARN")
+    # Ship helper modules used inside executor-side functions
+    spark.sparkContext.addPyFile(os.path.join(JOBS_DIR, "latency.py"))
+    spark.sparkContext.addPyFile(os.path.join(JOBS_DIR, "detection.py"))
 
     print("Starting Spark Streaming Processor...")
 
@@ -92,12 +426,28 @@ def main():
         .load()
     )
 
+    depth_df = (
+        spark.readStream
+        .format("kafka")
+        .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP_SERVERS)
+        .option("subscribe", DEPTH_TOPIC)
+        .load()
+    )
+
     # --- Process Streams ---
-    chat_queries = process_stream(chat_df, CHAT_SCHEMA, "chat_anomalies")
-    market_queries = process_stream(market_df, MARKET_SCHEMA, "market_anomalies")
+    if DETECTION_MODE == "spark":
+        print("Anomaly detection runs in Spark (keyed stateful operators).")
+        # Read once on the driver; executors get the values bound into the state functions
+        settings = detection_settings()
+        chat_queries = process_detected_stream(chat_df, CHAT_SCHEMA, "chat_anomalies", "chat", settings, "payload.channel")
+        market_queries = process_detected_stream(market_df, MARKET_SCHEMA, "market_anomalies", "market", settings, "payload.symbol")
+    else:
+        chat_queries = process_stream(chat_df, CHAT_SCHEMA, "chat_anomalies", "chat", "payload.channel")
+        market_queries = process_stream(market_df, MARKET_SCHEMA, "market_anomalies", "market", "payload.symbol")
+    depth_queries = process_snapshots(depth_df, DEPTH_SCHEMA, "order_book_snapshots", "depth", "payload.symbol")
 
     # Await termination for all queries
-    for q in chat_queries + market_queries:
+    for q in chat_queries + market_queries + depth_queries:
         q.awaitTermination()
 
 if __name__ == "__main__":
@@ -2,7 +2,10 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.mongo_client import get_chat_data, get_chat_anomalies, get_db_stats
+from utils.mongo_client import (
+    get_chat_data, get_chat_anomalies, get_db_stats,
+    get_sketch_channels, get_chat_heavy_hitters, get_chat_user_stats, get_distinct_count,
+)
 
 def display_chat_dashboard():
     st.header("Twitch Chat Analytics")
@@ -25,13 +28,16 @@ def display_chat_dashboard():
     df_chat['toxic_score'] = df_chat['enrichments'].apply(lambda x: x.get('toxicity', {}).get('toxic', 0.0))
     df_chat['severe_toxic'] = df_chat['enrichments'].apply(lambda x: x.get('toxicity', {}).get('severe_toxic', 0.0))
     df_chat['insult'] = df_chat['enrichments'].apply(lambda x: x.get('toxicity', {}).get('insult', 0.0))
+    df_chat['scored'] = df_chat['enrichments'].apply(lambda x: x.get('toxicity_status') != 'unscored')
+    scored = df_chat[df_chat['scored']]
     
     # --- Stats Row ---
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total Messages (DB)", stats.get('chat_messages', 0))
     col2.metric("Chat Anomalies", stats.get('chat_anomalies', 0))
-    col3.metric("Avg Toxicity (Batch)", f"{df_chat['toxic_score'].mean():.4f}")
-    col4.metric("Max Toxicity (Batch)", f"{df_chat['toxic_score'].max():.4f}")
+    # Messages published while the model was warming up carry no scores
+    col3.metric("Avg Toxicity (Batch)", f"{scored['toxic_score'].mean():.4f}" if len(scored) else "n/a")
+    col4.metric("Max Toxicity (Batch)", f"{scored['toxic_score'].max():.4f}" if len(scored) else "n/a")
     
     st.divider()
     
@@ -46,7 +52,7 @@ def display_chat_dashboard():
             text = row['text']
             toxic_score = row['toxic_score']
             
-            score_label = f" (Toxic: {toxic_score:.2f})"
+            score_label = f" (Toxic: {toxic_score:.2f})" if row['scored'] else " (unscored)"
             
             if toxic_score > 0.8:
                 st.markdown(f"**{author}**: {text} <span style='color: #ff4b4b; font-size: 0.8em;'>{score_label}</span>", unsafe_allow_html=True)
@@ -71,27 +77,58 @@ def display_chat_dashboard():
     
     # --- Charts ---
     st.subheader("Scalable Analytics")
-    
+    display_heavy_hitters()
+
+
+SKETCH_WINDOWS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "Last 30 days": 30 * 86400}
+
+def display_heavy_hitters():
+    """Top chatters and toxic users over full history windows, from the ingestion service's sketches."""
+    channels = get_sketch_channels()
+    if not channels:
+        st.info("Heavy-hitter sketches appear after the first snapshot from the ingestion service.")
+        return
+
+    sel_col1, sel_col2 = st.columns(2)
+    channel = sel_col1.selectbox("Channel", channels)
+    window_label = sel_col2.selectbox("Window", list(SKETCH_WINDOWS), index=1)
+    seconds = SKETCH_WINDOWS[window_label]
+    hitters = get_chat_heavy_hitters(channel, seconds)
+    if not hitters:
+        st.info(f"No chat sketches for {channel} in this window yet.")
+        return
+
     chart_col1, chart_col2 = st.columns(2)
     
     with chart_col1:
-        # Top Toxic Users (Limited to Top 10)
+        # Top Toxic Users by summed toxicity (Space-Saving estimates)
         st.write("**Top 10 Most Toxic Users**")
-        top_users = df_chat.groupby('author')['toxic_score'].mean().nlargest(10).reset_index()
-        fig = px.bar(top_users, x='author', y='toxic_score', 
-                     color='toxic_score', color_continuous_scale='Reds',
-                     labels={'toxic_score': 'Avg Toxicity', 'author': 'User'})
+        top_users = pd.DataFrame(hitters["top_toxic"], columns=['author', 'toxicity', 'error'])
+        fig = px.bar(top_users, x='author', y='toxicity', error_y='error',
+                     color='toxicity', color_continuous_scale='Reds',
+                     labels={'toxicity': 'Summed Toxicity', 'author': 'User'})
         st.plotly_chart(fig, use_container_width=True)
     
     with chart_col2:
         # Message Count by User (Top 5 + Other)
         st.write("**Activity Distribution (Top 5 vs Others)**")
-        msg_counts = df_chat['author'].value_counts()
-        top_5 = msg_counts.head(5)
-        others = pd.Series({'Other Users': msg_counts.iloc[5:].sum()}) if len(msg_counts) > 5 else pd.Series()
-        final_counts = pd.concat([top_5, others]).reset_index()
-        final_counts.columns = ['User', 'Messages']
+        top_5 = pd.DataFrame(hitters["top_chatters"][:5], columns=['User', 'Messages', 'error'])[['User', 'Messages']]
+        others = max(hitters["messages"] - top_5['Messages'].sum(), 0)
+        final_counts = pd.concat([top_5, pd.DataFrame([{'User': 'Other Users', 'Messages': others}])])
         
         fig3 = px.pie(final_counts, values='Messages', names='User', hole=0.4,
                      color_discrete_sequence=px.colors.sequential.RdBu)
         st.plotly_chart(fig3, use_container_width=True)
+
+    unique = get_distinct_count("chatters", channel, seconds)
+    unique_label = f", ~{unique[0]:,.0f} unique chatters (±{unique[1]:.1%})" if unique else ""
+    st.caption(f"{hitters['messages']:,} messages in window{unique_label}. Counts are Space-Saving estimates; "
+               "error bars show the maximum overestimate.")
+
+    user = st.text_input("Look up a user")
+    if user:
+        stats = get_chat_user_stats(channel, user, seconds)
+        avg = stats["toxicity_total"] / stats["messages"] if stats["messages"] else 0.0
+        col1, col2 = st.columns(2)
+        col1.metric("Messages (Count-Min estimate)", f"{stats['messages']:,.0f}")
+        col2.metric("Avg Toxicity", f"{avg:.3f}")
@@ -1,47 +1,28 @@
+import os
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from utils.mongo_client import get_market_data, get_market_anomalies
+from utils.mongo_client import (
+    get_market_data, get_market_anomalies, get_distinct_count, get_market_symbols, get_price_series,
+)
+
+PRICE_RANGES = {
+    "Last 15 minutes": 900, "Last hour": 3600, "Last 6 hours": 6 * 3600,
+    "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "Last 30 days": 30 * 86400,
+}
 
 def display_market_dashboard():
     st.header("Market Analytics")
 
-    market_data = get_market_data(limit=200)
+    market_data = get_market_data(limit=1)
     anomalies = get_market_anomalies(limit=50)
 
     if not market_data:
         st.warning("No market data found in the database yet.")
         return
 
-    df_market = pd.DataFrame(market_data)
-    df_market['timestamp'] = pd.to_datetime(df_market['timestamp'], unit='s')
-    df_market = df_market.sort_values('timestamp')
-
-    # --- Live Price Chart with Anomalies ---
-    fig = go.Figure()
-
-    # Price Line
-    fig.add_trace(go.Scatter(
-        x=df_market['timestamp'],
-        y=df_market['payload'].apply(lambda x: x.get('price')),
-        mode='lines',
-        name='Price (BTCUSDT)'
-    ))
-
-    # Anomaly Markers
-    if anomalies:
-        df_anomalies = pd.DataFrame(anomalies)
-        df_anomalies['timestamp'] = pd.to_datetime(df_anomalies['timestamp'], unit='s')
-        fig.add_trace(go.Scatter(
-            x=df_anomalies['timestamp'],
-            y=df_anomalies['payload'].apply(lambda x: x.get('price')),
-            mode='markers',
-            marker=dict(color='red', size=10, symbol='x'),
-            name='Anomaly Detected'
-        ))
-
-    fig.update_layout(title="Real-Time Market Price Feed", xaxis_title="Time", yaxis_title="Price (USD)")
-    st.plotly_chart(fig, use_container_width=True)
+    # --- Price Chart over a selectable range, with anomalies ---
+    display_price_chart(market_data[0].get('payload', {}).get('symbol'))
 
     # --- Metrics and Z-score Analytics ---
     st.subheader("Market Statistics & Z-Score")
@@ -50,49 +31,168 @@ def display_market_dashboard():
     latest_z = 0.0
     latest_mean = 0.0
     latest_std = 0.0
+    latest_anomaly = {}
     
     # Try to find the latest anomaly or detail from recent data
     if anomalies:
         latest = anomalies[0]
-        latest_z = float(latest['enrichments']['anomaly'].get('z_score', 0.0))
-        latest_mean = float(latest['enrichments']['anomaly'].get('mean', 0.0))
-        latest_std = float(latest['enrichments']['anomaly'].get('std', 0.0))
+        latest_anomaly = latest['enrichments']['anomaly']
+        latest_z = latest_anomaly.get('z_score') or 0.0
+        latest_mean = latest_anomaly.get('mean') or 0.0
+        latest_std = latest_anomaly.get('std') or 0.0
+
+    # Unique symbols traded in the last 24 hours (HyperLogLog estimate)
+    symbols = get_distinct_count("symbols", "market", 86400)
 
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     col1.metric("Current Z-Score", f"{latest_z:.2f}", delta=f"{latest_z:.2f}", delta_color="inverse")
-    col2.metric("Rolling Mean", f"${latest_mean:,.2f}")
-    col3.metric("Rolling StdDev", f"{latest_std:.2f}")
+    if latest_anomaly.get('mad') is not None:
+        # Quantile detector: robust statistics of log returns (in basis points)
+        col2.metric("Median Return", f"{latest_anomaly.get('median', 0.0) * 1e4:.2f} bp")
+        col3.metric("Return MAD", f"{latest_anomaly['mad'] * 1e4:.2f} bp")
+    else:
+        col2.metric("Rolling Mean", f"${latest_mean:,.2f}")
+        col3.metric("Rolling StdDev", f"{latest_std:.2f}")
+    col4.metric("Symbols Traded (24h)", f"~{symbols[0]:,.0f}" if symbols else "n/a")
+
+    # --- Technical Indicators (latest trade) ---
+    display_indicators(market_data[0].get('enrichments', {}).get('indicators') or {})
 
-    # --- Z-Score History Chart ---
+    # --- Score History Chart ---
     if anomalies:
-        df_anom = pd.DataFrame(anomalies)
-        df_anom['timestamp'] = pd.to_datetime(df_anom['timestamp'], unit='s')
-        df_anom['z_score'] = df_anom['enrichments'].apply(lambda x: float(x.get('anomaly', {}).get('z_score', 0.0)))
-        
-        fig_z = go.Figure()
-        fig_z.add_trace(go.Scatter(
-            x=df_anom['timestamp'],
-            y=df_anom['z_score'],
-            mode='lines+markers',
-            name='Z-Score',
-            line=dict(color='orange')
-        ))
-        # Add threshold lines
-        fig_z.add_hline(y=3.0, line_dash="dash", line_color="red", annotation_text="Upper Threshold")
-        fig_z.add_hline(y=-3.0, line_dash="dash", line_color="red", annotation_text="Lower Threshold")
-        
-        fig_z.update_layout(title="Z-Score History (Price Volatility)", xaxis_title="Time", yaxis_title="Z-Score")
-        st.plotly_chart(fig_z, use_container_width=True)
+        display_score_history(anomalies)
 
     # --- Anomaly Feed ---
     st.subheader("Recent Market Anomaly Alerts")
     if anomalies:
         for anomaly in anomalies[:10]:
             anom_info = anomaly['enrichments']['anomaly']
-            anomaly_type = anom_info.get('type', 'N/A').replace('_', ' ').title()
+            anomaly_type = (anom_info.get('type') or 'N/A').replace('_', ' ').title()
             price = anomaly['payload']['price']
-            z_val = float(anom_info.get('z_score', 0.0))
-            
-            st.error(f"**{anomaly_type}**: Price **${price:,.2f}** (Z-Score: **{z_val:.2f}**)")
+            z_val = anom_info.get('z_score') or 0.0
+            score_label = "Robust Score" if anom_info.get('mad') is not None else "Z-Score"
+
+            st.error(f"**{anomaly_type}**: Price **${price:,.2f}** ({score_label}: **{z_val:.2f}**)")
     else:
         st.info("No recent anomalies detected.")
+
+
+def _score_threshold(anomaly):
+    """Threshold the score was compared against; results stored before it was recorded use the configured one."""
+    if anomaly.get('threshold') is not None:
+        return anomaly['threshold']
+    if anomaly.get('mad') is not None:
+        return float(os.getenv("QUANTILE_MAD_THRESHOLD", "8.0"))
+    return float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+
+def display_score_history(anomalies):
+    """
+    Score of each recent anomaly per symbol against its own threshold: the
+    price z-score for the z-score detector, the robust (MAD) score of log
+    returns for the quantile detector. Results without a score are skipped.
+    """
+    rows = []
+    for doc in anomalies:
+        anomaly = doc.get('enrichments', {}).get('anomaly', {})
+        if anomaly.get('z_score') is None:
+            continue
+        rows.append({
+            'timestamp': doc['timestamp'],
+            'symbol': doc.get('payload', {}).get('symbol'),
+            'score': anomaly['z_score'],
+            'robust': anomaly.get('mad') is not None,
+            'threshold': _score_threshold(anomaly),
+        })
+    if not rows:
+        return
+
+    df_anom = pd.DataFrame(rows)
+    df_anom['timestamp'] = pd.to_datetime(df_anom['timestamp'], unit='s')
+    fig_z = go.Figure()
+    for (symbol, robust), group in df_anom.groupby(['symbol', 'robust'], dropna=False):
+        fig_z.add_trace(go.Scatter(
+            x=group['timestamp'],
+            y=group['score'],
+            mode='lines+markers',
+            name=f"{symbol} {'Robust Score' if robust else 'Z-Score'}",
+        ))
+    # One pair of threshold lines per distinct threshold in view
+    for threshold in sorted(df_anom['threshold'].unique()):
+        fig_z.add_hline(y=threshold, line_dash="dash", line_color="red", annotation_text=f"+{threshold:g}")
+        fig_z.add_hline(y=-threshold, line_dash="dash", line_color="red", annotation_text=f"-{threshold:g}")
+
+    fig_z.update_layout(title="Anomaly Score History", xaxis_title="Time", yaxis_title="Score")
+    st.plotly_chart(fig_z, use_container_width=True)
+
+
+def _bar_label(seconds):
+    if seconds % 86400 == 0:
+        return f"{seconds // 86400}d"
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    return f"{seconds // 60}m"
+
+def display_price_chart(default_symbol):
+    """
+    Price over the selected range, downsampled server-side to a fixed point
+    budget (CHART_POINT_BUDGET) so the chart payload does not grow with the range.
+    """
+    symbols = get_market_symbols() or [default_symbol]
+    sel_col1, sel_col2 = st.columns(2)
+    symbol = sel_col1.selectbox("Symbol", symbols, index=symbols.index(default_symbol) if default_symbol in symbols else 0)
+    range_label = sel_col2.selectbox("Range", list(PRICE_RANGES), index=1)
+    series = get_price_series(
+        symbol, PRICE_RANGES[range_label],
+        points=int(os.getenv("CHART_POINT_BUDGET", "1000")),
+        raw_max_seconds=float(os.getenv("CHART_RAW_MAX_SECONDS", "3600")),
+        max_markers=int(os.getenv("CHART_MAX_MARKERS", "100")),
+    )
+    if not series["timestamp"]:
+        st.info(f"No trades for {symbol} in this range.")
+        return
+
+    times = pd.to_datetime(series["timestamp"], unit='s')
+    fig = go.Figure()
+
+    # Low-high envelope of each rollup bar keeps the extremes visible
+    if series["low"] is not None:
+        fig.add_trace(go.Scatter(x=times, y=series["high"], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=times, y=series["low"], mode='lines', line=dict(width=0),
+                                 fill='tonexty', fillcolor='rgba(99, 110, 250, 0.2)', name='Low–High'))
+
+    # Price Line
+    fig.add_trace(go.Scatter(x=times, y=series["price"], mode='lines', name=f'Price ({symbol})'))
+
+    # Anomaly Markers
+    if series["markers"]:
+        df_markers = pd.DataFrame(series["markers"])
+        fig.add_trace(go.Scatter(
+            x=pd.to_datetime(df_markers['timestamp'], unit='s'),
+            y=df_markers['price'],
+            mode='markers',
+            marker=dict(color='red', size=10, symbol='x'),
+            name='Anomaly Detected'
+        ))
+
+    fig.update_layout(title=f"Market Price ({range_label})", xaxis_title="Time", yaxis_title="Price (USD)")
+    st.plotly_chart(fig, use_container_width=True)
+    resolution = "raw ticks" if series["resolution"] == "raw" else f"{_bar_label(series['resolution'])} bars"
+    st.caption(f"{len(series['timestamp']):,} points from {series['source_points']:,} {resolution}")
+
+
+def display_indicators(indicators):
+    st.subheader("Technical Indicators")
+    if not indicators:
+        st.info("Indicators appear once enough trades have been seen for their look-back periods.")
+        return
+
+    def fmt(key, pattern="{:,.2f}"):
+        value = indicators.get(key)
+        return pattern.format(value) if value is not None else "warming up"
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("RSI (14)", fmt('rsi', "{:.1f}"))
+    col2.metric("MACD (12/26/9)", fmt('macd', "{:.3f}"), delta=fmt('macd_hist', "{:.3f}"))
+    col3.metric("Bollinger (20, 2σ)", f"{fmt('bb_lower')} – {fmt('bb_upper')}")
+    col4.metric("VWAP (100 trades)", fmt('vwap', "${:,.2f}"))
@@ -1,5 +1,7 @@
+import time
 import streamlit as st
-from utils.mongo_client import get_db_stats
+import pandas as pd
+from utils.mongo_client import get_db_stats, get_latency_stats
 
 def display_platform_dashboard():
     st.header("Platform Status")
@@ -16,9 +18,48 @@ def display_platform_dashboard():
     
     st.info("This dashboard provides a high-level overview of the data flowing through the system. Metrics are based on document counts in MongoDB collections and update every few seconds.")
 
+    display_latency_stats()
+
     st.subheader("Next Steps")
     st.markdown("""
     - **Kafka UI**: [http://localhost:8080](http://localhost:8080) to inspect Kafka topics and consumer groups.
     - **Mongo Express**: [http://localhost:8081](http://localhost:8081) to browse the MongoDB collections directly.
     - **Spark UI**: [http://localhost:8082](http://localhost:8082) to monitor the Spark jobs and cluster status.
-    """)
\ No newline at end of file
+    """)
+
+def display_latency_stats():
+    st.subheader("Pipeline Latency")
+
+    latency_stats = get_latency_stats()
+    if not latency_stats:
+        st.info("No latency snapshots yet. The ingestion service and Spark job publish them every few seconds.")
+        return
+
+    df = pd.DataFrame(latency_stats)
+    now = time.time()
+
+    if 'stream' not in df:
+        df['stream'] = None
+    # Ingestion snapshots cover every adapter; Spark publishes one per stream
+    df['stream'] = df['stream'].fillna('all')
+
+    # Headline: end-to-end staleness from the source to MongoDB, for the slowest stream
+    end_to_end = df[(df['service'] == 'spark') & (df['pair'] == 'source->written')]
+    col1, col2, col3 = st.columns(3)
+    if not end_to_end.empty:
+        row = end_to_end.loc[end_to_end['p99_ms'].idxmax()]
+        col1.metric(f"End-to-End p50 ({row['stream']})", f"{row['p50_ms']:,.0f} ms")
+        col2.metric(f"End-to-End p99 ({row['stream']})", f"{row['p99_ms']:,.0f} ms")
+        col3.metric(f"End-to-End Max ({row['stream']})", f"{row['max_ms']:,.0f} ms")
+
+    df['age_s'] = (now - df['updated_at']).round(1)
+    columns = ['service', 'stream', 'pair', 'count', 'p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'max_ms', 'window_seconds', 'age_s']
+    st.dataframe(
+        df[columns].rename(columns={
+            'service': 'Service', 'stream': 'Stream', 'pair': 'Stage Pair', 'count': 'Samples',
+            'p50_ms': 'p50 (ms)', 'p90_ms': 'p90 (ms)', 'p99_ms': 'p99 (ms)', 'p999_ms': 'p99.9 (ms)',
+            'max_ms': 'Max (ms)', 'window_seconds': 'Window (s)', 'age_s': 'Updated (s ago)',
+        }),
+        hide_index=True,
+        use_container_width=True,
+    )
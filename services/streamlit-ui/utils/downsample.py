@@ -0,0 +1,46 @@
+"""
+Server-side downsampling for dashboard charts. Largest-Triangle-Three-Buckets
+(LTTB, Steinarsson 2013) picks, per bucket, the point spanning the largest
+triangle with its neighbours, so spikes and troughs survive where striding or
+averaging would flatten them. Charts then ship a fixed number of points to
+the browser whatever time range they cover.
+"""
+import numpy as np
+
+
+def lttb(x, y, threshold: int, keep=None) -> np.ndarray:
+    """
+    Returns the sorted indices of at most `threshold` points of the series
+    (x ascending). The global minimum and maximum and every index in `keep`
+    (e.g. anomalous ticks) are always included; they come out of the same
+    budget, so `keep` should be well below `threshold`.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= threshold:
+        return np.arange(n)
+
+    forced = np.unique(np.concatenate((
+        np.asarray(keep if keep is not None else [], dtype=np.int64),
+        [np.argmin(y), np.argmax(y)],
+    )))
+    budget = max(threshold - len(forced), 3)
+
+    # First and last points are fixed; the rest is split into budget - 2 buckets
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        # Third vertex: average of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_start = end if i + 2 < len(edges) else n - 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = selected[i + 1] = start + int(np.argmax(area))
+    return np.union1d(selected, forced)
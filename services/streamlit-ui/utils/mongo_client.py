@@ -1,5 +1,9 @@
 import os
+import time
+import numpy as np
 from pymongo import MongoClient
+from utils.downsample import lttb
+from utils.sketches import cover, merge_top_k, top_n, cms_estimate, hll_estimate
 
 class MongoSingleton:
     _instance = None
@@ -20,23 +24,260 @@ def get_db():
     db_name = os.getenv("MONGO_DATABASE", "DataFlowDB")
     return client[db_name]
 
+# --- Anomaly Schema ---
+
+ANOMALY_NUMERIC_FIELDS = ("severity", "mean", "std", "z_score")
+
+def upgrade_anomaly(anomaly):
+    """
+    Returns the typed (schema version 2) form of a stored anomaly. Version 1
+    documents kept every value as a string ("true", "3.1415"); they are
+    converted here so the dashboards never parse strings themselves.
+    """
+    if not anomaly or anomaly.get("schema_version", 1) >= 2:
+        return anomaly
+    upgraded = dict(anomaly)
+    flag = anomaly.get("is_anomaly", anomaly.get("isAnomaly", False))
+    upgraded["is_anomaly"] = flag is True or flag in ("true", "True")
+    for field in ANOMALY_NUMERIC_FIELDS:
+        value = upgraded.get(field)
+        if isinstance(value, str):
+            try:
+                upgraded[field] = float(value)
+            except ValueError:
+                upgraded[field] = None
+    upgraded["schema_version"] = 1
+    return upgraded
+
+def _with_typed_anomalies(docs):
+    """Materializes a cursor into a list (so callers can test and index it) with typed anomalies."""
+    docs = list(docs)
+    for doc in docs:
+        enrichments = doc.get("enrichments")
+        if enrichments and enrichments.get("anomaly"):
+            enrichments["anomaly"] = upgrade_anomaly(enrichments["anomaly"])
+    return docs
+
 # --- Data Fetching Functions ---
 
 def get_chat_data(limit=100):
     db = get_db()
-    return list(db.enriched_events.find({"source": "twitch_chat"}).sort("_id", -1).limit(limit))
+    return _with_typed_anomalies(db.enriched_events.find({"source": "twitch_chat"}).sort("_id", -1).limit(limit))
 
 def get_market_data(limit=200):
     db = get_db()
-    return list(db.enriched_events.find({"source": "market_data"}).sort("_id", -1).limit(limit))
+    return _with_typed_anomalies(db.enriched_events.find({"source": "market_data"}).sort("_id", -1).limit(limit))
 
 def get_chat_anomalies(limit=50):
     db = get_db()
-    return list(db.chat_anomalies.find().sort("_id", -1).limit(limit))
+    return _with_typed_anomalies(db.chat_anomalies.find().sort("_id", -1).limit(limit))
+
+def get_market_anomalies(limit=50, min_severity=None):
+    """Latest market anomalies; min_severity is a numeric range query (typed documents only)."""
+    db = get_db()
+    query = {} if min_severity is None else {"enrichments.anomaly.severity": {"$gte": min_severity}}
+    return _with_typed_anomalies(db.market_anomalies.find(query).sort("_id", -1).limit(limit))
+
+def get_latency_stats():
+    """Latency snapshots; Spark publishes one per stream (documents from before that carry no stream and are skipped)."""
+    db = get_db()
+    query = {"$or": [{"service": {"$ne": "spark"}}, {"stream": {"$exists": True}}]}
+    return list(db.latency_stats.find(query).sort([("service", 1), ("stream", 1), ("pair", 1)]))
+
+def get_sketch_channels():
+    db = get_db()
+    return sorted(db.chat_sketches.distinct("channel", {"granularity": "day"}))
+
+def _window_docs(collection, match, buckets, projection=None):
+    """All partial snapshots (one per ingestion process) matching `match` in the given (granularity, start) buckets."""
+    if not buckets:
+        return []
+    by_granularity = {}
+    for granularity, start in buckets:
+        by_granularity.setdefault(granularity, []).append(start)
+    query = dict(match, **{"$or": [
+        {"granularity": granularity, "start": {"$in": starts}} for granularity, starts in by_granularity.items()
+    ]})
+    return list(collection.find(query, projection))
+
+def _sketch_docs(channel, buckets, projection=None):
+    return _window_docs(get_db().chat_sketches, {"channel": channel}, buckets, projection)
+
+def get_chat_heavy_hitters(channel, seconds, n=10, now=None):
+    """
+    Top chatters and top toxic users for a channel over the last `seconds`,
+    merged from aligned day/hour/minute sketch snapshots.
+    """
+    end = time.time() if now is None else now
+    docs = _sketch_docs(channel, cover(end - seconds, end),
+                        {"top_chatters": 1, "top_toxic": 1, "messages": 1, "toxicity_total": 1, "capacity": 1})
+    if not docs:
+        return None
+    capacity = max(doc.get("capacity", 0) for doc in docs)
+    return {
+        "messages": sum(doc["messages"] for doc in docs),
+        "toxicity_total": sum(doc["toxicity_total"] for doc in docs),
+        "top_chatters": top_n(merge_top_k([doc["top_chatters"] for doc in docs], capacity), n),
+        "top_toxic": top_n(merge_top_k([doc["top_toxic"] for doc in docs], capacity), n),
+    }
+
+def get_chat_user_stats(channel, user, seconds, now=None):
+    """Count-Min estimates of one user's messages and toxicity sum (hour resolution)."""
+    end = time.time() if now is None else now
+    docs = _sketch_docs(channel, cover(end - seconds, end, finest="hour"))
+    return {
+        "messages": cms_estimate(docs, "counts", user),
+        "toxicity_total": cms_estimate(docs, "toxicity", user),
+    }
+
+def get_distinct_count(metric, scope, seconds, now=None):
+    """
+    Approximate distinct count (e.g. chatters in a channel, symbols traded)
+    over the last `seconds`, merged from HyperLogLog window snapshots.
+    Returns (estimate, relative standard error) or None.
+    """
+    end = time.time() if now is None else now
+    docs = _window_docs(get_db().distinct_counts, {"metric": metric, "scope": scope}, cover(end - seconds, end),
+                        {"registers": 1, "precision": 1})
+    return hll_estimate(docs)
+
+# --- Market Price Series (time-range charts) ---
+
+# Candidate rollup widths; the finest one that fits the point budget is used
+ROLLUP_BAR_SECONDS = (60, 300, 900, 3600, 4 * 3600, 86400)
+
+def _is_anomaly_flag(flag):
+    return flag is True or flag in ("true", "True")
+
+def get_market_symbols():
+    """Symbols with recent raw trades or compacted bars."""
+    db = get_db()
+    recent = db.enriched_events.find({"source": "market_data"}, {"payload.symbol": 1}).sort("_id", -1).limit(500)
+    symbols = {doc.get("payload", {}).get("symbol") for doc in recent}
+    symbols.update(db.market_ohlcv.distinct("symbol"))
+    return sorted(symbol for symbol in symbols if symbol)
+
+def get_raw_market_start():
+    """
+    Start of the raw tick history: older trades only exist as market_ohlcv
+    bars (services/ingestion/jobs/compaction.py). A chunk whose bars are
+    written but whose raw ticks are still being deleted counts as compacted.
+    """
+    state = get_db().compaction_state.find_one({"_id": "market_data"})
+    if not state:
+        return 0.0
+    pending = state.get("pending") or {}
+    if pending.get("phase") == "aggregated":
+        return max(state["compacted_until"], pending["end"])
+    return state["compacted_until"]
+
+def rollup_seconds(seconds, points):
+    for bar_seconds in ROLLUP_BAR_SECONDS:
+        if seconds / bar_seconds <= points:
+            return bar_seconds
+    return ROLLUP_BAR_SECONDS[-1]
+
+def _raw_price_series(symbol, start, end, points, max_markers, raw_limit):
+    """Raw ticks downsampled with LTTB; None when the range holds more than raw_limit ticks."""
+    cursor = get_db().enriched_events.find(
+        {"source": "market_data", "payload.symbol": symbol, "timestamp": {"$gte": start, "$lt": end}},
+        {"_id": 0, "timestamp": 1, "payload.price": 1, "enrichments.anomaly.is_anomaly": 1,
+         "enrichments.anomaly.type": 1, "enrichments.anomaly.severity": 1, "enrichments.anomaly.z_score": 1},
+    ).sort("timestamp", 1).limit(raw_limit + 1)
+    docs = list(cursor)
+    if len(docs) > raw_limit:
+        return None
+
+    timestamps = np.array([doc["timestamp"] for doc in docs], dtype=float)
+    prices = np.array([doc["payload"]["price"] for doc in docs], dtype=float)
+    anomalous = [i for i, doc in enumerate(docs)
+                 if _is_anomaly_flag(doc.get("enrichments", {}).get("anomaly", {}).get("is_anomaly"))]
+    anomalies = [upgrade_anomaly(docs[i]["enrichments"]["anomaly"]) for i in anomalous]
+    if len(anomalous) > max_markers:
+        ranked = sorted(range(len(anomalous)), key=lambda k: anomalies[k].get("severity") or 0.0, reverse=True)
+        chosen = sorted(ranked[:max_markers])
+        anomalous, anomalies = [anomalous[k] for k in chosen], [anomalies[k] for k in chosen]
 
-def get_market_anomalies(limit=50):
+    selected = lttb(timestamps, prices, points, keep=anomalous)
+    return {
+        "resolution": "raw",
+        "source_points": len(docs),
+        "timestamp": timestamps[selected].tolist(),
+        "price": prices[selected].tolist(),
+        "low": None,
+        "high": None,
+        "markers": [{"timestamp": float(timestamps[i]), "price": float(prices[i]), **anomaly}
+                    for i, anomaly in zip(anomalous, anomalies)],
+    }
+
+def _rollup_price_series(symbol, start, end, bar_seconds, raw_start, max_markers):
+    """
+    OHLC bars of `bar_seconds`, regrouped server-side from market_ohlcv for the
+    compacted part of the range and from raw ticks for the rest.
+    """
+    def bucket(field):
+        return {"$subtract": [field, {"$mod": [field, bar_seconds]}]}
+
+    raw_pipeline = [
+        {"$match": {"source": "market_data", "payload.symbol": symbol,
+                    "timestamp": {"$gte": max(start, raw_start), "$lt": end}}},
+        {"$project": {"timestamp": 1, "open": "$payload.price", "high": "$payload.price",
+                      "low": "$payload.price", "close": "$payload.price"}},
+    ]
+    pipeline = [
+        {"$match": {"symbol": symbol, "timestamp": {"$gte": start - start % bar_seconds, "$lt": min(end, raw_start)}}},
+        {"$project": {"timestamp": 1, "open": 1, "high": 1, "low": 1, "close": 1}},
+        {"$unionWith": {"coll": "enriched_events", "pipeline": raw_pipeline}},
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": bucket("$timestamp"),
+            "open": {"$first": "$open"},
+            "high": {"$max": "$high"},
+            "low": {"$min": "$low"},
+            "close": {"$last": "$close"},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
     db = get_db()
-    return list(db.market_anomalies.find().sort("_id", -1).limit(limit))
+    bars = list(db.market_ohlcv.aggregate(pipeline, allowDiskUse=True))
+
+    # Rollups only count anomalies; markers come from the anomaly collection, most severe first
+    anomalies = _with_typed_anomalies(db.market_anomalies.find(
+        {"payload.symbol": symbol, "timestamp": {"$gte": start, "$lt": end}},
+        {"timestamp": 1, "payload.price": 1, "enrichments.anomaly": 1},
+    ).sort("enrichments.anomaly.severity", -1).limit(max_markers))
+    return {
+        "resolution": bar_seconds,
+        "source_points": sum(bar["count"] for bar in bars),
+        "timestamp": [bar["_id"] for bar in bars],
+        "price": [bar["close"] for bar in bars],
+        "low": [bar["low"] for bar in bars],
+        "high": [bar["high"] for bar in bars],
+        "markers": sorted(({"timestamp": doc["timestamp"], "price": doc["payload"]["price"],
+                            **doc["enrichments"]["anomaly"]} for doc in anomalies),
+                          key=lambda marker: marker["timestamp"]),
+    }
+
+def get_price_series(symbol, seconds, points=1000, raw_max_seconds=3600, max_markers=100,
+                     raw_limit=200000, now=None):
+    """
+    Price series of one symbol over the last `seconds`, at most `points`
+    points (plus up to `max_markers` anomaly markers) whatever the span.
+
+    Spans up to `raw_max_seconds` whose ticks are still raw are read raw and
+    LTTB-downsampled, always keeping anomalous ticks and the extremes. Longer
+    spans, compacted history or more than `raw_limit` ticks use OHLC rollups
+    at the finest bar width that fits the budget, with a low/high envelope.
+    """
+    end = time.time() if now is None else now
+    start = end - seconds
+    raw_start = get_raw_market_start()
+    if seconds <= raw_max_seconds and start >= raw_start:
+        series = _raw_price_series(symbol, start, end, points, max_markers, raw_limit)
+        if series is not None:
+            return series
+    return _rollup_price_series(symbol, start, end, rollup_seconds(seconds, points), raw_start, max_markers)
 
 def get_db_stats():
     db = get_db()
@@ -0,0 +1,134 @@
+"""
+Read side of the chat heavy-hitter sketches and HyperLogLog distinct counts
+written by the ingestion service (services/ingestion/logic/sketches). Snapshots for aligned day/hour/minute
+buckets are merged, so a top-k over any range touches a bounded number of
+documents regardless of how much chat it covers.
+
+The hashing and merge rules must stay identical to the ingestion copies.
+"""
+from hashlib import blake2b
+
+import numpy as np
+
+GRANULARITIES = (("day", 86400), ("hour", 3600), ("minute", 60))
+
+
+def _hash_pair(key: str):
+    digest = blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def merge_top_k(summaries, capacity: int) -> dict:
+    """
+    Merges serialized Space-Saving summaries ([[key, count, error], ...]).
+    A key absent from a full summary is credited with that summary's minimum.
+    Returns {key: (count, error)}.
+    """
+    tables, floors = [], []
+    for entries in summaries:
+        tables.append({key: (count, error) for key, count, error in entries})
+        floors.append(min((count for _, count, _ in entries), default=0.0) if len(entries) >= capacity else 0.0)
+    # Every summary credits every key, including keys first seen in a later summary
+    merged = {}
+    for key in set().union(*tables):
+        count = error = 0.0
+        for table, floor in zip(tables, floors):
+            add_count, add_error = table.get(key, (floor, floor))
+            count += add_count
+            error += add_error
+        merged[key] = (count, error)
+    return merged
+
+
+def top_n(merged: dict, n: int = 10):
+    ranked = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:n]
+    return [(key, count, error) for key, (count, error) in ranked]
+
+
+def cms_estimate(docs, field: str, key: str) -> float:
+    """Sums a key's Count-Min estimate across hour/day snapshots."""
+    total = 0.0
+    h1, h2 = _hash_pair(key)
+    for doc in docs:
+        data = doc.get(field)
+        if data is None:
+            continue
+        width, depth = doc["cms_width"], doc["cms_depth"]
+        table = np.frombuffer(data, dtype="<f8")
+        total += min(table[i * width + (h1 + i * h2) % width] for i in range(depth))
+    return total
+
+
+def estimate_registers(registers: np.ndarray) -> float:
+    """Copy of logic/sketches/hyperloglog.estimate_registers (the UI image cannot import the ingestion package)."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / float(np.ldexp(1.0, -registers.astype(np.int64)).sum())
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * m and zeros:
+        return m * np.log(m / zeros)
+    return raw
+
+
+def fold_registers(registers: np.ndarray, precision: int, target: int) -> np.ndarray:
+    """
+    Reduces HyperLogLog registers to a lower precision, exactly as if the same
+    keys had been added at `target`: the dropped index bits become the leading
+    bits of the rank.
+    """
+    shift = precision - target
+    if shift == 0:
+        return registers
+    low = np.arange(len(registers)) & ((1 << shift) - 1)
+    # Rank from the dropped bits when any is set, else the old rank shifted past them
+    low_rank = shift - np.floor(np.log2(np.maximum(low, 1))).astype(np.int64)
+    ranks = np.where(registers == 0, 0, np.where(low != 0, low_rank, registers.astype(np.int64) + shift))
+    folded = np.zeros(1 << target, dtype=np.int64)
+    np.maximum.at(folded, np.arange(len(registers)) >> shift, ranks)
+    return folded.astype(np.uint8)
+
+
+def hll_estimate(docs):
+    """
+    Distinct count of the union of HyperLogLog snapshots (register-wise max).
+    Snapshots written with different precisions (HLL_PRECISION changed) are
+    folded to the lowest one first. Returns (estimate, standard_error) or
+    None when there is nothing to merge.
+    """
+    by_precision = {}
+    for doc in docs:
+        registers = np.frombuffer(doc["registers"], dtype=np.uint8)
+        precision = doc.get("precision") or len(registers).bit_length() - 1
+        merged = by_precision.get(precision)
+        by_precision[precision] = registers if merged is None else np.maximum(merged, registers)
+    if not by_precision:
+        return None
+    target = min(by_precision)
+    merged = None
+    for precision, registers in by_precision.items():
+        folded = fold_registers(registers, precision, target)
+        merged = folded if merged is None else np.maximum(merged, folded)
+    return float(estimate_registers(merged)), float(1.04 / np.sqrt(len(merged)))
+
+
+def cover(start: float, end: float, finest: str = "minute"):
+    """
+    Splits [start, end) into the fewest aligned buckets: whole days, then
+    whole hours, then minutes at the edges. Returns [(granularity, bucket_start)].
+    """
+    finest_size = dict(GRANULARITIES)[finest]
+    t = start - start % finest_size
+    end = end - end % finest_size + (finest_size if end % finest_size else 0)
+    buckets = []
+    while t < end:
+        for granularity, size in GRANULARITIES:
+            if size < finest_size:
+                continue
+            if t % size == 0 and t + size <= end:
+                buckets.append((granularity, t))
+                t += size
+                break
+        else:
+            buckets.append((finest, t))
+            t += finest_size
+    return buckets